@@ -20,7 +20,14 @@ class Config:
     # 应用配置
     PROPAGATE_EXCEPTIONS = True # 确保异常正常传播# 确保异常正常传播
     PRESERVE_CONTEXT_ON_EXCEPTION = False # 不保留异常上下文
-    MAX_CONTENT_LENGTH = 1024 * 1024 * 500  # 允许500MB的上传
+    MAX_CONTENT_LENGTH = 1024 * 1024 * 500  # 允许500MB的上传（分片上传时限制的是单个分片请求）
+
+    # 分片上传配置：大视频分片上传，断线后只需重传缺失的分片
+    UPLOAD_CHUNK_SIZE = 1024 * 1024 * 8  # 默认分片大小
+    UPLOAD_CHUNK_SIZE_MIN = 1024 * 1024  # 客户端指定分片大小时的下限
+    UPLOAD_CHUNK_SIZE_MAX = 1024 * 1024 * 64  # 客户端指定分片大小时的上限
+    CHUNKED_UPLOAD_MAX_SIZE = 1024 * 1024 * 1024 * 4  # 分片上传的文件总大小上限
+    UPLOAD_TTL = 24 * 3600  # 超过该时间（秒）没有新分片的未完成上传会被清理
 
     # 目录配置
     UPLOAD_FOLDER = 'uploads'
@@ -29,11 +36,100 @@ class Config:
     # 摄像头配置
     CAMERA_INDICES = [0, -1, -1, -1, -1, -1, -1, -1, -1]  # 9个摄像头，只有第一个连接
 
+    # 追踪器配置
+    TRACKER_GATING = True  # 使用网格门控关联，密集场景下每帧追踪开销近似线性
+    TRACKER_GATING_CELL_SIZE = None  # 门控网格边长（像素），None表示自动选择
+
+    # 计数区域配置（按摄像头索引），煤块的追踪中心越过计数线或进入多边形时计数一次
+    # 例: {0: {'line': [[0, 480], [1280, 480]]}} 或 {0: {'polygon': [[0, 400], [1280, 400], [1280, 560], [0, 560]]}}
+    # 未配置的摄像头按确认的追踪目标计数
+    COUNTING_ZONES = {}
+
+    # 感兴趣区域（ROI）配置（按摄像头索引）：推理前只把皮带所在区域送入模型，检测框再映射回整帧坐标
+    # rect 为整帧像素坐标 [x1, y1, x2, y2]，scale 为裁剪后的缩放比例（小于1时进一步减少推理像素）
+    # 例: {0: {'rect': [0, 320, 1280, 640], 'scale': 0.75}}，未配置的摄像头整帧检测
+    CAMERA_ROIS = {}
+    VIDEO_ROI = None  # 上传视频默认使用的ROI，格式同上，None表示整帧检测
+
+    # 运动门控：皮带停止或空载时画面几乎不变，跳过实时摄像头的模型推理
+    MOTION_GATING = True
+    MOTION_DIFF_WIDTH = 160  # 差分前把帧缩小到的宽度（像素）
+    MOTION_DIFF_THRESHOLD = 25  # 灰度差超过该值的像素视为变化
+    MOTION_MIN_CHANGED_RATIO = 0.002  # 变化像素占比达到该值时执行推理
+    MOTION_MAX_SKIP_FRAMES = 50  # 最多连续跳过的帧数，之后强制推理一次
+
+    # 实时采集配置：每个摄像头一个采集线程，预览和检测分别读取环形缓冲区中的最新帧
+    CAPTURE_BUFFER_SIZE = 2  # 环形缓冲区保存的帧数，满时丢弃最旧的帧
+    CAPTURE_READ_TIMEOUT = 2.0  # 消费者等待新帧的最长时间（秒），超时视为摄像头无画面
+    CAPTURE_RETRY_INTERVAL = 0.5  # 摄像头读取失败后重试的间隔（秒）
+    CAPTURE_MAX_FAILURES = 10  # 连续读取失败该次数后采集线程退出，正在进行的检测随之停止
+    STREAM_MAX_FPS = 20  # WebSocket预览推送的最高帧率
+
+    # 预览档位（按画质从低到高排列），width为None表示保持原始尺寸；每帧只编码有观看者的档位
+    PREVIEW_TIERS = {
+        'thumb': {'width': 320, 'quality': 50},
+        'grid': {'width': 640, 'quality': 60},
+        'full': {'width': None, 'quality': 70}
+    }
+    PREVIEW_DEFAULT_TIER = 'full'  # 客户端未指定档位时使用
+    # 自适应档位：按每个WebSocket观看者未回执的帧数调整档位
+    STREAM_MAX_PENDING = 2  # 未回执帧数达到该值时跳过新帧
+    STREAM_DOWNGRADE_AFTER = 5  # 连续满载该帧数后降低一档
+    STREAM_UPGRADE_AFTER = 60  # 连续空闲该帧数后升高一档（不超过客户端请求的档位）
+    STREAM_ACK_TIMEOUT = 2.0  # 超过该时间（秒）未回执的帧视为丢失
+
     # 视频分段配置
     SEGMENT_DURATION = 15 * 60  # 15分钟视频片段
+    DETECTION_IDLE_EMIT_INTERVAL = 1.0  # 没有检测结果时 detection_result 事件的发送间隔（秒），携带推理/跳帧计数
+    DETECTION_SUMMARY_INTERVAL = 5.0  # 片段检测汇总文件的重写间隔（秒），检测明细实时追加到JSONL日志
+
+    # 视频写入配置：编码在独立线程中进行，实时录制和上传视频处理共用
+    VIDEO_WRITER_BACKEND = os.environ.get('VIDEO_WRITER_BACKEND', 'auto')  # 'auto'（有ffmpeg时使用）/ 'ffmpeg' / 'opencv'
+    FFMPEG_PATH = os.environ.get('FFMPEG_PATH', 'ffmpeg')  # ffmpeg 可执行文件（PATH中的名称或完整路径）
+    VIDEO_X264_PRESET = 'veryfast'  # libx264 编码速度预设，越慢文件越小
+    VIDEO_X264_CRF = 23  # libx264 画质（0-51，越小画质越高、文件越大）
+    VIDEO_WRITER_QUEUE_SIZE = 60  # 等待编码的最大帧数，实时录制超过后丢帧
 
     # 模型配置
+    # 使用 python -m tools.quantize_model 生成的INT8量化模型时改为 'best_int8.onnx'
     MODEL_PATH = 'best.pt'
+    # 推理后端: 'pytorch' / 'onnx'（ONNX Runtime）/ 'openvino' / 'auto'（按 MODEL_PATH 的文件类型选择）
+    # 选择 onnx/openvino 且 MODEL_PATH 为 .pt 权重时，首次启动会自动导出一次
+    INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'auto')
+    INFERENCE_IMGSZ = 640  # 模型输入尺寸
+
+    # 实时摄像头推理调度配置
+    LIVE_BATCH_SIZE = 9  # 各摄像头的帧最多合并为多大的批次
+    LIVE_BATCH_MAX_WAIT = 0.02  # 批次最长等待时间（秒），超时即推理
+    LIVE_MODEL_CONF = 0.25  # 共享模型的最低置信度，各摄像头的阈值在推理后再过滤
+
+    # 离线视频处理配置
+    VIDEO_BATCH_SIZE = 8  # 每次送入模型推理的帧数，可按机器性能调整
+    VIDEO_PIPELINE_QUEUE_SIZE = 4  # 流水线各阶段之间缓冲的批次数，超过后上游阻塞等待
+    VIDEO_INFERENCE_STRIDE = 1  # 每隔多少帧检测一次，中间帧由追踪器外推（1表示逐帧检测）
+    VIDEO_DENSE_TRACK_COUNT = 30  # 一批中最后一次检测的目标达到该数量时，之后批次的检测间隔减半
+
+    # 上传视频处理队列配置：每个工作进程各自加载一份模型，内存占用随进程数增加
+    VIDEO_WORKERS = 1  # 同时处理上传视频的进程数
+    VIDEO_QUEUE_MAX_PENDING = 20  # 最多排队等待的视频数，超过后拒绝新上传
+    VIDEO_WORKER_NICE = 10  # 工作进程降低的优先级（nice值），优先保证实时摄像头
+
+    # 视频任务存储配置（任务保存在数据库 tasks / task_detections 表中）
+    TASK_TTL = 3600  # 完成或失败的任务保留时间（秒）
+    TASK_STALL_TIMEOUT = 600  # 处理中的任务超过该时间（秒）没有进度更新、或本进程的排队任务超过该时间且已不在队列中时视为中断
+    TASK_HEARTBEAT_INTERVAL = 15  # 视频队列刷新心跳的间隔（秒）
+    TASK_HEARTBEAT_TIMEOUT = 60  # 超过该时间（秒）没有心跳的队列视为已停止，其中的排队任务标记为失败
+    TASK_CLEANUP_INTERVAL = 600  # 清理过期任务的间隔（秒）
+
+    # 检测阈值（参与结果缓存键的计算）
+    IMAGE_MODEL_CONF = 0.25  # 图片检测的最低置信度
+    VIDEO_TRACK_CONF = 0.3  # 上传视频中参与追踪的最低置信度
+
+    # 检测结果缓存：相同内容、相同模型和参数的重复上传直接返回已有结果
+    RESULT_CACHE_ENABLED = True
+    RESULT_CACHE_MAX_BYTES = 5 * 1024 * 1024 * 1024  # 缓存的结果文件总大小上限，超过后按最近使用时间淘汰
+    RESULT_CACHE_MAX_ENTRIES = 500  # 缓存条目数上限
+    RESULT_CACHE_VERSION = 2  # 检测/追踪逻辑变化导致旧结果不再适用时加1
 
     # 确保目录存在
     @classmethod
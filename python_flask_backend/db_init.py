@@ -1,6 +1,9 @@
 from newApp import app
 from exts import db
 from models.user import User
+from models.task import Task, TaskDetection, TaskQueueInstance  # 确保任务表也被创建
+from models.result_cache import ResultCacheEntry
+from models.upload import ChunkedUpload, UploadChunk
 import json
 import os
 import datetime
@@ -0,0 +1,158 @@
+import datetime
+import json
+import os
+import shutil
+import threading
+
+from exts import db
+
+
+def link_or_copy(src, dst):
+    """把 src 硬链接到 dst（不支持硬链接或跨文件系统时复制），dst 已存在时替换，返回 dst"""
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        return dst
+    temp_path = f'{dst}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        os.link(src, temp_path)
+    except OSError:
+        shutil.copyfile(src, temp_path)
+    os.replace(temp_path, dst)
+    return dst
+
+
+class ResultCacheEntry(db.Model):
+    """
+    检测结果缓存：键由上传内容的哈希、模型版本和检测参数组成
+    结果文件（标注后的图片/视频）和检测明细文件保存在磁盘上，这里只保存元数据，
+    总大小或条目数超过上限时按最近使用时间淘汰
+
+    缓存持有结果文件自己的硬链接（与检测明细放在同一目录），任务的结果文件是另一个链接：
+    淘汰缓存只删除缓存目录中的链接，不会删除任务仍在使用的文件；命中缓存时也为任务另建链接
+    """
+    __tablename__ = 'result_cache'
+
+    id = db.Column(db.Integer, primary_key=True)
+    cache_key = db.Column(db.String(64), unique=True, nullable=False, index=True)
+    kind = db.Column(db.String(10), nullable=False)  # image / video
+    content_hash = db.Column(db.String(64), nullable=False, index=True)  # 上传文件的SHA-256
+    result_path = db.Column(db.String(255), nullable=False)  # 标注后的结果文件
+    data_path = db.Column(db.String(255), nullable=False)  # 检测明细与汇总（JSON）
+    unique_count = db.Column(db.Integer, nullable=False, default=0)
+    size_bytes = db.Column(db.BigInteger, nullable=False, default=0)  # 磁盘文件总大小
+    hit_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.now)
+    last_used_at = db.Column(db.DateTime, default=datetime.datetime.now, index=True)
+
+    def load_data(self):
+        """读取缓存的检测明细和汇总，返回 (detections, summary)"""
+        with open(self.data_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data['detections'], data.get('summary', {})
+
+    def files_exist(self):
+        return os.path.exists(self.result_path) and os.path.exists(self.data_path)
+
+    def owns_result(self):
+        """结果文件是否为缓存自己的链接（旧版本的条目直接指向任务的结果文件，不能删除）"""
+        return os.path.dirname(os.path.abspath(self.result_path)) == os.path.dirname(os.path.abspath(self.data_path))
+
+    def remove_files(self):
+        paths = [self.result_path, self.data_path] if self.owns_result() else [self.data_path]
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def link_result(self, path):
+        """把缓存的结果文件链接（或复制）到 path，供命中缓存的任务或请求使用，返回 path"""
+        return link_or_copy(self.result_path, path)
+
+    @classmethod
+    def lookup(cls, cache_key):
+        """查找缓存并更新最近使用时间；文件已被删除的条目视为未命中并清除"""
+        entry = cls.query.filter_by(cache_key=cache_key).first()
+        if entry is None:
+            return None
+        try:
+            if not entry.files_exist():
+                entry.remove_files()
+                db.session.delete(entry)
+                db.session.commit()
+                return None
+            entry.hit_count += 1
+            entry.last_used_at = datetime.datetime.now()
+            db.session.commit()
+            return entry
+        except Exception:
+            db.session.rollback()
+            return None
+
+    @classmethod
+    def store(cls, cache_key, kind, content_hash, result_path, detections, summary=None, data_dir=None,
+              max_bytes=None, max_entries=None):
+        """
+        保存检测结果：结果文件在 data_dir 下建立以缓存键命名的链接，检测明细写入同名JSON文件，
+        元数据写入数据库，然后按LRU淘汰超出上限的条目
+        同一个键已有可用的条目时（如相同内容的两个任务同时处理）保留先存入的条目，不删除任何文件
+        """
+        entry = cls.query.filter_by(cache_key=cache_key).first()
+        if entry is not None and entry.files_exist():
+            entry.last_used_at = datetime.datetime.now()
+            try:
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+            return entry
+
+        data_dir = data_dir or os.path.dirname(result_path)
+        os.makedirs(data_dir, exist_ok=True)
+        cached_path = link_or_copy(result_path, os.path.join(data_dir, cache_key + os.path.splitext(result_path)[1]))
+        data_path = os.path.join(data_dir, f'{cache_key}.json')
+        with open(data_path, 'w', encoding='utf-8') as f:
+            json.dump({'detections': detections, 'summary': summary or {}}, f, ensure_ascii=False)
+
+        if entry is None:
+            entry = cls(cache_key=cache_key, kind=kind, content_hash=content_hash, hit_count=0)
+            db.session.add(entry)
+        entry.result_path = cached_path
+        entry.data_path = data_path
+        entry.unique_count = len(detections)
+        entry.size_bytes = os.path.getsize(cached_path) + os.path.getsize(data_path)
+        entry.last_used_at = datetime.datetime.now()
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"保存结果缓存失败: {str(e)}")
+            return None
+        cls.evict(max_bytes, max_entries)
+        return entry
+
+    @classmethod
+    def total_size(cls):
+        return int(db.session.query(db.func.coalesce(db.func.sum(cls.size_bytes), 0)).scalar())
+
+    @classmethod
+    def evict(cls, max_bytes=None, max_entries=None):
+        """按最近使用时间从旧到新淘汰条目（同时删除缓存自己的文件），直到总大小和条目数都不超过上限"""
+        total_bytes = cls.total_size()
+        total_entries = cls.query.count()
+        removed = 0
+        for entry in cls.query.order_by(cls.last_used_at).yield_per(100):
+            over_bytes = max_bytes is not None and total_bytes > max_bytes
+            over_entries = max_entries is not None and total_entries > max_entries
+            if not (over_bytes or over_entries):
+                break
+            entry.remove_files()
+            total_bytes -= entry.size_bytes
+            total_entries -= 1
+            db.session.delete(entry)
+            removed += 1
+        if removed:
+            try:
+                db.session.commit()
+                print(f"结果缓存已淘汰 {removed} 个条目")
+            except Exception:
+                db.session.rollback()
+        return removed
@@ -0,0 +1,299 @@
+import datetime
+import json
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+
+from exts import db
+
+# 排队中的任务随所在进程的内存队列丢失时记录的错误信息
+QUEUE_LOST_ERROR = '服务重启，排队中的任务未能处理，请重新提交'
+
+
+class Task(db.Model):
+    """视频检测任务模型，任务状态保存在数据库中，进程重启或多进程部署时都能查询"""
+    __tablename__ = 'tasks'
+
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.String(36), unique=True, nullable=False, index=True)
+    user_id = db.Column(db.String(36), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued/processing/completed/failed
+    progress = db.Column(db.Float, nullable=False, default=0)
+    fps = db.Column(db.Float, nullable=False, default=0)  # 当前处理速度（帧/秒）
+    result_path = db.Column(db.String(255), nullable=True)
+    unique_count = db.Column(db.Integer, nullable=False, default=0)  # 唯一煤块数
+    summary = db.Column(db.Text, nullable=True)  # 数据汇总（JSON），检测明细单独存放在 task_detections 表
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
+    finished_at = db.Column(db.DateTime, nullable=True, index=True)  # 完成或失败的时间，用于过期清理
+    owner = db.Column(db.String(32), nullable=True, index=True)  # 任务所在的视频队列实例（见 TaskQueueInstance）
+
+    def __init__(self, task_id, user_id, status='queued', owner=None):
+        self.task_id = task_id
+        self.user_id = user_id
+        self.status = status
+        self.owner = owner
+        self.progress = 0
+        self.fps = 0
+        self.unique_count = 0
+
+    def get_summary(self):
+        return json.loads(self.summary) if self.summary else {}
+
+    def detection_count(self):
+        """检测明细条数"""
+        return TaskDetection.query.filter_by(task_pk=self.id).count()
+
+    def get_detections(self, offset=0, limit=None):
+        """按track_id顺序读取检测明细，返回与原接口相同格式的字典列表"""
+        query = TaskDetection.query.filter_by(task_pk=self.id).order_by(TaskDetection.track_id)
+        if offset:
+            query = query.offset(offset)
+        if limit is not None:
+            query = query.limit(limit)
+        return [detection.to_dict() for detection in query]
+
+    @classmethod
+    def create_task(cls, task_id, user_id, status='queued', owner=None):
+        """创建新任务，owner 为将要处理该任务的视频队列实例ID"""
+        task = cls(task_id=task_id, user_id=user_id, status=status, owner=owner)
+        try:
+            db.session.add(task)
+            db.session.commit()
+            return task, None
+        except Exception as e:
+            db.session.rollback()
+            return None, f"创建任务失败: {str(e)}"
+
+    @classmethod
+    def find_by_task_id(cls, task_id):
+        """通过任务ID查找任务"""
+        return cls.query.filter_by(task_id=task_id).first()
+
+    @classmethod
+    def find_by_user(cls, user_id, limit=50):
+        """查找用户最近的任务"""
+        return cls.query.filter_by(user_id=user_id).order_by(cls.created_at.desc()).limit(limit).all()
+
+    @classmethod
+    def _update(cls, task_id, **fields):
+        """以单条UPDATE语句更新任务字段，不需要先读取任务"""
+        fields['updated_at'] = datetime.datetime.now()
+        try:
+            updated = cls.query.filter_by(task_id=task_id).update(fields, synchronize_session=False)
+            db.session.commit()
+            return updated > 0
+        except Exception:
+            db.session.rollback()
+            return False
+
+    @classmethod
+    def mark_processing(cls, task_id):
+        """更新任务状态为处理中"""
+        return cls._update(task_id, status='processing', progress=0)
+
+    @classmethod
+    def update_progress(cls, task_id, progress, fps=0):
+        """更新处理进度"""
+        return cls._update(task_id, progress=progress, fps=fps)
+
+    @classmethod
+    def complete(cls, task_id, result_path, detections, summary):
+        """
+        保存任务结果：汇总信息存为一小段JSON，检测明细批量写入 task_detections 表（每个煤块一行）
+        """
+        task = cls.find_by_task_id(task_id)
+        if task is None:
+            return False
+        try:
+            TaskDetection.query.filter_by(task_pk=task.id).delete(synchronize_session=False)
+            if detections:
+                db.session.execute(TaskDetection.__table__.insert(),
+                                   [TaskDetection.row_from_dict(task.id, detection) for detection in detections])
+            task.status = 'completed'
+            task.progress = 100
+            task.result_path = result_path
+            task.unique_count = len(detections)
+            task.summary = json.dumps(summary, ensure_ascii=False)
+            task.finished_at = datetime.datetime.now()
+            db.session.commit()
+            return True
+        except Exception as e:
+            db.session.rollback()
+            print(f"保存任务结果失败: {str(e)}")
+            return False
+
+    @classmethod
+    def fail(cls, task_id, error):
+        """更新任务状态为失败"""
+        return cls._update(task_id, status='failed', error=str(error), finished_at=datetime.datetime.now())
+
+    @classmethod
+    def delete_task(cls, task_id):
+        """删除任务及其检测明细"""
+        task = cls.find_by_task_id(task_id)
+        if task is None:
+            return False
+        try:
+            TaskDetection.query.filter_by(task_pk=task.id).delete(synchronize_session=False)
+            db.session.delete(task)
+            db.session.commit()
+            return True
+        except Exception:
+            db.session.rollback()
+            return False
+
+    @classmethod
+    def fail_stalled(cls, timeout, owner=None, active_ids=()):
+        """
+        把中断的任务标记为失败，返回标记的任务数：
+        处理中但超过timeout秒没有进度更新的任务（如处理进程随服务重启而中断），
+        以及属于本进程队列（owner）、排队超过timeout秒却已不在队列中（active_ids）的任务；
+        其他进程的排队任务由 fail_orphaned 按队列心跳判断，这里不处理
+        """
+        now = datetime.datetime.now()
+        cutoff = now - datetime.timedelta(seconds=timeout)
+        try:
+            count = cls.query.filter(cls.status == 'processing', cls.updated_at < cutoff).update(
+                {'status': 'failed', 'error': '任务处理中断', 'finished_at': now},
+                synchronize_session=False)
+            if owner is not None:
+                queued = cls.query.filter(cls.status == 'queued', cls.owner == owner, cls.updated_at < cutoff)
+                if active_ids:
+                    queued = queued.filter(cls.task_id.notin_(list(active_ids)))
+                count += queued.update({'status': 'failed', 'error': QUEUE_LOST_ERROR, 'finished_at': now},
+                                       synchronize_session=False)
+            db.session.commit()
+            return count
+        except Exception:
+            db.session.rollback()
+            return 0
+
+    @classmethod
+    def fail_orphaned(cls, live_owners):
+        """
+        把所属队列已停止心跳（不在 live_owners 中）的排队任务标记为失败，返回标记的任务数
+        队列在进程内存中，进程退出或重启后其中的任务无法恢复（参数未持久化）
+        """
+        lost = or_(cls.owner.is_(None), cls.owner.notin_(list(live_owners)))
+        try:
+            count = cls.query.filter(cls.status == 'queued', lost).update(
+                {'status': 'failed', 'error': QUEUE_LOST_ERROR, 'finished_at': datetime.datetime.now()},
+                synchronize_session=False)
+            db.session.commit()
+            return count
+        except Exception:
+            db.session.rollback()
+            return 0
+
+    @classmethod
+    def purge_expired(cls, ttl):
+        """删除完成或失败超过ttl秒的任务及其检测明细，返回删除的任务数"""
+        cutoff = datetime.datetime.now() - datetime.timedelta(seconds=ttl)
+        expired = db.session.query(cls.id).filter(cls.status.in_(['completed', 'failed']), cls.finished_at < cutoff)
+        expired_ids = [row.id for row in expired]
+        if not expired_ids:
+            return 0
+        try:
+            TaskDetection.query.filter(TaskDetection.task_pk.in_(expired_ids)).delete(synchronize_session=False)
+            cls.query.filter(cls.id.in_(expired_ids)).delete(synchronize_session=False)
+            db.session.commit()
+            return len(expired_ids)
+        except Exception:
+            db.session.rollback()
+            return 0
+
+
+class TaskQueueInstance(db.Model):
+    """
+    视频队列实例的心跳：每个进程的队列定期刷新 heartbeat_at，
+    多进程部署时据此判断排队任务所在的进程是否仍在运行
+    """
+    __tablename__ = 'task_queue_instances'
+
+    id = db.Column(db.Integer, primary_key=True)
+    instance_id = db.Column(db.String(32), unique=True, nullable=False, index=True)
+    started_at = db.Column(db.DateTime, default=datetime.datetime.now)
+    heartbeat_at = db.Column(db.DateTime, default=datetime.datetime.now, index=True)
+
+    @classmethod
+    def heartbeat(cls, instance_id):
+        """刷新实例心跳，实例不存在时登记，返回是否成功"""
+        now = datetime.datetime.now()
+        try:
+            updated = cls.query.filter_by(instance_id=instance_id).update({'heartbeat_at': now},
+                                                                          synchronize_session=False)
+            if not updated:
+                db.session.add(cls(instance_id=instance_id, started_at=now, heartbeat_at=now))
+            db.session.commit()
+            return True
+        except IntegrityError:
+            db.session.rollback()
+            return cls.heartbeat(instance_id)  # 同一实例的两个线程同时登记
+        except Exception:
+            db.session.rollback()
+            return False
+
+    @classmethod
+    def live_ids(cls, timeout):
+        """timeout 秒内有心跳的实例ID"""
+        cutoff = datetime.datetime.now() - datetime.timedelta(seconds=timeout)
+        return {row.instance_id for row in db.session.query(cls.instance_id).filter(cls.heartbeat_at >= cutoff)}
+
+    @classmethod
+    def purge_expired(cls, ttl):
+        """删除超过ttl秒没有心跳的实例记录，返回删除数"""
+        cutoff = datetime.datetime.now() - datetime.timedelta(seconds=ttl)
+        try:
+            count = cls.query.filter(cls.heartbeat_at < cutoff).delete(synchronize_session=False)
+            db.session.commit()
+            return count
+        except Exception:
+            db.session.rollback()
+            return 0
+
+
+class TaskDetection(db.Model):
+    """任务检测明细：每个唯一煤块一行，数值字段分列存储，便于分页查询"""
+    __tablename__ = 'task_detections'
+
+    id = db.Column(db.Integer, primary_key=True)
+    task_pk = db.Column(db.Integer, db.ForeignKey('tasks.id', ondelete='CASCADE'), nullable=False)
+    track_id = db.Column(db.Integer, nullable=False)
+    class_name = db.Column(db.String(32), nullable=False)
+    confidence = db.Column(db.Float, nullable=False)
+    x1 = db.Column(db.Float, nullable=False)
+    y1 = db.Column(db.Float, nullable=False)
+    x2 = db.Column(db.Float, nullable=False)
+    y2 = db.Column(db.Float, nullable=False)
+    first_frame = db.Column(db.Integer, nullable=True)
+    last_frame = db.Column(db.Integer, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_task_detections_task_track', 'task_pk', 'track_id'),
+    )
+
+    @staticmethod
+    def row_from_dict(task_pk, detection):
+        """把 process_video 输出的检测字典转换为表的一行"""
+        x1, y1, x2, y2 = detection['bbox']
+        return {
+            'task_pk': task_pk,
+            'track_id': detection['track_id'],
+            'class_name': detection['class'],
+            'confidence': detection['confidence'],
+            'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2,
+            'first_frame': detection.get('first_frame'),
+            'last_frame': detection.get('last_frame')
+        }
+
+    def to_dict(self):
+        return {
+            'class': self.class_name,
+            'confidence': self.confidence,
+            'bbox': [self.x1, self.y1, self.x2, self.y2],
+            'track_id': self.track_id,
+            'first_frame': self.first_frame,
+            'last_frame': self.last_frame
+        }
@@ -0,0 +1,128 @@
+import datetime
+import os
+
+from sqlalchemy.exc import IntegrityError
+
+from exts import db
+
+
+class ChunkedUpload(db.Model):
+    """
+    分片上传会话：文件在上传目录中预先分配好大小，各分片直接写入对应偏移位置，
+    已接收的分片记录在 upload_chunks 表中，连接中断后客户端查询缺失的分片继续上传
+    """
+    __tablename__ = 'chunked_uploads'
+
+    id = db.Column(db.Integer, primary_key=True)
+    upload_id = db.Column(db.String(36), unique=True, nullable=False, index=True)
+    user_id = db.Column(db.String(36), nullable=False, index=True)
+    filename = db.Column(db.String(255), nullable=False)  # 客户端的原始文件名
+    file_path = db.Column(db.String(255), nullable=False)  # 分片写入的文件
+    total_size = db.Column(db.BigInteger, nullable=False)
+    chunk_size = db.Column(db.Integer, nullable=False)
+    total_chunks = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='uploading')  # uploading / completed
+    task_id = db.Column(db.String(36), nullable=True)  # 上传完成后创建的检测任务
+    created_at = db.Column(db.DateTime, default=datetime.datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now, index=True)
+
+    def chunk_range(self, index):
+        """第index个分片在文件中的 (偏移, 长度)"""
+        offset = index * self.chunk_size
+        return offset, min(self.chunk_size, self.total_size - offset)
+
+    def received_indices(self):
+        rows = db.session.query(UploadChunk.chunk_index).filter_by(upload_pk=self.id).order_by(UploadChunk.chunk_index)
+        return [row.chunk_index for row in rows]
+
+    def missing_indices(self):
+        received = set(self.received_indices())
+        return [i for i in range(self.total_chunks) if i not in received]
+
+    def to_dict(self):
+        missing = self.missing_indices()
+        return {
+            'upload_id': self.upload_id,
+            'filename': self.filename,
+            'total_size': self.total_size,
+            'chunk_size': self.chunk_size,
+            'total_chunks': self.total_chunks,
+            'received_chunks': self.total_chunks - len(missing),
+            'missing_chunks': missing,
+            'status': self.status,
+            'task_id': self.task_id
+        }
+
+    @classmethod
+    def create_upload(cls, upload_id, user_id, filename, file_path, total_size, chunk_size):
+        """创建上传会话，并按文件总大小预先分配文件"""
+        upload = cls(upload_id=upload_id, user_id=user_id, filename=filename, file_path=file_path,
+                     total_size=total_size, chunk_size=chunk_size,
+                     total_chunks=max(1, (total_size + chunk_size - 1) // chunk_size))
+        try:
+            with open(file_path, 'wb') as f:
+                f.truncate(total_size)
+            db.session.add(upload)
+            db.session.commit()
+            return upload, None
+        except Exception as e:
+            db.session.rollback()
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            return None, f"创建上传失败: {str(e)}"
+
+    @classmethod
+    def find_by_upload_id(cls, upload_id):
+        return cls.query.filter_by(upload_id=upload_id).first()
+
+    def mark_chunk(self, index, checksum):
+        """记录分片已接收（重复上传同一分片时更新校验值）"""
+        try:
+            db.session.add(UploadChunk(upload_pk=self.id, chunk_index=index, sha256=checksum))
+            self.updated_at = datetime.datetime.now()
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            UploadChunk.query.filter_by(upload_pk=self.id, chunk_index=index).update({'sha256': checksum})
+            db.session.commit()
+
+    def mark_completed(self, file_path, task_id):
+        self.status = 'completed'
+        self.file_path = file_path
+        self.task_id = task_id
+        db.session.commit()
+
+    def delete(self, remove_file=True):
+        """删除上传会话及其分片记录，未完成的上传同时删除文件"""
+        if remove_file and self.status != 'completed' and os.path.exists(self.file_path):
+            os.remove(self.file_path)
+        UploadChunk.query.filter_by(upload_pk=self.id).delete(synchronize_session=False)
+        db.session.delete(self)
+        db.session.commit()
+
+    @classmethod
+    def purge_expired(cls, ttl):
+        """删除超过ttl秒没有新分片的未完成上传，以及完成超过ttl秒的上传记录"""
+        cutoff = datetime.datetime.now() - datetime.timedelta(seconds=ttl)
+        removed = 0
+        for upload in cls.query.filter(cls.updated_at < cutoff).all():
+            try:
+                upload.delete()
+                removed += 1
+            except Exception:
+                db.session.rollback()
+        return removed
+
+
+class UploadChunk(db.Model):
+    """已接收的分片及其SHA-256"""
+    __tablename__ = 'upload_chunks'
+
+    id = db.Column(db.Integer, primary_key=True)
+    upload_pk = db.Column(db.Integer, db.ForeignKey('chunked_uploads.id', ondelete='CASCADE'), nullable=False)
+    chunk_index = db.Column(db.Integer, nullable=False)
+    sha256 = db.Column(db.String(64), nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('upload_pk', 'chunk_index', name='uq_upload_chunks_upload_index'),
+    )
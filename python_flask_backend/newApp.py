@@ -1,22 +1,22 @@
 import cv2
 import threading
-import base64
 import time
 import os
 import uuid
+import functools
 import subprocess
 import shutil
 import json
 import numpy as np
-from filterpy.kalman import KalmanFilter
 import models.user
-from scipy.optimize import linear_sum_assignment
+from models.task import Task, TaskQueueInstance
+from models.result_cache import ResultCacheEntry
+from models.upload import ChunkedUpload
 from datetime import datetime
 from flask import Flask, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
 from flask_socketio import SocketIO
-from werkzeug.utils import secure_filename
-from ultralytics import YOLO  # 使用Ultralytics官方库
+from werkzeug.datastructures import MultiDict
 # from socketio import ConnectionRefusedError
 # from utils.jwt_utils import decode_token
 # 导入认证相关的模块
@@ -24,6 +24,19 @@ from api.auth_routes import auth_bp
 from config import Config
 from utils.jwt_utils import token_required, admin_required
 from exts import db
+from utils.sort_tracker import Sort
+from utils.video_pipeline import Pipeline
+from utils.inference_scheduler import InferenceScheduler
+from utils.inference_engine import RegionOfInterest, create_engine, model_version
+from utils.motion_detector import MotionDetector
+from utils.detection_log import SegmentDetectionLog, read_detection_log
+from utils.segment_store import SegmentColumns, segment_index_path
+from utils.frame_buffer import FrameConsumer, FrameRingBuffer
+from utils.frame_broadcast import AdaptiveTier, FrameBroadcaster, RateController, TransferMeter, pack_frame
+from utils.lazy_registry import BackgroundWorkers, LazyRegistry, LazyResource
+from utils.job_queue import JobQueue, QueueFullError
+from utils.video_writer import SegmentVideoWriter
+from utils.upload_cache import adopt_upload, cache_key, hash_file, save_upload_hashed, upload_extension, write_chunk
 
 app = Flask(__name__)
 
@@ -42,267 +55,65 @@ app.register_blueprint(auth_bp, url_prefix='/api/auth')
 # 默认监控视频保存目录
 DEFAULT_SAVE_PATH = Config.DEFAULT_SAVE_PATH
 
-# 加载YOLOv11模型
-model = YOLO('best.pt')  # 直接使用Ultralytics的YOLO类加载
+# 模型、摄像头和后台线程都延迟初始化：导入本模块时只注册路由，
+# 首次使用时或在 create_app(load_runtime=True) 启动钩子中才真正加载
 
-# 存储异步任务的字典
-processing_tasks = {}
-# ===================== 实现SORT追踪算法 ====================
-class KalmanBoxTracker(object):
-    """
-    使用Kalman滤波器实现的单目标追踪器
-    """
-    count = 0
-
-    def __init__(self, bbox):
-        """
-        初始化目标追踪器，使用检测框位置
-        """
-        self.kf = KalmanFilter(dim_x=7, dim_z=4)
-        self.kf.F = np.array(
-            [[1, 0, 0, 0, 1, 0, 0], [0, 1, 0, 0, 0, 1, 0], [0, 0, 1, 0, 0, 0, 1], [0, 0, 0, 1, 0, 0, 0],
-             [0, 0, 0, 0, 1, 0, 0], [0, 0, 0, 0, 0, 1, 0], [0, 0, 0, 0, 0, 0, 1]])
-        self.kf.H = np.array(
-            [[1, 0, 0, 0, 0, 0, 0], [0, 1, 0, 0, 0, 0, 0], [0, 0, 1, 0, 0, 0, 0], [0, 0, 0, 1, 0, 0, 0]])
-
-        self.kf.R[2:, 2:] *= 10.
-        self.kf.P[4:, 4:] *= 1000.
-        self.kf.P *= 10.
-        self.kf.Q[4:, 4:] *= 0.01
-
-        self.kf.x[:4] = convert_bbox_to_z(bbox)
-        self.time_since_update = 0
-        self.id = KalmanBoxTracker.count
-        KalmanBoxTracker.count += 1
-        self.history = []
-        self.hits = 0
-        self.hit_streak = 0
-        self.age = 0
-        self.class_name = None
-        self.confidence = 0
-
-    def update(self, bbox, class_name=None, confidence=None):
-        """
-        使用检测框更新位置，重置计数器
-        """
-        self.time_since_update = 0
-        self.history = []
-        self.hits += 1
-        self.hit_streak += 1
-        self.kf.update(convert_bbox_to_z(bbox))
-        if class_name is not None:
-            self.class_name = class_name
-        if confidence is not None:
-            self.confidence = confidence
-
-    def predict(self):
-        """
-        预测下一帧位置
-        """
-        if ((self.kf.x[6] + self.kf.x[2]) <= 0):
-            self.kf.x[6] *= 0.0
-        self.kf.predict()
-        self.age += 1
-        if (self.time_since_update > 0):
-            self.hit_streak = 0
-        self.time_since_update += 1
-        self.history.append(convert_x_to_bbox(self.kf.x))
-        return self.history[-1]
-
-    def get_state(self):
-        """
-        返回当前位置估计
-        """
-        return convert_x_to_bbox(self.kf.x)
-
-
-def convert_bbox_to_z(bbox):
-    """
-    将[x1,y1,x2,y2]格式的边界框转换为[x,y,s,r]格式
-    x,y是中心点，s是面积，r是宽高比
-    """
-    w = bbox[2] - bbox[0]
-    h = bbox[3] - bbox[1]
-    x = bbox[0] + w / 2.
-    y = bbox[1] + h / 2.
-    s = w * h
-    r = w / float(h) if h > 0 else 1.0
-    return np.array([x, y, s, r]).reshape((4, 1))
-
-
-def convert_x_to_bbox(x, score=None):
-    """
-    将[x,y,s,r]格式转换回[x1,y1,x2,y2]格式
-    """
-    w = np.sqrt(x[2] * x[3])
-    h = x[2] / w
-    if (score == None):
-        return np.array([x[0] - w / 2., x[1] - h / 2., x[0] + w / 2., x[1] + h / 2.]).reshape((1, 4))
-    else:
-        return np.array([x[0] - w / 2., x[1] - h / 2., x[0] + w / 2., x[1] + h / 2., score]).reshape((1, 5))
-
-
-def associate_detections_to_trackers(detections, trackers, iou_threshold=0.3):
-    """
-    使用匈牙利算法将检测结果与现有追踪器关联
-    """
-    if len(trackers) == 0:
-        return np.empty((0, 2), dtype=int), np.arange(len(detections)), np.empty((0, 5), dtype=int)
-
-    iou_matrix = np.zeros((len(detections), len(trackers)), dtype=np.float32)
-
-    for d, det in enumerate(detections):
-        for t, trk in enumerate(trackers):
-            iou_matrix[d, t] = calculate_iou(det, trk)
-
-    # 使用匈牙利算法进行关联
-    matched_indices = np.array(linear_sum_assignment(-iou_matrix)).T
-
-    # 未匹配的检测结果
-    unmatched_detections = []
-    for d, det in enumerate(detections):
-        if d not in matched_indices[:, 0]:
-            unmatched_detections.append(d)
-
-    # 未匹配的追踪器
-    unmatched_trackers = []
-    for t, trk in enumerate(trackers):
-        if t not in matched_indices[:, 1]:
-            unmatched_trackers.append(t)
-
-    # 过滤掉低IOU的匹配
-    matches = []
-    for m in matched_indices:
-        if iou_matrix[m[0], m[1]] < iou_threshold:
-            unmatched_detections.append(m[0])
-            unmatched_trackers.append(m[1])
-        else:
-            matches.append(m.reshape(1, 2))
-
-    if len(matches) == 0:
-        matches = np.empty((0, 2), dtype=int)
-    else:
-        matches = np.concatenate(matches, axis=0)
-
-    return matches, np.array(unmatched_detections), np.array(unmatched_trackers)
-
-
-def calculate_iou(box1, box2):
-    """
-    计算两个框的交并比(IOU)
-    """
-    # 获取交集区域的坐标
-    x1 = max(box1[0], box2[0])
-    y1 = max(box1[1], box2[1])
-    x2 = min(box1[2], box2[2])
-    y2 = min(box1[3], box2[3])
-
-    # 计算交集面积
-    intersection = max(0, x2 - x1) * max(0, y2 - y1)
+# YOLOv11模型，推理后端（PyTorch / ONNX Runtime / OpenVINO）由 Config.INFERENCE_BACKEND 选择
+engine = LazyResource('推理引擎', create_engine)
 
-    # 计算两个框的面积
-    box1_area = (box1[2] - box1[0]) * (box1[3] - box1[1])
-    box2_area = (box2[2] - box2[0]) * (box2[3] - box2[1])
+# 所有实时摄像头共享的推理调度器：多路帧合并为小批次推理
+inference_scheduler = LazyResource('推理调度器', lambda: InferenceScheduler(
+    engine.get(),
+    max_batch_size=Config.LIVE_BATCH_SIZE,
+    max_wait=Config.LIVE_BATCH_MAX_WAIT,
+    predict_kwargs={'conf': Config.LIVE_MODEL_CONF}
+))
 
-    # 计算并集面积
-    union = box1_area + box2_area - intersection
+# 后台线程注册表（清理过期任务等），在启动钩子或首次创建任务时启动
+workers = BackgroundWorkers()
 
-    # 防止除以0
-    if union == 0:
-        return 0
 
-    return intersection / union
 
+def create_video_jobs():
+    """创建本进程的视频队列，并立即登记队列心跳，避免其他进程把刚提交的任务当作无主任务"""
+    jobs = JobQueue(
+        run_video_job,
+        num_workers=Config.VIDEO_WORKERS,
+        max_pending=Config.VIDEO_QUEUE_MAX_PENDING,
+        on_event=handle_video_job_event,
+        initializer=init_video_worker
+    )
+    with app.app_context():
+        TaskQueueInstance.heartbeat(jobs.instance_id)
+    workers.ensure('task_heartbeat')
+    return jobs
 
-class Sort(object):
-    """
-    SORT多目标追踪算法
-    """
 
-    def __init__(self, max_age=10, min_hits=3, iou_threshold=0.3):
-        """
-        参数:
-            max_age - 连续帧未关联时删除追踪器的最大帧数
-            min_hits - 确认目标存在的最小帧数
-            iou_threshold - IOU匹配门限
-        """
-        self.max_age = max_age
-        self.min_hits = min_hits
-        self.iou_threshold = iou_threshold
-        self.trackers = []
-        self.frame_count = 0
-        self.unique_ids = set()  # 用于记录唯一煤块ID
-
-    def update(self, dets, class_names=None, confidences=None):
-        """
-        更新追踪器状态
-        参数:
-            dets - numpy数组格式 [[x1,y1,x2,y2,score], ...]
-        返回:
-            带有唯一ID的追踪结果
-        """
-        self.frame_count += 1
+# 上传视频的处理队列：固定数量的工作进程，各自加载模型，按用户轮转调度
+video_jobs = LazyResource('视频任务队列', create_video_jobs)
 
-        # 获取当前追踪器预测的位置
-        trks = np.zeros((len(self.trackers), 5))
-        to_del = []
-        ret = []
-        for t, trk in enumerate(trks):
-            pos = self.trackers[t].predict()[0]
-            trk[:] = [pos[0], pos[1], pos[2], pos[3], 0]
-            if np.any(np.isnan(pos)):
-                to_del.append(t)
-
-        # 删除失效的追踪器
-        trks = np.ma.compress_rows(np.ma.masked_invalid(trks))
-        for t in reversed(to_del):
-            self.trackers.pop(t)
-
-        # 将当前帧检测关联到已有追踪
-        matched, unmatched_dets, unmatched_trks = associate_detections_to_trackers(dets, trks, self.iou_threshold)
-
-        # 更新已匹配的追踪器
-        for m in matched:
-            if class_names is not None and confidences is not None:
-                self.trackers[m[1]].update(dets[m[0]], class_names[m[0]], confidences[m[0]])
-            else:
-                self.trackers[m[1]].update(dets[m[0]])
-
-        # 为未匹配的检测创建新的追踪器
-        for i in unmatched_dets:
-            if class_names is not None and confidences is not None:
-                trk = KalmanBoxTracker(dets[i])
-                trk.class_name = class_names[i]
-                trk.confidence = confidences[i]
-            else:
-                trk = KalmanBoxTracker(dets[i])
-            self.trackers.append(trk)
-
-        # 返回确认的追踪结果
-        i = len(self.trackers)
-        for trk in reversed(self.trackers):
-            d = trk.get_state()[0]
-
-            # 只返回确认的追踪结果 (至少连续min_hits帧被追踪)
-            if trk.time_since_update < 1 and (trk.hit_streak >= self.min_hits or self.frame_count <= self.min_hits):
-                ret.append(np.concatenate((d, [trk.id + 1])).reshape(1, -1))  # +1 因为0是保留ID
+# ===================== 摄像头流处理部分 =====================
 
-                # 记录唯一ID
-                self.unique_ids.add(trk.id + 1)
+# 模拟9个摄像头（只有第一个使用真实摄像头）
+camera_indices = [0, -1, -1, -1, -1, -1, -1, -1, -1]  # 9个摄像头，只有第一个连接
 
-            i -= 1
 
-            # 移除已经很久未更新的追踪器
-            if trk.time_since_update > self.max_age:
-                self.trackers.pop(i)
+def encode_jpeg(frame, quality=70, width=None):
+    """把帧编码为JPEG字节，指定width且帧更宽时先按比例缩小"""
+    if width and frame.shape[1] > width:
+        height = max(1, int(round(frame.shape[0] * width / float(frame.shape[1]))))
+        frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+    ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buffer.tobytes()
 
-        if len(ret) > 0:
-            return np.concatenate(ret), len(self.unique_ids)
-        return np.empty((0, 5)), len(self.unique_ids)
-# ===================== 摄像头流处理部分 =====================
 
-# 模拟9个摄像头（只有第一个使用真实摄像头）
-camera_indices = [0, -1, -1, -1, -1, -1, -1, -1, -1]  # 9个摄像头，只有第一个连接
+def open_video_writer(path, fps, size, **kwargs):
+    """按配置创建在独立线程中编码的视频写入器（ffmpeg管道，不可用时回退到OpenCV）"""
+    writer = SegmentVideoWriter(path, fps, size, backend=Config.VIDEO_WRITER_BACKEND,
+                                queue_size=Config.VIDEO_WRITER_QUEUE_SIZE, ffmpeg=Config.FFMPEG_PATH,
+                                preset=Config.VIDEO_X264_PRESET, crf=Config.VIDEO_X264_CRF, **kwargs)
+    print(f"视频写入: {path}，编码器 {writer.backend}")
+    return writer
 
 
 class Camera:
@@ -312,41 +123,131 @@ class Camera:
             self.cap = cv2.VideoCapture(index)
             self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
             self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 960)
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # 驱动侧只缓存1帧，由采集线程及时取走
         else:
             self.cap = None
-        self.lock = threading.Lock()
-        self.clients = 0
+        self.detection_lock = threading.Lock()  # 检测与视频写入锁
+        # 采集线程持续读取摄像头，把最新帧放入环形缓冲区；预览和检测各自按自己的速度读取
+        self.buffer = FrameRingBuffer(Config.CAPTURE_BUFFER_SIZE)
+        self.capture_thread = None
+        self.capture_lock = threading.Lock()
+        self.stream_consumer = FrameConsumer(self.buffer, 'stream')
+        self.detection_consumer = FrameConsumer(self.buffer, 'detection')
+        # 预览帧只编码一次，同一份JPEG分发给所有MJPEG连接和WebSocket推送
+        # 每个预览档位每帧只编码一次
+        self.broadcaster = FrameBroadcaster(self._read_stream_frame, {
+            tier: functools.partial(encode_jpeg, quality=options['quality'], width=options['width'])
+            for tier, options in Config.PREVIEW_TIERS.items()
+        })
+        self.mjpeg_meter = TransferMeter()  # MJPEG连接发送的字节数（所有连接合计）
+        self.socket_meter = TransferMeter()  # WebSocket推送的字节数（所有观看者合计）
+        self.stream_clients = {}  # 订阅WebSocket视频流的客户端 sid -> AdaptiveTier
+        self.stream_lock = threading.Lock()
+        self.emitting = False  # WebSocket推送任务是否在运行
         self.detecting = False
         self.detection_thread = None
-        self.video_writer = None
+        self.video_writer = None  # 当前片段的视频写入器（编码在写入器自己的线程中进行）
         self.video_start_time = None
         self.current_video_path = None
         self.current_results_path = None
         self.segment_duration = 15 * 60  # 15分钟视频片段
-        self.detection_results = []
+        self.detection_log = None  # 当前片段的检测记录（JSONL日志 + 定期写入的汇总）
         self.save_path = DEFAULT_SAVE_PATH
         # 添加追踪器
-        self.tracker = Sort(max_age=20, min_hits=2, iou_threshold=0.3)
+        self.tracker = Sort(max_age=20, min_hits=2, iou_threshold=0.3, gating=Config.TRACKER_GATING,
+                            gating_cell_size=Config.TRACKER_GATING_CELL_SIZE,
+                            counting_zone=Config.COUNTING_ZONES.get(index))
         self.unique_coal_count = 0  # 唯一煤块计数
         self.frame_index = 0  # 帧计数
         self.frame_count = 0  # 确保添加这一行
+        self.confidence_threshold = 0.5  # 本摄像头的检测置信度阈值
+        self.roi = RegionOfInterest.from_config(Config.CAMERA_ROIS.get(index))  # 推理区域，None表示整帧
+        # 运动门控：画面无变化时跳过推理
+        self.motion_detector = MotionDetector(
+            width=Config.MOTION_DIFF_WIDTH,
+            diff_threshold=Config.MOTION_DIFF_THRESHOLD,
+            min_changed_ratio=Config.MOTION_MIN_CHANGED_RATIO,
+            max_skip_frames=Config.MOTION_MAX_SKIP_FRAMES
+        ) if Config.MOTION_GATING else None
+        self.inferred_frames = 0  # 当前视频片段中执行推理的帧数
+        self.skipped_frames = 0  # 当前视频片段中因画面无变化跳过推理的帧数
+        self.last_result_emit_time = 0.0  # 上次发送 detection_result 的时间
+        self.last_result_emit_had_detections = False
+
+    def ensure_capture(self):
+        """启动采集线程（已在运行时无操作），返回摄像头是否可用（设备未打开时不启动）"""
+        if self.cap is None or not self.cap.isOpened():
+            return False
+        with self.capture_lock:
+            if self.capture_thread is None or not self.capture_thread.is_alive():
+                self.buffer.reopen()
+                self.capture_thread = threading.Thread(target=self._capture_loop,
+                                                       name=f'camera-{self.index}-capture', daemon=True)
+                self.capture_thread.start()
+        return True
 
-    # 捕获视频流生成帧
-    def get_frame(self):
-        if self.cap is None:
-            return None
-
-        with self.lock:
-            success, frame = self.cap.read()
-            if not success:
-                return None
+    def _capture_loop(self):
+        """
+        采集线程：不停读取摄像头并写入环形缓冲区；读取失败时间隔 CAPTURE_RETRY_INTERVAL 秒重试，
+        连续失败 CAPTURE_MAX_FAILURES 次后关闭缓冲区通知消费者
+        """
+        failures = 0
+        try:
+            while True:
+                success, frame = self.cap.read()
+                if success and frame is not None:
+                    failures = 0
+                    self.buffer.put(frame)
+                    continue
+                failures += 1
+                if failures >= Config.CAPTURE_MAX_FAILURES or not self.cap.isOpened():
+                    print(f"摄像头 {self.index} 连续 {failures} 次读取失败，采集线程退出")
+                    break
+                time.sleep(Config.CAPTURE_RETRY_INTERVAL)
+        finally:
+            self.buffer.close()
 
-            # 如果正在检测，保存帧到视频中
-            if self.detecting and frame is not None:
-                self.handle_detection(frame)
+    def _read_stream_frame(self, timeout):
+        """预览帧源：读取比上次预览更新的最新帧，不等待检测（由帧广播在订阅者读取时调用）"""
+        if not self.ensure_capture():
+            return None
+        return self.stream_consumer.read(timeout=timeout)
 
-            ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 70])
-            return buffer.tobytes()
+    def _detection_loop(self):
+        """
+        检测线程：按推理速度读取最新帧，推理期间采集到的旧帧直接跳过（计入 dropped_frames）
+        采集线程因摄像头持续读取失败而退出时停止检测并通知前端
+        """
+        while self.detecting:
+            item = self.detection_consumer.read(timeout=Config.CAPTURE_READ_TIMEOUT)
+            if item is None:
+                if self.buffer.closed:
+                    self.stop_detection()
+                    socketio.emit('detection_stopped', {
+                        'camera_id': self.index,
+                        'error': f'摄像头 {self.index} 读取失败，检测已停止'
+                    })
+                    break
+                continue
+            with self.detection_lock:
+                if self.detecting:
+                    self.handle_detection(item[1])
+
+    def stats(self):
+        """采集、预览和检测的帧计数"""
+        return {
+            'camera_id': self.index,
+            'capturing': self.capture_thread is not None and self.capture_thread.is_alive(),
+            'detecting': self.detecting,
+            'capture': self.buffer.stats(),
+            'stream': self.stream_consumer.stats(),
+            'broadcast': self.broadcaster.stats(),
+            'mjpeg': self.mjpeg_meter.stats(),
+            'socket': self.socket_meter.stats(),
+            'socket_clients': {sid: viewer.stats() for sid, viewer in list(self.stream_clients.items())},
+            'detection': self.detection_consumer.stats(),
+            'recording': self.video_writer.stats() if self.video_writer is not None else None
+        }
 
     # 处理检测并保存视频
     def handle_detection(self, frame):
@@ -362,26 +263,20 @@ class Camera:
                 self.video_start_time is None or
                 current_time - self.video_start_time >= self.segment_duration):
 
-            # 关闭现有视频写入器
-            if self.video_writer is not None:
-                self.video_writer.release()
+            # 结束上一个片段的检测记录
+            self._close_detection_log(current_time)
 
-                # 通知前端视频已保存
-                if self.current_video_path:
-                    socketio.emit('video_saved', {
-                        'camera_id': self.index,
-                        'file_path': self.current_video_path,
-                        'timestamp': current_time
-                    })
+            # 关闭现有视频写入器：剩余帧在写入线程中编码完后才通知前端，不阻塞检测
+            if self.video_writer is not None:
+                self.video_writer.close(wait=False)
 
             # 创建新的视频片段
             timestamp = datetime.now().strftime('%H-%M-%S')
             video_filename = f'cam{self.index}_seg_{timestamp}.mp4'
             self.current_video_path = os.path.join(daily_folder, video_filename)
 
-            # 获取视频参数
-            width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            # 获取视频参数（尺寸以实际帧为准）
+            height, width = frame.shape[:2]
             fps = self.cap.get(cv2.CAP_PROP_FPS)
             # 如果帧率异常，设置为合理的默认值
             if fps <= 0 or fps > 60:  # 通常摄像头帧率不超过60fps
@@ -389,28 +284,14 @@ class Camera:
                 print(f"摄像头 {self.index} 帧率获取失败，使用默认值 {fps}fps")
             else:
                 print(f"摄像头 {self.index} 帧率: {fps}fps")
-            # 尝试使用更兼容的编码器
-            try:
-                # 尝试使用 H.264 编码
-                fourcc = cv2.VideoWriter.fourcc(*'avc1')  # 或者尝试 'H264'
-                self.video_writer = cv2.VideoWriter(
-                    self.current_video_path, fourcc, fps, (width, height)
-                )
-
-                # 如果无法创建，回退到其他编码器
-                if not self.video_writer.isOpened():
-                    fourcc = cv2.VideoWriter.fourcc(*'XVID')  # 尝试 XVID 编码
-                    self.video_writer = cv2.VideoWriter(
-                        self.current_video_path, fourcc, fps, (width, height)
-                    )
-            except:
-                # 最后回退到 mp4v
-                fourcc = cv2.VideoWriter.fourcc(*'mp4v')
-                self.video_writer = cv2.VideoWriter(
-                    self.current_video_path, fourcc, fps, (width, height)
-                )
+            # 实时录制不阻塞检测：编码跟不上时丢帧（计入写入器的 dropped）
+            self.video_writer = open_video_writer(self.current_video_path, fps, (width, height),
+                                                  on_closed=self._on_segment_saved)
             self.video_start_time = current_time
             self.frame_count = 0  # 添加帧计数器
+            self.inferred_frames = 0
+            self.skipped_frames = 0
+            self.detection_consumer.reset_counters()
 
             # # 计算相对时间戳（秒）- 从视频开始的相对时间
             # relative_timestamp = current_time - self.video_start_time
@@ -418,7 +299,8 @@ class Camera:
             # 创建对应的检测结果文件
             results_filename = f'cam{self.index}_seg_{timestamp}.json'
             self.current_results_path = os.path.join(daily_folder, results_filename)
-            self.detection_results = []
+            self.detection_log = SegmentDetectionLog(self.current_results_path, self.index, self.current_video_path,
+                                                     summary_interval=Config.DETECTION_SUMMARY_INTERVAL)
 
         # 增加帧计数
         self.frame_count += 1
@@ -430,61 +312,57 @@ class Camera:
         else:
             # 如果无法通过帧率计算，则使用真实时间差
             relative_time = current_time - self.video_start_time
-        # 执行对象检测
-        results = model(frame, verbose=False)
-
-        # 将检测结果转换为SORT兼容的格式
-        detections = []
-        class_names = []
-        confidences = []
-
-        for box in results[0].boxes:
-            x1, y1, x2, y2 = box.xyxy[0].tolist()
-            confidence = float(box.conf)
-            class_name = model.names[int(box.cls)]
-
-            # 只追踪置信度超过阈值的目标
-            if confidence > 0.3:  # 可调整的阈值
-                detections.append([x1, y1, x2, y2])
-                class_names.append(class_name)
-                confidences.append(confidence)
-
-        # 更新追踪器
-        if detections:
-            detections_array = np.array(detections)
+        # 画面（ROI区域）与上次推理时相比无明显变化时跳过推理，追踪器只增加目标的存活帧数
+        region = self.roi.crop(frame) if self.roi is not None else frame
+        if self.motion_detector is not None and not self.motion_detector.should_infer(region):
+            self.skipped_frames += 1
+            tracked_objects, _ = self.tracker.hold()
+        else:
+            self.inferred_frames += 1
+            # 执行对象检测（由共享调度器与其他摄像头合批推理），配置了ROI时只检测ROI区域
+            result = inference_scheduler.get().infer(region, crop=self.roi is not None)
+            if self.roi is not None:
+                result = self.roi.restore(result, frame.shape)
+
+            # 将检测结果转换为SORT兼容的格式
+            detections = []
+            class_names = []
+            confidences = []
+
+            # 只追踪置信度超过阈值的目标，阈值按摄像头在推理后应用
+            keep = (result.confidences > 0.3) & (result.confidences >= self.confidence_threshold)
+            for bbox, confidence, class_id in zip(result.boxes[keep], result.confidences[keep],
+                                                  result.class_ids[keep]):
+                detections.append(bbox.tolist())
+                class_names.append(engine.get().names.get(int(class_id), str(class_id)))
+                confidences.append(float(confidence))
+
+            # 更新追踪器；没有检测时也要更新，使未匹配的追踪器老化，
+            # 之后画面静止跳过推理时 hold() 才不会一直输出已离开的目标
+            detections_array = np.array(detections, dtype=np.float64).reshape(-1, 4)
             tracked_objects, unique_count = self.tracker.update(detections_array, class_names, confidences)
             self.unique_coal_count = unique_count  # 更新唯一煤块计数
-        else:
-            tracked_objects = np.empty((0, 5))
 
-        # 记录跟踪结果
+        # 记录跟踪结果（类别和置信度直接从追踪结果中读取）
         frame_detections = []
         for tracked_obj in tracked_objects:
-            x1, y1, x2, y2, track_id = tracked_obj
-
-            # 获取当前追踪ID对应的追踪器
-            tracker_idx = None
-            for i, trk in enumerate(self.tracker.trackers):
-                if trk.id + 1 == track_id:  # +1 是因为我们在返回时加了1
-                    tracker_idx = i
-                    break
-
-            if tracker_idx is not None:
-                trk = self.tracker.trackers[tracker_idx]
-                detection = {
-                    'class': trk.class_name,
-                    'confidence': trk.confidence,
-                    'bbox': [x1, y1, x2, y2],
-                    'track_id': int(track_id),
-                    'abs_timestamp': current_time,  # 保留绝对时间戳
-                    'rel_timestamp': relative_time,  # 添加相对时间戳
-                    'frame_number': self.frame_count  # 添加帧号
-                }
-                frame_detections.append(detection)
-                self.detection_results.append(detection)
+            x1, y1, x2, y2 = tracked_obj['bbox'].tolist()
+            detection = {
+                'class': tracked_obj['class_name'],
+                'confidence': float(tracked_obj['confidence']),
+                'bbox': [x1, y1, x2, y2],
+                'track_id': int(tracked_obj['track_id']),
+                'abs_timestamp': current_time,  # 保留绝对时间戳
+                'rel_timestamp': relative_time,  # 添加相对时间戳
+                'frame_number': self.frame_count  # 添加帧号
+            }
+            frame_detections.append(detection)
+        self.detection_log.add(frame_detections)
 
         # 在帧上绘制检测结果和追踪ID
         annotated_frame = frame.copy()
+        if self.roi is not None:
+            self.roi.draw(annotated_frame)
 
         for det in frame_detections:
             x1, y1, x2, y2 = map(int, det['bbox'])
@@ -504,57 +382,18 @@ class Camera:
         info_text = f"唯一煤块数量: {self.unique_coal_count} | 当前帧: {self.frame_index}"
         cv2.putText(annotated_frame, info_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
 
-        # 写入帧到视频文件
+        # 写入帧到视频文件（只放入写入队列，编码在写入线程中进行）
         if self.video_writer is not None:
             self.video_writer.write(annotated_frame)
 
-        # 保存检测结果到JSON文件
-        if self.detection_results:
-            # 分离原始检测结果和唯一煤块统计
-            unique_coal_blocks = {}
+        # 检测结果已追加到日志，汇总文件只定期重写
+        if self.detection_log.summary_due():
+            self.detection_log.write_summary(self._segment_metadata(current_time))
 
-            # 根据track_id整理唯一煤块
-            for detection in self.detection_results:
-                track_id = detection['track_id']
-                if track_id not in unique_coal_blocks:
-                    unique_coal_blocks[track_id] = detection.copy()
-                else:
-                    # 更新已存在煤块的最后出现信息
-                    unique_coal_blocks[track_id]['last_timestamp'] = detection['abs_timestamp']
-                    unique_coal_blocks[track_id]['last_rel_timestamp'] = detection['rel_timestamp']
-                    unique_coal_blocks[track_id]['last_frame'] = detection['frame_number']
-                    # 如果需要更新其他信息，比如置信度等
-                    if detection['confidence'] > unique_coal_blocks[track_id]['confidence']:
-                        unique_coal_blocks[track_id]['confidence'] = detection['confidence']
-                        unique_coal_blocks[track_id]['bbox'] = detection['bbox']
-
-            # 获取唯一煤块列表
-            unique_detections = list(unique_coal_blocks.values())
-
-            # 添加视频元数据信息
-            fps = self.cap.get(cv2.CAP_PROP_FPS)
-            if fps <= 0 or fps > 60:
-                fps = 20.0  # 使用默认值
-            video_metadata = {
-                'start_time': self.video_start_time,
-                'current_time': current_time,
-                'duration': current_time - self.video_start_time,
-                'frame_count': self.frame_count,
-                'fps': fps
-            }
-            # 保存JSON结果
-            with open(self.current_results_path, 'w') as f:
-                json.dump({
-                    'camera_id': self.index,
-                    'video_path': self.current_video_path,
-                    'video_metadata': video_metadata,  # 新增：视频元数据
-                    'detections': self.detection_results,  # 原始检测结果
-                    'unique_detections': unique_detections,  # 唯一煤块结果
-                    'unique_count': len(unique_detections)  # 唯一煤块数量
-                }, f, indent=2)
-
-        # 发送实时检测结果给前端
-        if frame_detections:
+        # 发送实时检测结果给前端：没有检测结果时（如空皮带）也定期发送，前端据此清除检测框并更新推理计数
+        idle_due = (self.last_result_emit_had_detections or
+                    current_time - self.last_result_emit_time >= Config.DETECTION_IDLE_EMIT_INTERVAL)
+        if frame_detections or idle_due:
             normalized_detections = []
             height, width = frame.shape[:2]
 
@@ -580,8 +419,49 @@ class Camera:
                 'count': self.unique_coal_count,  # 发送唯一煤块数量
                 'current_count': len(normalized_detections),  # 当前帧检测数量
                 'frame_count': self.frame_count,  # 当前帧计数
-                'rel_time': relative_time  # 相对时间
+                'rel_time': relative_time,  # 相对时间
+                'inferred_frames': self.inferred_frames,  # 本片段执行推理的帧数
+                'skipped_frames': self.skipped_frames,  # 本片段跳过推理的帧数
+                'dropped_frames': self.detection_consumer.skipped  # 本片段未处理的帧数
             })
+            self.last_result_emit_time = current_time
+            self.last_result_emit_had_detections = bool(frame_detections)
+
+    def _segment_metadata(self, current_time):
+        """当前视频片段的元数据"""
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        if fps <= 0 or fps > 60:
+            fps = 20.0  # 使用默认值
+        return {
+            'start_time': self.video_start_time,
+            'current_time': current_time,
+            'duration': current_time - self.video_start_time,
+            'frame_count': self.frame_count,
+            'fps': fps,
+            'inferred_frames': self.inferred_frames,  # 执行推理的帧数
+            'skipped_frames': self.skipped_frames,  # 画面无变化跳过推理的帧数
+            'dropped_frames': self.detection_consumer.skipped,  # 检测跟不上采集而未处理的帧数
+            'recording': self.video_writer.stats() if self.video_writer is not None else None  # 编码器、丢帧数和编码延迟
+        }
+
+    def _on_segment_saved(self, writer):
+        """视频片段写完后（在写入线程中）通知前端"""
+        stats = writer.stats()
+        if stats['dropped']:
+            print(f"摄像头 {self.index} 片段 {writer.path} 编码跟不上丢弃 {stats['dropped']} 帧，"
+                  f"最大编码延迟 {stats['max_lag_ms']:.0f}ms")
+        socketio.emit('video_saved', {
+            'camera_id': self.index,
+            'file_path': writer.path,
+            'timestamp': time.time(),
+            'recording': stats
+        })
+
+    def _close_detection_log(self, current_time):
+        """片段结束时写入最终汇总并关闭检测日志"""
+        if self.detection_log is not None:
+            self.detection_log.close(self._segment_metadata(current_time))
+            self.detection_log = None
 
     # 开始检测和录制
     def start_detection(self, save_path=None, sensitivity=0.5):
@@ -592,10 +472,19 @@ class Camera:
         # 确保保存目录存在
         os.makedirs(self.save_path, exist_ok=True)
 
-        # 设置模型置信度阈值
-        model.conf = sensitivity
+        # 设置本摄像头的置信度阈值（推理后过滤，不修改共享模型）
+        self.confidence_threshold = sensitivity
+        # 重新开始检测时第一帧必定推理
+        if self.motion_detector is not None:
+            self.motion_detector.reset()
 
+        if not self.ensure_capture():
+            return False
         self.detecting = True
+        if self.detection_thread is None or not self.detection_thread.is_alive():
+            self.detection_thread = threading.Thread(target=self._detection_loop,
+                                                     name=f'camera-{self.index}-detection', daemon=True)
+            self.detection_thread.start()
         return True
 
     # 停止检测和录制
@@ -603,47 +492,79 @@ class Camera:
         """停止检测和录制"""
         self.detecting = False
 
-        # 关闭视频写入器
-        if self.video_writer is not None:
-            self.video_writer.release()
-            self.video_writer = None
-
-            # 通知前端最后一个视频已保存
-            if self.current_video_path:
-                socketio.emit('video_saved', {
-                    'camera_id': self.index,
-                    'file_path': self.current_video_path,
-                    'timestamp': time.time()
-                })
+        # 等待正在处理的帧完成后写入最终汇总并关闭视频写入器
+        with self.detection_lock:
+            self._close_detection_log(time.time())
+            if self.video_writer is not None:
+                # 等待剩余帧编码完成，写完后通知前端最后一个视频已保存
+                self.video_writer.close()
+                self.video_writer = None
 
         return True
 
 
-# 初始化9个摄像头实例
-cameras = [Camera(i) for i in camera_indices]
+# 9个摄像头实例，首次访问时才创建（打开摄像头设备）
+cameras = LazyRegistry('摄像头', lambda i: Camera(camera_indices[i]), len(camera_indices))
 
 
-def generate_frames(camera_id):
-    """生成MJPEG流的帧数据"""
-    while True:
-        frame = cameras[camera_id].get_frame()
-        if frame is None:
-            break
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+def generate_frames(camera_id, tier):
+    """生成MJPEG流的帧数据：订阅摄像头帧广播的指定档位，连接断开时自动退订"""
+    with cameras[camera_id].broadcaster.subscribe([tier]) as subscription:
+        while True:
+            item = subscription.next(timeout=Config.CAPTURE_READ_TIMEOUT)
+            if item is None:
+                if subscription.broadcaster.closed:
+                    break
+                continue
+            data = item[2][tier]
+            cameras[camera_id].mjpeg_meter.add(len(data))
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + data + b'\r\n')
 
 
 def emit_frames(socketio, camera_id):
-    """通过WebSocket发送帧数据"""
-    while True:
-        frame = cameras[camera_id].get_frame()
-        if frame is None:
-            break
-        socketio.emit(f'video_frame_{camera_id}', {
-            'frame': base64.b64encode(frame).decode('utf-8'),
-            'timestamp': time.time()
-        })
-        socketio.sleep(0.05)  # 控制帧率(约20fps)
+    """
+    通过WebSocket发送帧数据：每个摄像头只有一个推送任务，按每个观看者当前的档位分别发送
+    帧以二进制附件发送（帧头 + JPEG，见 utils.frame_broadcast.pack_frame），不再做base64编码；
+    客户端对每帧回执，未回执的帧过多时跳过该观看者并自动降低其档位（见 AdaptiveTier）；
+    发送节奏由截止时间控制，最高 Config.STREAM_MAX_FPS 帧/秒
+    """
+    camera = cameras[camera_id]
+    rate = RateController(Config.STREAM_MAX_FPS, sleep=socketio.sleep)
+    try:
+        with camera.broadcaster.subscribe(()) as subscription:
+            while True:
+                # 在锁内检查订阅者，避免与新订阅的客户端竞争 emitting 标志
+                with camera.stream_lock:
+                    if not camera.stream_clients:
+                        camera.emitting = False
+                        break
+                    viewers = list(camera.stream_clients.items())
+                rate.wait()
+                # 发送队列已满的观看者跳过本帧，只编码其余观看者当前档位
+                receivers = [(sid, viewer) for sid, viewer in viewers if viewer.on_frame()]
+                if not receivers:
+                    continue
+                subscription.set_tiers({viewer.tier for _, viewer in receivers})
+                item = subscription.next(timeout=Config.CAPTURE_READ_TIMEOUT)
+                if item is None:
+                    if subscription.broadcaster.closed:
+                        break
+                    continue
+                frame_number, timestamp, encoded = item
+                payloads = {}
+                for sid, viewer in receivers:
+                    tier = viewer.tier
+                    if tier not in encoded:
+                        continue  # 读取后才切换的档位从下一帧开始发送
+                    if tier not in payloads:
+                        payloads[tier] = pack_frame(camera_id, frame_number, timestamp, encoded[tier])
+                    socketio.emit(f'video_frame_{camera_id}', payloads[tier], to=sid, callback=viewer.on_ack)
+                    viewer.on_sent()
+                    camera.socket_meter.add(len(payloads[tier]))
+    finally:
+        with camera.stream_lock:
+            camera.emitting = False
 
 
 def open_folder(path):
@@ -662,13 +583,60 @@ def open_folder(path):
 
 # ===================== 图像/视频检测部分 =====================
 
-def process_image(image_path):
-    """处理图片检测"""
-    results = model(image_path)  # 直接预测
-    rendered_img = results[0].plot()  # 获取渲染后的图像
+def current_model_version():
+    """当前配置的模型版本标识，参与结果缓存键的计算"""
+    return model_version(Config.MODEL_PATH, Config.INFERENCE_BACKEND, Config.INFERENCE_IMGSZ)
+
+
+def video_cache_params(options):
+    """影响视频检测结果的参数（未指定时按配置的默认值），批大小只影响速度，不参与缓存键"""
+    roi = RegionOfInterest.from_config(options.get('roi') or Config.VIDEO_ROI)
+    return {
+        'version': Config.RESULT_CACHE_VERSION,
+        'track_conf': Config.VIDEO_TRACK_CONF,
+        'stride': options.get('stride') or Config.VIDEO_INFERENCE_STRIDE,
+        'target_fps': options.get('target_fps'),
+        'dense_track_count': Config.VIDEO_DENSE_TRACK_COUNT,
+        'roi': [roi.rect, roi.scale] if roi is not None else None
+    }
+
+
+def store_cached_result(key, kind, content_hash, result_path, detections, summary=None):
+    """把检测结果加入缓存，并按LRU淘汰超出上限的条目"""
+    ResultCacheEntry.store(key, kind, content_hash, result_path, detections, summary,
+                           data_dir=os.path.join(app.config['UPLOAD_FOLDER'], 'cache'),
+                           max_bytes=Config.RESULT_CACHE_MAX_BYTES,
+                           max_entries=Config.RESULT_CACHE_MAX_ENTRIES)
+
+
+def process_image(image_path, output_path=None):
+    """处理图片检测，结果图片默认保存为 uploads/result_<时间戳>.jpg"""
+    image = cv2.imread(image_path)
+    if image is None:
+        print("错误: 无法读取图片文件")
+        return None, []
+    result = engine.get().predict([image], conf=Config.IMAGE_MODEL_CONF)[0]  # 直接预测
+
+    # 获取检测结果数据
+    detections = []
+    for bbox, confidence, class_id in zip(result.boxes, result.confidences, result.class_ids):
+        detections.append({
+            'class': engine.get().names.get(int(class_id), str(class_id)),
+            'confidence': float(confidence),
+            'bbox': bbox.tolist()
+        })
+
+    # 绘制渲染后的图像
+    rendered_img = image
+    for det in detections:
+        x1, y1, x2, y2 = map(int, det['bbox'])
+        color = (0, 255, 0) if det['class'] == 'coal' else (0, 0, 255)
+        cv2.rectangle(rendered_img, (x1, y1), (x2, y2), color, 2)
+        cv2.putText(rendered_img, f"{det['class']} {det['confidence']:.2f}", (x1, y1 - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
 
     # 保存结果图片
-    output_path = os.path.join(app.config['UPLOAD_FOLDER'], f'result_{int(time.time())}.jpg')
+    output_path = output_path or os.path.join(app.config['UPLOAD_FOLDER'], f'result_{int(time.time())}.jpg')
     print(f"尝试保存结果图片到: {output_path}")  # 调试输出
     success = cv2.imwrite(output_path, rendered_img)
     if not success:
@@ -676,20 +644,23 @@ def process_image(image_path):
         return None, []
 
     print(f"图片保存成功，大小: {os.path.getsize(output_path)} 字节")  # 调试输出
-    # 获取检测结果数据
-    detections = []
-    for box in results[0].boxes:
-        detections.append({
-            'class': model.names[int(box.cls)],
-            'confidence': float(box.conf),
-            'bbox': box.xyxy[0].tolist()
-        })
-
     return output_path, detections
 
 
-def process_video(video_path, task_id=None):
-    """处理视频检测，支持进度更新"""
+def process_video(video_path, task_id=None, batch_size=None, stride=None, target_fps=None, roi=None,
+                  progress_callback=None, output_path=None):
+    """处理视频检测，支持进度更新
+
+    参数:
+        batch_size - 每次送入模型的帧数，默认使用 Config.VIDEO_BATCH_SIZE
+        stride - 每隔多少帧做一次检测，中间帧由追踪器的Kalman外推补全，默认使用 Config.VIDEO_INFERENCE_STRIDE
+        target_fps - 目标检测帧率，指定后根据视频帧率换算检测间隔（优先于stride）
+        roi - 只检测的区域，格式同 Config.VIDEO_ROI，默认使用 Config.VIDEO_ROI
+        progress_callback - 进度回调 progress_callback(progress, fps)，每秒最多调用一次
+        output_path - 结果视频路径，默认为 uploads/result_<时间戳>.mp4
+    """
+    batch_size = max(1, int(batch_size or Config.VIDEO_BATCH_SIZE))
+    roi = RegionOfInterest.from_config(roi or Config.VIDEO_ROI)
     print(f"开始处理视频: {video_path}")
     try:
         cap = cv2.VideoCapture(video_path)
@@ -704,96 +675,120 @@ def process_video(video_path, task_id=None):
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         print(f"视频信息: {width}x{height}, {fps}FPS, 总帧数: {total_frames}")
 
+        # 确定检测间隔：目标活跃较多时自适应缩短间隔
+        if target_fps and fps > 0:
+            base_stride = max(1, int(round(fps / float(target_fps))))
+        else:
+            base_stride = max(1, int(stride or Config.VIDEO_INFERENCE_STRIDE))
+        dense_stride = max(1, base_stride // 2)
+        current_stride = base_stride
+        print(f"检测间隔: 每 {base_stride} 帧检测一次（密集时每 {dense_stride} 帧）")
+        if roi is not None:
+            print(f"检测区域: {roi.bounds((height, width))}, 推理像素占整帧 {roi.pixel_ratio((height, width)) * 100:.1f}%")
+
         # 创建输出视频
-        output_path = os.path.join(app.config['UPLOAD_FOLDER'], f'result_{int(time.time())}.mp4')
+        output_path = output_path or os.path.join(app.config['UPLOAD_FOLDER'], f'result_{int(time.time())}.mp4')
 
         # 创建追踪器
-        tracker = Sort(max_age=20, min_hits=2, iou_threshold=0.3)
+        tracker = Sort(max_age=20, min_hits=2, iou_threshold=0.3, gating=Config.TRACKER_GATING,
+                       gating_cell_size=Config.TRACKER_GATING_CELL_SIZE)
 
         # 用于跟踪所有唯一煤块
         all_unique_tracks = {}  # 用ID作为键存储所有唯一煤块
 
-        # 尝试多种编码器
-        codecs = [
-            ('H264', 'H264'),
-            ('avc1', 'avc1'),
-            ('mp4v', 'mp4v')
-        ]
+        # 与实时录制共用视频写入器；离线处理不丢帧，编码跟不上时反压流水线
+        out = open_video_writer(output_path, fps, (width, height), block=True)
 
-        out = None
-        for codec_name, codec_code in codecs:
-            try:
-                fourcc = cv2.VideoWriter.fourcc(*codec_code)
-                out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-                if out.isOpened():
-                    print(f"使用 {codec_name} 编码器成功")
-                    break
-            except Exception as e:
-                print(f"尝试 {codec_name} 编码器失败: {str(e)}")
-                if out:
-                    out.release()
-                out = None
-
-        if not out or not out.isOpened():
-            raise Exception("无法创建输出视频，所有编码器都失败")
-
-        # 处理视频并检测
-        frame_count = 0
+        # 处理视频并检测：解码 → 推理 → 追踪 → 绘制 → 编码 五个阶段并行运行
+        frame_count = 0  # 已追踪的帧数
+        written_count = 0  # 已写入输出视频的帧数
+        inferred_count = 0  # 实际做了检测的帧数
         last_progress_report = time.time()
+        process_start = time.time()
+
+        # 抽帧时每批解码更多帧，使每次推理的批大小仍接近batch_size
+        decode_size = batch_size * base_stride
+        next_infer_index = 0  # 下一次需要检测的帧号
+        decoded_count = 0  # 已送入推理阶段的帧数
+
+        def decode_batches():
+            """解码阶段：按批读取视频帧"""
+            while cap.isOpened():
+                frames = []
+                while len(frames) < decode_size:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    frames.append(frame)
+                if frames:
+                    yield frames
+                # 最后一个批次不满，说明视频已读完
+                if len(frames) < decode_size:
+                    break
 
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            # 使用YOLOv11检测
-            results = model(frame, verbose=False)
-
-
-            # 准备SORT输入
-            det_boxes = []
-            confidences = []
-
-            for box in results[0].boxes:
-                x1, y1, x2, y2 = box.xyxy[0].tolist()
-                confidence = float(box.conf)
-
-                if confidence > 0.3:  # 可调整阈值
-                    det_boxes.append([x1, y1, x2, y2])
-                    confidences.append(confidence)
-
-            # 更新追踪器
-            tracked_objects = np.empty((0, 5))
-            if det_boxes:
-                det_boxes_array = np.array(det_boxes)
-                class_names = ["Coal"] * len(det_boxes)
-                tracked_objects,_ = tracker.update(det_boxes_array, class_names, confidences)
-
-
-            # 绘制结果到帧上
-            annotated_frame = frame.copy()
-
-            for tracked_obj in tracked_objects:
-                x1, y1, x2, y2, track_id = tracked_obj
+        def infer_batch(frames):
+            """
+            推理阶段：只对需要检测的帧批量推理，其余帧的结果为None
+            检测间隔只由本阶段按上一批最后一次检测的目标数决定（不依赖其他阶段的进度），
+            同一视频每次处理检测的帧都相同，结果可以安全地缓存
+            """
+            nonlocal next_infer_index, decoded_count, inferred_count, current_stride
+            selected = []
+            for offset in range(len(frames)):
+                frame_index = decoded_count + offset
+                if frame_index >= next_infer_index:
+                    selected.append(offset)
+                    next_infer_index = frame_index + current_stride
+            decoded_count += len(frames)
+
+            batch_results = [None] * len(frames)
+            if selected:
+                if roi is not None:
+                    inputs = [roi.crop(frames[i]) for i in selected]
+                    results = [roi.restore(result, frames[i].shape)
+                               for i, result in zip(selected, engine.get().predict(inputs, crop=True))]
+                else:
+                    results = engine.get().predict([frames[i] for i in selected])
+                for offset, result in zip(selected, results):
+                    batch_results[offset] = result
+                inferred_count += len(selected)
+
+                # 目标较多时缩短之后批次的检测间隔，保证追踪质量
+                target_count = int((results[-1].confidences > Config.VIDEO_TRACK_CONF).sum())
+                dense = target_count >= Config.VIDEO_DENSE_TRACK_COUNT
+                current_stride = dense_stride if dense else base_stride
+            return frames, batch_results
+
+        def track_batch(batch):
+            """追踪阶段：按帧顺序更新追踪器和唯一煤块信息"""
+            nonlocal frame_count
+            frames, batch_results = batch
+            tracked_frames = []
+            for frame, result in zip(frames, batch_results):
+                if result is None:
+                    # 未检测的中间帧：用Kalman外推补全轨迹
+                    tracked_objects, _ = tracker.coast()
+                else:
+                    # 准备SORT输入
+                    keep = result.confidences > Config.VIDEO_TRACK_CONF  # 可调整阈值
+                    det_boxes = result.boxes[keep]
+                    confidences = result.confidences[keep].tolist()
 
-                # 查找对应的追踪器获取类别和置信度
-                tracker_idx = None
-                for i, trk in enumerate(tracker.trackers):
-                    if trk.id + 1 == track_id:
-                        tracker_idx = i
-                        break
+                    # 更新追踪器；没有检测时也要更新，使未匹配的追踪器老化并被删除，
+                    # 否则之后的 coast() 会一直输出外推的旧目标
+                    class_names = ["Coal"] * len(det_boxes)
+                    tracked_objects, _ = tracker.update(det_boxes.reshape(-1, 4), class_names, confidences)
 
-                if tracker_idx is not None:
-                    trk = tracker.trackers[tracker_idx]
-                    class_name = "Coal"
-                    confidence = trk.confidence
+                for tracked_obj in tracked_objects:
+                    x1, y1, x2, y2 = tracked_obj['bbox'].tolist()
+                    track_id_int = int(tracked_obj['track_id'])
+                    confidence = float(tracked_obj['confidence'])
 
                     # 保存或更新唯一煤块信息
-                    track_id_int = int(track_id)
                     if track_id_int not in all_unique_tracks:
                         # 首次出现，添加到字典
                         all_unique_tracks[track_id_int] = {
-                            'class': class_name,
+                            'class': tracked_obj['class_name'],
                             'confidence': confidence,
                             'bbox': [x1, y1, x2, y2],
                             'track_id': track_id_int,
@@ -808,36 +803,81 @@ def process_video(video_path, task_id=None):
                             all_unique_tracks[track_id_int]['confidence'] = confidence
                             all_unique_tracks[track_id_int]['bbox'] = [x1, y1, x2, y2]
 
+                tracked_frames.append((frame, tracked_objects, frame_count, len(all_unique_tracks)))
+                frame_count += 1
+            return tracked_frames
+
+        def annotate_batch(tracked_frames):
+            """绘制阶段：把追踪结果画到帧上"""
+            annotated_frames = []
+            for frame, tracked_objects, frame_index, unique_count in tracked_frames:
+                # 直接在解码出的帧上绘制，该帧不会再被其他阶段使用
+                annotated_frame = frame
+                if roi is not None:
+                    roi.draw(annotated_frame)
+
+                for tracked_obj in tracked_objects:
+                    x1, y1, x2, y2 = tracked_obj['bbox'].tolist()
+                    class_name = tracked_obj['class_name']
+                    confidence = float(tracked_obj['confidence'])
+
                     # 绘制边界框和标签
                     color = (0, 255, 0) if class_name == 'coal' else (0, 0, 255)
                     cv2.rectangle(annotated_frame, (int(x1), int(y1)), (int(x2), int(y2)), color, 2)
-                    label = f"ID:{int(track_id)} {class_name} {confidence:.2f}"
+                    label = f"ID:{int(tracked_obj['track_id'])} {class_name} {confidence:.2f}"
                     cv2.putText(annotated_frame, label, (int(x1), int(y1) - 10),
                                 cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
 
-            # 添加统计信息
-            info_text = f"唯一煤块数量: {len(all_unique_tracks)} | 帧: {frame_count}/{total_frames}"
-            cv2.putText(annotated_frame, info_text, (10, 30),
+                # 添加统计信息
+                info_text = f"唯一煤块数量: {unique_count} | 帧: {frame_index}/{total_frames}"
+                cv2.putText(annotated_frame, info_text, (10, 30),
                             cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+                annotated_frames.append(annotated_frame)
+            return annotated_frames
 
-            # 写入帧
-            out.write(annotated_frame)
-
-            frame_count += 1
+        def encode_batch(annotated_frames):
+            """编码阶段：写入输出视频并报告进度"""
+            nonlocal written_count, last_progress_report
+            for annotated_frame in annotated_frames:
+                out.write(annotated_frame)
+                written_count += 1
 
             # 每秒报告一次进度
             if time.time() - last_progress_report > 1.0:
-                progress = (frame_count / total_frames) * 100 if total_frames > 0 else 0
-                print(f"视频处理进度: {progress:.1f}% ({frame_count}/{total_frames})")
+                progress = (written_count / total_frames) * 100 if total_frames > 0 else 0
+                print(f"视频处理进度: {progress:.1f}% ({written_count}/{total_frames})")
                 last_progress_report = time.time()
 
                 # 更新任务进度
-                if task_id and task_id in processing_tasks:
-                    processing_tasks[task_id]['progress'] = progress
-                    socketio.emit('video_progress', {
-                        'task_id': task_id,
-                        'progress': progress
-                    })
+                if progress_callback is not None:
+                    progress_callback(progress, written_count / (time.time() - process_start))
+
+        pipeline = Pipeline(decode_batches(), [
+            ('infer', infer_batch),
+            ('track', track_batch),
+            ('annotate', annotate_batch),
+            ('encode', encode_batch)
+        ], queue_size=Config.VIDEO_PIPELINE_QUEUE_SIZE)
+        stage_stats = pipeline.run()
+        encoder_stats = out.close()
+        if encoder_stats['error']:
+            raise Exception(f"视频编码失败: {encoder_stats['error']}")
+
+        # 统计处理速度和各阶段忙碌比例，便于找出瓶颈并按机器调整批大小
+        process_time = time.time() - process_start
+        processing_fps = frame_count / process_time if process_time > 0 else 0
+        inference_time = stage_stats['infer']['busy_time']
+        inference_fps = inferred_count / inference_time if inference_time > 0 else 0
+        # 实际检测帧率：每秒视频中做了多少次检测
+        video_duration = frame_count / fps if fps > 0 else 0
+        effective_inference_rate = inferred_count / video_duration if video_duration > 0 else 0
+        print(f"视频处理速度: {processing_fps:.1f} 帧/秒 (推理 {inference_fps:.1f} 帧/秒, 批大小 {batch_size})")
+        print(f"检测帧数: {inferred_count}/{frame_count}, 实际检测帧率: {effective_inference_rate:.2f} 次/秒")
+        for stage_name, stats in stage_stats.items():
+            print(f"  阶段 {stage_name}: 忙碌 {stats['utilization'] * 100:.1f}%, "
+                  f"等待输入 {stats['wait_time']:.2f}s, 被反压 {stats['blocked_time']:.2f}s")
+        print(f"瓶颈阶段: {pipeline.bottleneck()}")
+
         # 整理所有唯一煤块信息为列表
         final_detections = list(all_unique_tracks.values())
         # 按ID排序
@@ -854,7 +894,18 @@ def process_video(video_path, task_id=None):
                 'medium': 0,
                 'large': 0
             },
-            'frame_distribution': {}
+            'frame_distribution': {},
+            'batch_size': batch_size,
+            'processing_fps': processing_fps,  # 整体处理速度（帧/秒）
+            'inference_fps': inference_fps,  # 仅模型推理的速度（帧/秒）
+            'stage_utilization': {name: stats['utilization'] for name, stats in stage_stats.items()},
+            'encoder': encoder_stats['backend'],  # 输出视频的编码器（ffmpeg / opencv）
+            'encoder_lag_ms': encoder_stats['max_lag_ms'],  # 帧从入队到编码完成的最大延迟
+            'inference_stride': base_stride,  # 基础检测间隔（帧）
+            'inferred_frames': inferred_count,  # 实际检测的帧数
+            'effective_inference_rate': effective_inference_rate,  # 实际检测帧率（次/秒视频）
+            'roi': list(roi.bounds((height, width))) if roi is not None else None,  # 检测区域（整帧坐标）
+            'roi_scale': roi.scale if roi is not None else 1.0
         }
 
         # 计算煤块大小分布
@@ -885,7 +936,6 @@ def process_video(video_path, task_id=None):
 
         # 清理资源
         cap.release()
-        out.release()
 
         # 验证输出文件
         if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
@@ -902,49 +952,57 @@ def process_video(video_path, task_id=None):
         if 'cap' in locals() and cap:
             cap.release()
         if 'out' in locals() and out:
-            out.release()
+            out.close()
         raise e
 
 
-def background_process_video(video_path, task_id):
-    """后台处理视频的任务"""
-    try:
-        # 更新任务状态为处理中
-        processing_tasks[task_id]['status'] = 'processing'
-        processing_tasks[task_id]['progress'] = 0
-
-        # 处理视频
-        result_path, detections,summary = process_video(video_path, task_id)
-
-        # 更新任务状态为已完成
-        processing_tasks[task_id] = {
-            'status': 'completed',
-            'result_path': result_path,
-            'detections': detections,
-            'unique_count': len(detections),  # 唯一煤块数
-            'summary': summary,
-            'progress': 100
-        }
-
-        # 向所有客户端广播任务完成事件
-        # socketio.emit('task_completed', {
-        #     'task_id': task_id,
-        #     'result_url': f'/results/{os.path.basename(result_path)}'
-        # })
-
-    except Exception as e:
-        print(f"视频处理失败: {str(e)}")
-        # 更新任务状态为失败
-        processing_tasks[task_id] = {
-            'status': 'failed',
-            'error': str(e)
-        }
-
-        # 向所有客户端广播任务失败事件
-        socketio.emit('task_failed', {
-            'task_id': task_id,
-            'error': str(e)
-        })
+def init_video_worker():
+    """视频处理进程的初始化：降低进程优先级，避免与实时摄像头争抢CPU，并预先加载模型"""
+    if Config.VIDEO_WORKER_NICE and hasattr(os, 'nice'):
+        os.nice(Config.VIDEO_WORKER_NICE)
+    engine.get()
+
+
+def run_video_job(task_id, payload, report):
+    """在视频处理进程中执行的任务，进度通过 report 回传主进程"""
+    def report_progress(progress, fps):
+        report('progress', {'progress': progress, 'fps': fps})
+
+    result_path, detections, summary = process_video(payload['video_path'], task_id,
+                                                     progress_callback=report_progress,
+                                                     output_path=payload.get('output_path'), **payload['options'])
+    return {'result_path': result_path, 'detections': detections, 'summary': summary,
+            'cache_key': payload.get('cache_key'), 'content_hash': payload.get('content_hash')}
+
+
+def handle_video_job_event(task_id, event, data):
+    """主进程中处理视频任务事件：更新数据库中的任务状态并通知前端"""
+    with app.app_context():
+        if event == 'started':
+            # 更新任务状态为处理中
+            Task.mark_processing(task_id)
+        elif event == 'progress':
+            Task.update_progress(task_id, data['progress'], data['fps'])
+            socketio.emit('video_progress', {
+                'task_id': task_id,
+                'progress': data['progress']
+            })
+        elif event == 'completed':
+            # 保存结果：汇总信息和逐个煤块的检测明细
+            Task.complete(task_id, data['result_path'], data['detections'], data['summary'])
+            if Config.RESULT_CACHE_ENABLED and data.get('cache_key'):
+                store_cached_result(data['cache_key'], 'video', data['content_hash'], data['result_path'],
+                                    data['detections'], data['summary'])
+        elif event == 'failed':
+            print(f"视频处理失败: {data}")
+            # 更新任务状态为失败
+            Task.fail(task_id, data)
+
+            # 向所有客户端广播任务失败事件
+            socketio.emit('task_failed', {
+                'task_id': task_id,
+                'error': data
+            })
 
 
 def upgrade_detection_files():
@@ -1021,13 +1079,25 @@ def video_feed(camera_id):
     """提供MJPEG流的路由"""
     if 0 <= camera_id < len(cameras):
         if cameras[camera_id].cap is not None:
-            return Response(generate_frames(camera_id),
+            tier = request.args.get('tier', Config.PREVIEW_DEFAULT_TIER)
+            if tier not in Config.PREVIEW_TIERS:
+                return f"Invalid tier, expected one of {', '.join(Config.PREVIEW_TIERS)}", 400
+            return Response(generate_frames(camera_id, tier),
                             mimetype='multipart/x-mixed-replace; boundary=frame')
         else:
             return "Camera not connected", 404
     return "Invalid camera ID", 404
 
 
+@app.route('/api/camera/<int:camera_id>/stats', methods=['GET'])
+@token_required
+def camera_stats(current_user, camera_id):
+    """摄像头的采集、预览和检测帧计数（含丢帧数）"""
+    if not 0 <= camera_id < len(cameras):
+        return jsonify({'error': 'Invalid camera ID'}), 404
+    return jsonify(cameras[camera_id].stats())
+
+
 # 检测API路由
 @app.route('/api/detect/image', methods=['POST'])
 @token_required
@@ -1040,12 +1110,28 @@ def detect_image(current_user):
     if file.filename == '':
         return jsonify({'error': 'No selected file'}), 400
 
-    filename = secure_filename(file.filename)
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file.save(filepath)
+    # 边保存边计算内容哈希，按哈希命名，不会覆盖同名的其他上传
+    filepath, content_hash = save_upload_hashed(file, app.config['UPLOAD_FOLDER'])
+
+    # 相同图片、相同模型和阈值的检测结果直接从缓存返回
+    key = cache_key('image', content_hash, current_model_version(),
+                    {'version': Config.RESULT_CACHE_VERSION, 'conf': Config.IMAGE_MODEL_CONF})
+    if Config.RESULT_CACHE_ENABLED:
+        entry = ResultCacheEntry.lookup(key)
+        if entry is not None:
+            detections, _ = entry.load_data()
+            result_path = entry.link_result(os.path.join(app.config['UPLOAD_FOLDER'], f'result_{key[:16]}.jpg'))
+            return jsonify({
+                'result_url': f'/results/{os.path.basename(result_path)}',
+                'detections': detections,
+                'cached': True
+            })
 
     try:
-        result_path, detections = process_image(filepath)
+        output_path = os.path.join(app.config['UPLOAD_FOLDER'], f'result_{key[:16]}.jpg')
+        result_path, detections = process_image(filepath, output_path)
+        if Config.RESULT_CACHE_ENABLED and result_path:
+            store_cached_result(key, 'image', content_hash, result_path, detections)
         return jsonify({
             'result_url': f'/results/{os.path.basename(result_path)}',
             'detections': detections
@@ -1054,6 +1140,81 @@ def detect_image(current_user):
         return jsonify({'error': str(e)}), 500
 
 
+def parse_video_options(params):
+    """
+    解析视频检测的可选参数：推理批大小、检测间隔（帧）或目标检测帧率，
+    以及检测区域 roi="x1,y1,x2,y2"（整帧像素坐标）和裁剪后的缩放比例 roi_scale
+    参数:
+        params - request.form 或由JSON请求体构造的 MultiDict
+    返回:
+        options字典；roi无效时抛出 ValueError
+    """
+    options = {
+        'batch_size': params.get('batch_size', type=int),
+        'stride': params.get('stride', type=int),
+        'target_fps': params.get('target_fps', type=float)
+    }
+    roi = params.get('roi')
+    if roi:
+        try:
+            values = roi.split(',') if isinstance(roi, str) else roi
+            rect = [int(float(v)) for v in values]
+            options['roi'] = RegionOfInterest(rect, params.get('roi_scale', 1.0, type=float))
+        except (ValueError, TypeError) as e:
+            raise ValueError(f'Invalid roi: {str(e)}')
+    return options
+
+
+def submit_video_task(current_user, filepath, content_hash, options):
+    """为已保存的视频创建检测任务：命中结果缓存时直接完成，否则加入视频处理队列，返回响应"""
+    # 创建唯一任务ID
+    task_id = str(uuid.uuid4())
+    # 记录哪个用户创建的任务，以及由本进程的哪个队列处理
+    task, error = Task.create_task(task_id, current_user['sub'], owner=video_jobs.get().instance_id)
+    if task is None:
+        return jsonify({'error': error}), 500
+
+    # 相同视频、相同模型和参数已处理过时直接完成任务，不再排队
+    key = cache_key('video', content_hash, current_model_version(), video_cache_params(options))
+    if Config.RESULT_CACHE_ENABLED:
+        entry = ResultCacheEntry.lookup(key)
+        if entry is not None:
+            # 任务使用自己的结果文件链接，缓存条目被淘汰时不受影响
+            detections, summary = entry.load_data()
+            result_path = entry.link_result(os.path.join(app.config['UPLOAD_FOLDER'], f'result_{task_id}.mp4'))
+            Task.complete(task_id, result_path, detections, summary)
+            return jsonify({
+                'task_id': task_id,
+                'status': 'completed',
+                'progress': 100,
+                'cached': True
+            })
+
+    # 确保过期任务清理线程已启动
+    workers.ensure('cleanup_tasks')
+
+    # 加入视频处理队列，由工作进程按顺序处理
+    try:
+        position = video_jobs.get().submit(task_id, current_user['sub'], {
+            'video_path': filepath,
+            'options': options,
+            'output_path': os.path.join(app.config['UPLOAD_FOLDER'], f'result_{task_id}.mp4'),
+            'cache_key': key,
+            'content_hash': content_hash
+        })
+    except QueueFullError:
+        Task.delete_task(task_id)
+        return jsonify({'error': 'Too many videos waiting to be processed, please try again later'}), 503
+
+    # 立即返回任务ID和排队位置
+    return jsonify({
+        'task_id': task_id,
+        'status': 'queued' if position else 'processing',
+        'progress': 0,
+        'queue_position': position  # 0表示已开始处理
+    })
+
+
 @app.route('/api/detect/video', methods=['POST'])
 @token_required
 def detect_video(current_user):
@@ -1065,109 +1226,232 @@ def detect_video(current_user):
     if file.filename == '':
         return jsonify({'error': 'No selected file'}), 400
 
-    filename = secure_filename(file.filename)
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file.save(filepath)
+    try:
+        options = parse_video_options(request.form)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-    # 创建唯一任务ID
-    task_id = str(uuid.uuid4())
-    processing_tasks[task_id] = {
-        'status': 'initialized',
-        'progress': 0,
-        'created_at': time.time(),
-        'user_id': current_user['sub']  # 记录哪个用户创建的任务
-    }
+    # 边保存边计算内容哈希，按哈希命名，不会覆盖同名的其他上传
+    filepath, content_hash = save_upload_hashed(file, app.config['UPLOAD_FOLDER'])
+    return submit_video_task(current_user, filepath, content_hash, options)
 
-    # 启动后台任务
-    thread = threading.Thread(target=background_process_video, args=(filepath, task_id))
-    thread.daemon = True
-    thread.start()
 
-    # 立即返回任务ID
-    return jsonify({
-        'task_id': task_id,
-        'status': 'processing',
-        'progress': 0
-    })
+def find_user_upload(current_user, upload_id):
+    """查找当前用户的分片上传，返回 (upload, 错误响应)"""
+    upload = ChunkedUpload.find_by_upload_id(upload_id)
+    if upload is None:
+        return None, (jsonify({'error': 'Upload not found'}), 404)
+    if current_user['role'] != 'admin' and upload.user_id != current_user['sub']:
+        return None, (jsonify({'error': 'Unauthorized access to this upload'}), 403)
+    return upload, None
+
+
+@app.route('/api/upload/video', methods=['POST'])
+@token_required
+def init_chunked_upload(current_user):
+    """
+    开始分片上传视频
+    请求体(JSON): {"filename": "a.mp4", "size": 文件字节数, "chunk_size": 可选的分片大小}
+    文件直接在上传目录中按总大小预先分配，之后每个分片写入各自的偏移位置
+    """
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename') or ''
+    try:
+        size = int(data.get('size', 0))
+        chunk_size = int(data.get('chunk_size') or Config.UPLOAD_CHUNK_SIZE)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'size and chunk_size must be integers'}), 400
+
+    if not filename:
+        return jsonify({'error': 'filename is required'}), 400
+    if size <= 0 or size > Config.CHUNKED_UPLOAD_MAX_SIZE:
+        return jsonify({'error': f'size must be between 1 and {Config.CHUNKED_UPLOAD_MAX_SIZE} bytes'}), 400
+    chunk_size = max(Config.UPLOAD_CHUNK_SIZE_MIN, min(chunk_size, Config.UPLOAD_CHUNK_SIZE_MAX))
+
+    upload_id = str(uuid.uuid4())
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    # 以点号开头的临时名，完成后在同一目录内按内容哈希重命名
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], f'.chunked_{upload_id}{upload_extension(filename)}')
+    upload, error = ChunkedUpload.create_upload(upload_id, current_user['sub'], filename, file_path,
+                                                size, chunk_size)
+    if upload is None:
+        return jsonify({'error': error}), 500
+
+    workers.ensure('cleanup_tasks')
+    return jsonify(upload.to_dict()), 201
+
+
+@app.route('/api/upload/video/<upload_id>', methods=['GET'])
+@token_required
+def get_chunked_upload(current_user, upload_id):
+    """查询分片上传进度，断线后客户端据 missing_chunks 只重传缺失的分片"""
+    upload, error_response = find_user_upload(current_user, upload_id)
+    if upload is None:
+        return error_response
+    return jsonify(upload.to_dict())
+
+
+@app.route('/api/upload/video/<upload_id>/chunks/<int:index>', methods=['PUT'])
+@token_required
+def put_upload_chunk(current_user, upload_id, index):
+    """
+    上传一个分片：请求体为分片的原始字节（application/octet-stream），
+    请求头 X-Chunk-SHA256 为该分片的SHA-256；分片边读边写入文件的对应位置，不经过临时文件
+    """
+    upload, error_response = find_user_upload(current_user, upload_id)
+    if upload is None:
+        return error_response
+    if upload.status != 'uploading':
+        return jsonify({'error': 'Upload already completed'}), 409
+    if index < 0 or index >= upload.total_chunks:
+        return jsonify({'error': f'Chunk index must be between 0 and {upload.total_chunks - 1}'}), 400
+
+    expected_checksum = (request.headers.get('X-Chunk-SHA256') or '').strip().lower()
+    if not expected_checksum:
+        return jsonify({'error': 'X-Chunk-SHA256 header is required'}), 400
+
+    offset, length = upload.chunk_range(index)
+    if request.content_length != length:
+        return jsonify({'error': f'Chunk {index} must be {length} bytes'}), 400
+
+    written, checksum = write_chunk(upload.file_path, offset, request.stream, length)
+    if written != length:
+        return jsonify({'error': f'Incomplete chunk: received {written} of {length} bytes'}), 400
+    if checksum != expected_checksum:
+        # 校验失败的分片不记录，客户端重传即可覆盖
+        return jsonify({'error': 'Chunk checksum mismatch', 'sha256': checksum}), 422
+
+    upload.mark_chunk(index, checksum)
+    return jsonify({'index': index, 'sha256': checksum})
+
+
+@app.route('/api/upload/video/<upload_id>/complete', methods=['POST'])
+@token_required
+def complete_chunked_upload(current_user, upload_id):
+    """
+    完成分片上传并创建视频检测任务
+    请求体(JSON或表单)可带与 /api/detect/video 相同的处理参数；
+    文件在上传目录内按内容哈希重命名后直接交给视频处理队列，不再复制
+    """
+    upload, error_response = find_user_upload(current_user, upload_id)
+    if upload is None:
+        return error_response
+    if upload.status != 'uploading':
+        return jsonify({'error': 'Upload already completed', 'task_id': upload.task_id}), 409
+
+    missing = upload.missing_indices()
+    if missing:
+        return jsonify({'error': 'Upload is incomplete', 'missing_chunks': missing}), 400
+
+    try:
+        params = request.form if request.form else MultiDict(request.get_json(silent=True) or {})
+        options = parse_video_options(params)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # 分片已各自校验过，这里再完整读一遍文件得到内容哈希（用于结果缓存和去重命名）
+    content_hash = hash_file(upload.file_path)
+    # 按内容哈希命名的文件可能被相同内容的其他上传和任务共用，上传会话不持有它：
+    # 提交成功前会话仍指向自己的分片文件，取消或过期清理时只删除分片文件
+    part_path = upload.file_path
+    filepath = adopt_upload(part_path, content_hash, os.path.splitext(part_path)[1], keep_source=True)
+
+    response = submit_video_task(current_user, filepath, content_hash, options)
+    if isinstance(response, tuple):
+        # 任务创建失败或队列已满：保留上传会话和分片文件，客户端稍后可再次调用 complete
+        return response
+    upload.mark_completed(filepath, response.get_json()['task_id'])
+    if os.path.abspath(part_path) != os.path.abspath(filepath) and os.path.exists(part_path):
+        os.remove(part_path)
+    return response
+
+
+@app.route('/api/upload/video/<upload_id>', methods=['DELETE'])
+@token_required
+def cancel_chunked_upload(current_user, upload_id):
+    """取消分片上传，删除已写入的文件"""
+    upload, error_response = find_user_upload(current_user, upload_id)
+    if upload is None:
+        return error_response
+    upload.delete()
+    return jsonify({'message': 'Upload cancelled'})
 
 
 @app.route('/api/task/<task_id>', methods=['GET'])
 @token_required
 def get_task_status(current_user, task_id):
     """获取任务状态"""
-    if task_id not in processing_tasks:
+    task = Task.find_by_task_id(task_id)
+    if task is None:
         return jsonify({'error': 'Task not found'}), 404
 
-    task = processing_tasks[task_id]
-
     # 检查该任务是否属于当前用户，管理员除外
-    if current_user['role'] != 'admin' and task.get('user_id') != current_user['sub']:
+    if current_user['role'] != 'admin' and task.user_id != current_user['sub']:
         return jsonify({'error': 'Unauthorized access to this task'}), 403
 
-    if task['status'] == 'completed':
+    if task.status == 'completed':
         # 默认只返回汇总信息和前10个示例
         include_details = request.args.get('details', 'false').lower() == 'true'
 
         response_data = {
             'status': 'completed',
-            'result_url': f'/results/{os.path.basename(task["result_path"])}',
-            'unique_count': task.get('unique_count', 0),
-            'summary': task.get('summary', {})
+            'result_url': f'/results/{os.path.basename(task.result_path)}',
+            'unique_count': task.unique_count,
+            'summary': task.get_summary()
         }
 
         # 只有当客户端请求时才返回详细数据
         if include_details:
-            response_data['detections'] = task['detections']
+            response_data['detections'] = task.get_detections()
         else:
             # 只返回前10个作为示例
-            response_data['detections'] = task['detections'][:10] if len(task['detections']) > 10 else task[
-                'detections']
-            response_data['has_more_detections'] = len(task['detections']) > 10
+            response_data['detections'] = task.get_detections(limit=10)
+            response_data['has_more_detections'] = task.unique_count > 10
 
         return jsonify(response_data)
 
-    elif task['status'] == 'failed':
+    elif task.status == 'failed':
         # 如果任务失败，返回错误信息
         return jsonify({
             'status': 'failed',
-            'error': task.get('error', 'Unknown error')
+            'error': task.error or 'Unknown error'
         }), 500
     else:
-        # 如果任务仍在处理，返回进度信息
-        return jsonify({
-            'status': task['status'],
-            'progress': task.get('progress', 0)
-        })
+        # 如果任务仍在处理，返回进度信息；排队中的任务返回排队位置
+        response_data = {
+            'status': task.status,
+            'progress': task.progress,
+            'fps': task.fps  # 当前处理速度（帧/秒）
+        }
+        if task.status == 'queued':
+            # 排队位置只有接收该任务的进程知道，多进程部署时其他进程返回None
+            position = video_jobs.get().position(task_id) if video_jobs.loaded else 0
+            response_data['queue_position'] = position or None  # 1表示下一个处理
+        return jsonify(response_data)
 
 
 @app.route('/api/task/<task_id>/detections', methods=['GET'])
 @token_required
 def get_task_detections(current_user, task_id):
     """获取任务的完整检测结果"""
-    if task_id not in processing_tasks:
+    task = Task.find_by_task_id(task_id)
+    if task is None:
         return jsonify({'error': 'Task not found'}), 404
 
-    task = processing_tasks[task_id]
-
     # 检查该任务是否属于当前用户，管理员除外
-    if current_user['role'] != 'admin' and task.get('user_id') != current_user['sub']:
+    if current_user['role'] != 'admin' and task.user_id != current_user['sub']:
         return jsonify({'error': 'Unauthorized access to this task'}), 403
 
-    if task['status'] != 'completed':
+    if task.status != 'completed':
         return jsonify({'error': 'Task not completed yet'}), 400
 
-    # 支持分页
+    # 支持分页，只从数据库读取当前页
     page = int(request.args.get('page', 1))
     page_size = int(request.args.get('page_size', 20))
 
-    detections = task.get('detections', [])
-    total_count = len(detections)
-
-    # 计算分页
-    start_idx = (page - 1) * page_size
-    end_idx = min(start_idx + page_size, total_count)
-
-    page_detections = detections[start_idx:end_idx]
+    total_count = task.detection_count()
+    start_idx = max(0, (page - 1) * page_size)
+    page_detections = task.get_detections(offset=start_idx, limit=max(0, page_size))
 
     return jsonify({
         'detections': page_detections,
@@ -1265,15 +1549,39 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     print('Client disconnected')
+    # 断开的客户端不再计入各摄像头的订阅者
+    for camera in cameras.loaded().values():
+        with camera.stream_lock:
+            camera.stream_clients.pop(request.sid, None)
 
 
 @socketio.on('start_stream')
 def handle_start_stream(data):
-    """客户端请求开始流"""
+    """
+    客户端请求开始流，tier 为请求的预览档位（thumb/grid/full 等，见 Config.PREVIEW_TIERS），
+    已在观看时再次请求用于切换档位（如宫格切换到全屏）
+    """
     camera_id = data.get('camera_id', 0)
+    tier = data.get('tier', Config.PREVIEW_DEFAULT_TIER)
+    if tier not in Config.PREVIEW_TIERS:
+        return {'success': False, 'error': f'无效的预览档位: {tier}'}
     if 0 <= camera_id < len(cameras):
-        cameras[camera_id].clients += 1
-        if cameras[camera_id].clients == 1:
+        camera = cameras[camera_id]
+        with camera.stream_lock:
+            viewer = camera.stream_clients.get(request.sid)
+            if viewer is not None:
+                viewer.request(tier)
+            else:
+                camera.stream_clients[request.sid] = AdaptiveTier(
+                    list(Config.PREVIEW_TIERS), tier,
+                    max_pending=Config.STREAM_MAX_PENDING,
+                    downgrade_after=Config.STREAM_DOWNGRADE_AFTER,
+                    upgrade_after=Config.STREAM_UPGRADE_AFTER,
+                    ack_timeout=Config.STREAM_ACK_TIMEOUT
+                )
+            start = not camera.emitting
+            camera.emitting = True
+        if start:
             socketio.start_background_task(emit_frames, socketio, camera_id)
 
 
@@ -1282,7 +1590,8 @@ def handle_stop_stream(data):
     """客户端请求停止流"""
     camera_id = data.get('camera_id', 0)
     if 0 <= camera_id < len(cameras):
-        cameras[camera_id].clients -= 1
+        with cameras[camera_id].stream_lock:
+            cameras[camera_id].stream_clients.pop(request.sid, None)
 
 
 @socketio.on('start_detection')
@@ -1295,6 +1604,8 @@ def handle_start_detection(data):
     try:
         if 0 <= camera_id < len(cameras) and cameras[camera_id].cap is not None:
             success = cameras[camera_id].start_detection(save_path, sensitivity)
+            if not success:
+                return {'success': False, 'error': '摄像头无法打开'}
             return {'success': success}
         else:
             return {'success': False, 'error': '摄像头未连接'}
@@ -1329,24 +1640,40 @@ def handle_open_save_folder(data):
 
 # 清理过期任务的后台线程
 def cleanup_tasks():
-    """定期清理完成或失败超过1小时的任务"""
+    """定期删除完成或失败超过 Config.TASK_TTL 秒的任务，并把长时间没有进度的任务标记为失败"""
     while True:
-        time.sleep(3600)  # 每小时运行一次
-        current_time = time.time()
-        task_ids_to_remove = []
-
-        for task_id, task in processing_tasks.items():
-            # 如果任务已完成或失败，且超过1小时
-            if (task['status'] in ['completed', 'failed'] and
-                    current_time - task.get('created_at', current_time) > 3600):
-                task_ids_to_remove.append(task_id)
-
-        # 移除过期任务
-        for task_id in task_ids_to_remove:
-            del processing_tasks[task_id]
-
-        if task_ids_to_remove:
-            print(f"已清理 {len(task_ids_to_remove)} 个过期任务")
+        time.sleep(Config.TASK_CLEANUP_INTERVAL)
+        # 本进程队列中等待或执行中的任务不算中断；其他进程的排队任务由 task_heartbeat 按心跳判断
+        owner, active_ids = None, set()
+        if video_jobs.loaded:
+            owner, active_ids = video_jobs.get().instance_id, video_jobs.get().active_jobs()
+        with app.app_context():
+            stalled = Task.fail_stalled(Config.TASK_STALL_TIMEOUT, owner, active_ids)
+            removed = Task.purge_expired(Config.TASK_TTL)
+            TaskQueueInstance.purge_expired(Config.TASK_TTL)
+            removed_uploads = ChunkedUpload.purge_expired(Config.UPLOAD_TTL)
+
+        if stalled:
+            print(f"已将 {stalled} 个中断的任务标记为失败")
+        if removed:
+            print(f"已清理 {removed} 个过期任务")
+        if removed_uploads:
+            print(f"已清理 {removed_uploads} 个过期的分片上传")
+
+
+def task_heartbeat():
+    """
+    刷新本进程视频队列的心跳，并把所属队列已停止心跳的排队任务标记为失败
+    （多进程部署时各进程的队列都在各自内存中，进程退出或重启后其中的任务无法恢复）
+    """
+    while True:
+        with app.app_context():
+            if video_jobs.loaded:
+                TaskQueueInstance.heartbeat(video_jobs.get().instance_id)
+            lost = Task.fail_orphaned(TaskQueueInstance.live_ids(Config.TASK_HEARTBEAT_TIMEOUT))
+        if lost:
+            print(f"已将 {lost} 个所在队列已停止的排队任务标记为失败")
+        time.sleep(Config.TASK_HEARTBEAT_INTERVAL)
 
 
 # 添加新API路由，用于获取检测历史和视频列表
@@ -1517,6 +1844,33 @@ def get_detection_results(current_user, date, filename):
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/surveillance/detection/<date>/<filename>/window')
+@token_required
+def get_detection_window(current_user, date, filename):
+    """
+    获取视频片段中某个时间窗口内的逐帧检测结果（播放器按播放位置分段获取）
+    参数: start, end - 相对片段开始的秒数
+    有列式文件时只按帧索引读取窗口内的行，否则读取原始检测结果后过滤
+    """
+    start = request.args.get('start', 0.0, type=float)
+    end = request.args.get('end', float('inf'), type=float)
+    summary_path = os.path.join(DEFAULT_SAVE_PATH, date, f"{filename.rsplit('.', 1)[0]}.json")
+    if not os.path.exists(summary_path):
+        return jsonify({'error': 'Detection results not found'}), 404
+
+    try:
+        index_path = segment_index_path(summary_path)
+        if os.path.exists(index_path):
+            with SegmentColumns(index_path) as columns:
+                detections = columns.window(start, end)
+        else:
+            detections = [det for det in read_detection_log(summary_path)
+                          if start <= det.get('rel_timestamp', 0) <= end]
+        return jsonify({'detections': detections, 'count': len(detections)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 # 全局错误处理
 @app.errorhandler(500)
 def internal_error(error):
@@ -1530,10 +1884,27 @@ def handle_connection_error(error):
     return '', 499  # 客户端关闭请求
 
 
-# 启动清理任务线程
-cleanup_thread = threading.Thread(target=cleanup_tasks)
-cleanup_thread.daemon = True
-cleanup_thread.start()
+# 登记清理任务线程（不在导入时启动）
+workers.register('cleanup_tasks', cleanup_tasks)
+workers.register('task_heartbeat', task_heartbeat)
+
+
+def create_app(load_runtime=True):
+    """
+    应用工厂：返回配置好的 Flask 应用
+    导入本模块不会加载模型、打开摄像头或启动后台线程（db_init.py 等脚本只需要数据库）；
+    load_runtime=True 时作为启动钩子一次性完成这些初始化，否则在首次使用时再加载
+    """
+    os.makedirs(DEFAULT_SAVE_PATH, exist_ok=True)
+    if load_runtime:
+        start = time.perf_counter()
+        engine.get().warmup()
+        camera_time = cameras.load_all()
+        workers.start_all()  # task_heartbeat 会把上次进程遗留的排队任务标记为失败
+        video_jobs.get().start()
+        print(f"运行时初始化完成，耗时 {time.perf_counter() - start:.2f}秒"
+              f"（模型 {engine.load_time:.2f}秒，摄像头 {camera_time:.2f}秒）")
+    return app
 
 
 # 初始化管理员账户
@@ -1555,8 +1926,8 @@ def init_admin_account():
 
 # 启动应用
 if __name__ == '__main__':
-    # 确保保存目录存在
-    os.makedirs(DEFAULT_SAVE_PATH, exist_ok=True)
+    # 确保保存目录存在，并加载模型、打开摄像头、启动后台线程
+    create_app(load_runtime=True)
 
     # 初始化管理员账户
     # init_admin_account()
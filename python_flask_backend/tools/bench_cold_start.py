@@ -0,0 +1,94 @@
+"""
+冷启动耗时测试：每个测量都在新的Python进程中进行
+
+测量项:
+    import - 导入 newApp（db_init.py 等脚本只需要这一步）
+    engine - 导入并加载推理引擎
+    first_inference - 导入、加载引擎并完成第一次推理
+    startup - create_app(load_runtime=True) 完整启动（加载模型、打开摄像头、启动后台线程）
+
+用法（在 python_flask_backend 目录下运行）:
+    python -m tools.bench_cold_start
+    python -m tools.bench_cold_start --stages import engine --repeat 5
+
+默认使用内存SQLite数据库，测试不依赖MySQL服务；可用 --db-uri 指定。
+在改动前后的代码上分别运行即可对比冷启动时间。
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+HEAVY_MODULES = ('ultralytics', 'torch', 'scipy', 'onnxruntime', 'openvino')
+
+STAGE_SCRIPTS = {
+    'import': """
+import newApp
+""",
+    'engine': """
+import newApp
+newApp.engine.get()
+""",
+    'first_inference': """
+import numpy as np
+import newApp
+newApp.engine.get().predict([np.zeros((960, 1280, 3), dtype=np.uint8)])
+""",
+    'startup': """
+import newApp
+newApp.create_app(load_runtime=True)
+"""
+}
+
+RUNNER = """
+import json, sys, time
+start = time.perf_counter()
+exec(compile({script!r}, 'bench', 'exec'))
+elapsed = time.perf_counter() - start
+print('BENCH_RESULT ' + json.dumps({{
+    'seconds': elapsed,
+    'modules': [m for m in {modules!r} if m in sys.modules]
+}}))
+"""
+
+
+def run_stage(stage, db_uri):
+    """在新进程中执行一项测量，返回 (耗时秒, 已加载的重量级模块)"""
+    env = dict(os.environ, DATABASE_URI=db_uri)
+    code = RUNNER.format(script=STAGE_SCRIPTS[stage], modules=HEAVY_MODULES)
+    process = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env)
+    for line in process.stdout.splitlines():
+        if line.startswith('BENCH_RESULT '):
+            result = json.loads(line[len('BENCH_RESULT '):])
+            return result['seconds'], result['modules']
+    error = process.stderr.strip().splitlines()
+    raise RuntimeError(error[-1] if error else f'进程退出码 {process.returncode}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='冷启动耗时测试')
+    parser.add_argument('--stages', nargs='+', default=['import', 'engine', 'first_inference'],
+                        choices=list(STAGE_SCRIPTS))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--db-uri', default='sqlite:///:memory:', help='测试使用的数据库URI')
+    args = parser.parse_args()
+
+    print(f"\n{'测量项':<16} | {'中位耗时(秒)':>12} | {'最短(秒)':>9} | 已加载的重量级模块")
+    for stage in args.stages:
+        samples = []
+        modules = []
+        try:
+            for _ in range(args.repeat):
+                seconds, modules = run_stage(stage, args.db_uri)
+                samples.append(seconds)
+        except RuntimeError as e:
+            print(f"{stage:<16} | 失败: {str(e)}")
+            continue
+        print(f"{stage:<16} | {float(np.median(samples)):>12.3f} | {min(samples):>9.3f} | {', '.join(modules) or '-'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+实时预览帧传输对比：base64 JSON（旧格式）与二进制附件（帧头 + JPEG）
+
+对每一帧分别测量:
+    JPEG编码耗时 - 两种格式相同（每帧只编码一次）
+    封装耗时 - base64编码并序列化为JSON / 拼接帧头
+    报文大小 - 按 Socket.IO 协议编码后的实际字节数
+并按给定帧率换算出每路摄像头每秒的发送字节数。
+
+用法（在 python_flask_backend 目录下运行）:
+    python -m tools.bench_frame_transport
+    python -m tools.bench_frame_transport --video uploads/sample.mp4 --frames 300 --fps 20
+未指定 --video 时使用合成的 1280x960 画面。
+"""
+import argparse
+import base64
+import time
+
+import cv2
+import numpy as np
+from socketio import packet
+
+from utils.frame_broadcast import pack_frame
+
+
+def synthetic_frames(count, width=1280, height=960):
+    """带纹理和噪声的合成画面，JPEG压缩率接近真实皮带画面"""
+    rng = np.random.default_rng(0)
+    base = cv2.GaussianBlur(rng.integers(0, 255, (height, width, 3), dtype=np.uint8), (15, 15), 0)
+    for i in range(count):
+        frame = np.roll(base, i * 8, axis=0)
+        noise = rng.integers(0, 12, frame.shape, dtype=np.uint8)
+        yield cv2.add(frame, noise)
+
+
+def video_frames(path, count):
+    cap = cv2.VideoCapture(path)
+    try:
+        for _ in range(count):
+            success, frame = cap.read()
+            if not success:
+                break
+            yield frame
+    finally:
+        cap.release()
+
+
+def wire_size(encoded):
+    """Socket.IO 编码后的报文字节数（二进制附件单独计算）"""
+    if isinstance(encoded, str):
+        return len(encoded.encode('utf-8'))
+    return sum(len(part.encode('utf-8')) if isinstance(part, str) else len(part) for part in encoded)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='实时预览帧传输格式对比')
+    parser.add_argument('--video', default=None, help='使用视频文件中的帧，默认使用合成画面')
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--fps', type=float, default=20, help='换算每秒字节数使用的推送帧率')
+    parser.add_argument('--quality', type=int, default=70, help='JPEG质量')
+    args = parser.parse_args()
+
+    frames = video_frames(args.video, args.frames) if args.video else synthetic_frames(args.frames)
+    jpeg_seconds = 0.0
+    totals = {'base64': [0.0, 0], 'binary': [0.0, 0]}  # 格式 -> [封装耗时, 报文字节数]
+    count = 0
+    for frame_number, frame in enumerate(frames, 1):
+        start = time.perf_counter()
+        ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, args.quality])
+        jpeg = buffer.tobytes()
+        jpeg_seconds += time.perf_counter() - start
+        timestamp = time.time()
+
+        start = time.perf_counter()
+        encoded = packet.Packet(packet.EVENT, data=['video_frame_0', {
+            'frame': base64.b64encode(jpeg).decode('utf-8'),
+            'timestamp': timestamp
+        }]).encode()
+        totals['base64'][0] += time.perf_counter() - start
+        totals['base64'][1] += wire_size(encoded)
+
+        start = time.perf_counter()
+        encoded = packet.Packet(packet.EVENT, data=['video_frame_0',
+                                                    pack_frame(0, frame_number, timestamp, jpeg)]).encode()
+        totals['binary'][0] += time.perf_counter() - start
+        totals['binary'][1] += wire_size(encoded)
+        count += 1
+
+    if not count:
+        print('没有读取到帧')
+        return
+
+    print(f"\n帧数: {count}，JPEG平均编码耗时: {jpeg_seconds * 1000 / count:.2f}ms")
+    print(f"{'格式':<8} | {'封装耗时(ms/帧)':>14} | {'报文(KB/帧)':>11} | {f'每路带宽@{args.fps:g}fps(KB/s)':>22}")
+    for name, (seconds, size) in totals.items():
+        per_frame = size / count
+        print(f"{name:<8} | {seconds * 1000 / count:>14.3f} | {per_frame / 1024:>11.1f} | "
+              f"{per_frame * args.fps / 1024:>22.1f}")
+    saved = 1 - totals['binary'][1] / float(totals['base64'][1])
+    print(f"\n二进制格式报文减少 {saved * 100:.1f}%")
+
+
+if __name__ == '__main__':
+    main()
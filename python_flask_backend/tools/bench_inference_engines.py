@@ -0,0 +1,83 @@
+"""
+推理后端基准测试：比较 PyTorch / ONNX Runtime / OpenVINO 的单帧延迟与批量吞吐
+
+用法（在 python_flask_backend 目录下运行）:
+    python -m tools.bench_inference_engines --images data/belt_samples
+    python -m tools.bench_inference_engines --backends pytorch onnx --batch-sizes 1 4 8 --repeat 20
+
+未指定图片目录时使用随机生成的 1280x960 帧（只反映速度，检测结果无意义）。
+onnx/openvino 模型不存在时会先从 Config.MODEL_PATH 导出一次。
+"""
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+from utils.inference_engine import BACKENDS, create_engine
+
+IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def load_frames(image_dir, limit, rng):
+    """读取图片目录中的帧，未指定目录时生成随机帧"""
+    if image_dir:
+        paths = sorted(os.path.join(image_dir, f) for f in os.listdir(image_dir)
+                       if f.lower().endswith(IMAGE_SUFFIXES))[:limit]
+        frames = [cv2.imread(path) for path in paths]
+        frames = [frame for frame in frames if frame is not None]
+        if not frames:
+            raise SystemExit(f"目录中没有可读取的图片: {image_dir}")
+        return frames
+    return [rng.integers(0, 255, size=(960, 1280, 3), dtype=np.uint8) for _ in range(limit)]
+
+
+def bench_engine(engine, frames, batch_sizes, repeat):
+    """返回 {批大小: (每批中位耗时ms, 吞吐 帧/秒)}"""
+    engine.warmup()
+    results = {}
+    for batch_size in batch_sizes:
+        batches = [frames[i:i + batch_size] for i in range(0, len(frames), batch_size)]
+        batches = [b for b in batches if len(b) == batch_size] or [frames[:batch_size]]
+        samples = []
+        for _ in range(repeat):
+            for batch in batches:
+                start = time.perf_counter()
+                engine.predict(batch)
+                samples.append(time.perf_counter() - start)
+        median = float(np.median(samples))
+        results[batch_size] = (median * 1000, batch_size / median)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='推理后端基准测试')
+    parser.add_argument('--images', help='测试图片目录（建议使用皮带现场图片）')
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument('--model', help='模型路径，默认使用 Config.MODEL_PATH')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--num-frames', type=int, default=32)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    frames = load_frames(args.images, args.num_frames, np.random.default_rng(0))
+    print(f"测试帧数: {len(frames)}, 尺寸: {frames[0].shape[1]}x{frames[0].shape[0]}")
+
+    rows = []
+    for backend in args.backends:
+        try:
+            engine = create_engine(backend, args.model)
+        except Exception as e:
+            print(f"后端 {backend} 不可用: {str(e)}")
+            continue
+        for batch_size, (latency_ms, fps) in bench_engine(engine, frames, args.batch_sizes, args.repeat).items():
+            rows.append((backend, batch_size, latency_ms, fps))
+
+    print(f"\n{'后端':<10} | {'批大小':>6} | {'每批耗时(ms)':>14} | {'吞吐(帧/秒)':>12}")
+    for backend, batch_size, latency_ms, fps in rows:
+        print(f"{backend:<10} | {batch_size:>6} | {latency_ms:>14.1f} | {fps:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+SORT关联步骤基准测试：逐对循环计算IOU vs 向量化IOU vs 网格门控关联
+
+用法（在 python_flask_backend 目录下运行）:
+    python -m tools.bench_sort_association
+    python -m tools.bench_sort_association --sizes 10 100 500 2000 --repeat 20 --skip-legacy-above 500
+"""
+import argparse
+import time
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from utils.sort_tracker import associate_detections_to_trackers, associate_detections_to_trackers_gated
+
+
+def legacy_calculate_iou(box1, box2):
+    """原实现：计算两个框的交并比(IOU)"""
+    x1 = max(box1[0], box2[0])
+    y1 = max(box1[1], box2[1])
+    x2 = min(box1[2], box2[2])
+    y2 = min(box1[3], box2[3])
+    intersection = max(0, x2 - x1) * max(0, y2 - y1)
+    box1_area = (box1[2] - box1[0]) * (box1[3] - box1[1])
+    box2_area = (box2[2] - box2[0]) * (box2[3] - box2[1])
+    union = box1_area + box2_area - intersection
+    if union == 0:
+        return 0
+    return intersection / union
+
+
+def legacy_associate(detections, trackers, iou_threshold=0.3):
+    """原实现：双重循环填充IOU矩阵，并用 in 扫描查找未匹配项"""
+    if len(trackers) == 0:
+        return np.empty((0, 2), dtype=int), np.arange(len(detections)), np.empty((0, 5), dtype=int)
+
+    iou_matrix = np.zeros((len(detections), len(trackers)), dtype=np.float32)
+    for d, det in enumerate(detections):
+        for t, trk in enumerate(trackers):
+            iou_matrix[d, t] = legacy_calculate_iou(det, trk)
+
+    matched_indices = np.array(linear_sum_assignment(-iou_matrix)).T
+
+    unmatched_detections = [d for d in range(len(detections)) if d not in matched_indices[:, 0]]
+    unmatched_trackers = [t for t in range(len(trackers)) if t not in matched_indices[:, 1]]
+
+    matches = []
+    for m in matched_indices:
+        if iou_matrix[m[0], m[1]] < iou_threshold:
+            unmatched_detections.append(m[0])
+            unmatched_trackers.append(m[1])
+        else:
+            matches.append(m.reshape(1, 2))
+
+    matches = np.concatenate(matches, axis=0) if matches else np.empty((0, 2), dtype=int)
+    return matches, np.array(unmatched_detections), np.array(unmatched_trackers)
+
+
+def make_scene(num_boxes, rng, width=1280, height=960):
+    """生成模拟传送带场景：检测框 + 带抖动的预测框，画面随框数增大以保持密度"""
+    scale = max(1.0, np.sqrt(num_boxes / 200))
+    width, height = width * scale, height * scale
+    wh = rng.uniform(20, 80, size=(num_boxes, 2))
+    xy = rng.uniform(0, 1, size=(num_boxes, 2)) * (np.array([width, height]) - wh)
+    dets = np.hstack([xy, xy + wh])
+    trks = dets + rng.normal(0, 4, size=dets.shape)
+    # 打乱追踪器顺序，避免对角线式的理想匹配
+    trks = trks[rng.permutation(num_boxes)]
+    return dets, np.hstack([trks, np.zeros((num_boxes, 1))])
+
+
+def time_call(fn, repeat):
+    """返回多次调用的中位耗时（毫秒）"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return float(np.median(samples))
+
+
+def match_set(result):
+    return {tuple(m) for m in result[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SORT关联步骤基准测试')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--skip-legacy-above', type=int, default=1000, help='框数超过该值时跳过原实现（太慢）')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'框数':>6} | {'原实现(ms)':>12} | {'向量化(ms)':>12} | {'网格门控(ms)':>12} | 匹配一致")
+    for size in args.sizes:
+        dets, trks = make_scene(size, rng)
+
+        fast_ms = time_call(lambda: associate_detections_to_trackers(dets, trks), args.repeat)
+        gated_ms = time_call(lambda: associate_detections_to_trackers_gated(dets, trks), args.repeat)
+        fast_matches = match_set(associate_detections_to_trackers(dets, trks))
+        same = fast_matches == match_set(associate_detections_to_trackers_gated(dets, trks))
+
+        if size <= args.skip_legacy_above:
+            legacy_ms = f"{time_call(lambda: legacy_associate(dets, trks), args.repeat):>12.2f}"
+            legacy = legacy_associate(dets, trks)
+            # 未匹配检测的顺序决定新追踪器的ID，也必须与原实现一致
+            same = (same and fast_matches == match_set(legacy)
+                    and np.array_equal(associate_detections_to_trackers(dets, trks)[1], legacy[1]))
+        else:
+            legacy_ms = f"{'-':>12}"
+
+        print(f"{size:>6} | {legacy_ms} | {fast_ms:>12.2f} | {gated_ms:>12.2f} | {same}")
+
+
+if __name__ == '__main__':
+    main()
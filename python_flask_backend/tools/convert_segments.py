@@ -0,0 +1,164 @@
+"""
+把监控片段的检测结果转换为列式 .npz 文件（带帧索引），并对比存储大小和读取耗时
+
+转换:
+    遍历保存目录下各日期文件夹中的片段汇总 .json，读取原始检测结果（旧格式内嵌在JSON中，
+    新格式在 .jsonl 日志中），写出同名 .npz，并在汇总JSON中记录 detections_index。
+    已有 .npz 的片段默认跳过。
+
+对比（每个片段）:
+    原始大小 - 旧格式为整个JSON文件，新格式为 .jsonl 日志
+    npz大小
+    读取耗时 - 解析全部原始检测结果 / 读取 .npz 全部列 / 按帧索引读取1秒时间窗口（转换为检测字典）
+
+用法（在 python_flask_backend 目录下运行）:
+    python -m tools.convert_segments                       # 转换 Config.DEFAULT_SAVE_PATH 下的所有片段
+    python -m tools.convert_segments --root D:\\SurveillanceVideo --force
+    python -m tools.convert_segments --dry-run              # 只对比，不修改文件
+    python -m tools.convert_segments --synthetic 100000     # 用合成数据对比（不需要已有片段）
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from config import Config
+from utils.detection_log import read_detection_log
+from utils.segment_store import COLUMNS, SegmentColumns, save_segment_columns, segment_index_path
+
+
+def find_segments(root):
+    """保存目录下所有片段汇总JSON的路径"""
+    for date_folder in sorted(os.listdir(root)):
+        date_path = os.path.join(root, date_folder)
+        if not os.path.isdir(date_path):
+            continue
+        for name in sorted(os.listdir(date_path)):
+            if name.endswith('.json'):
+                yield os.path.join(date_path, name)
+
+
+def raw_size(summary_path):
+    """原始检测结果占用的字节数"""
+    with open(summary_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    log_name = data.get('detections_log')
+    if log_name:
+        log_path = os.path.join(os.path.dirname(summary_path), log_name)
+        return os.path.getsize(log_path) if os.path.exists(log_path) else 0
+    return os.path.getsize(summary_path)
+
+
+def measure(summary_path, index_path, window=1.0):
+    """返回 (解析原始结果耗时, 加载全部列耗时, 读取时间窗口耗时)，单位秒"""
+    start = time.perf_counter()
+    detections = read_detection_log(summary_path, use_index=False)
+    parse_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with SegmentColumns(index_path) as columns:
+        for name in COLUMNS:
+            np.array(columns.column(name))
+    load_seconds = time.perf_counter() - start
+
+    # 取片段中间的时间窗口
+    middle = detections[len(detections) // 2].get('rel_timestamp', 0.0) if detections else 0.0
+    start = time.perf_counter()
+    with SegmentColumns(index_path) as columns:
+        columns.window(middle, middle + window)
+    window_seconds = time.perf_counter() - start
+    return parse_seconds, load_seconds, window_seconds
+
+
+def convert(summary_path, force=False, dry_run=False):
+    """转换一个片段，返回 (npz路径, 检测条数)；无需转换时返回 (None, 0)"""
+    index_path = segment_index_path(summary_path)
+    if os.path.exists(index_path) and not force:
+        return None, 0
+    detections = read_detection_log(summary_path, use_index=False)
+    if not detections:
+        return None, 0
+    if dry_run:
+        index_path = os.path.join(tempfile.mkdtemp(), os.path.basename(index_path))
+    save_segment_columns(index_path, detections)
+    if not dry_run:
+        with open(summary_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        data['detections_index'] = os.path.basename(index_path)
+        temp_path = summary_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2 if 'detections' in data else None)
+        os.replace(temp_path, summary_path)
+    return index_path, len(detections)
+
+
+def synthetic_segment(folder, count, fps=20.0, per_frame=10):
+    """生成旧格式（检测明细内嵌，indent=2）的合成片段汇总JSON"""
+    rng = np.random.default_rng(0)
+    detections = []
+    for i in range(count):
+        frame_number = i // per_frame + 1
+        x, y = rng.uniform(0, 1200), rng.uniform(0, 900)
+        detections.append({
+            'class': 'coal' if rng.random() < 0.8 else 'rock',
+            'confidence': float(rng.uniform(0.3, 1.0)),
+            'bbox': [x, y, x + rng.uniform(20, 80), y + rng.uniform(20, 80)],
+            'track_id': int(i // (per_frame * 30)) * per_frame + i % per_frame,
+            'abs_timestamp': 1.7e9 + frame_number / fps,
+            'rel_timestamp': frame_number / fps,
+            'frame_number': frame_number
+        })
+    summary_path = os.path.join(folder, 'synthetic_seg.json')
+    with open(summary_path, 'w', encoding='utf-8') as f:
+        json.dump({'camera_id': 0, 'detections': detections, 'unique_detections': [], 'unique_count': 0}, f, indent=2)
+    return summary_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='片段检测结果转换为列式存储并对比')
+    parser.add_argument('--root', default=Config.DEFAULT_SAVE_PATH, help='监控视频保存目录')
+    parser.add_argument('--force', action='store_true', help='重新转换已有 .npz 的片段')
+    parser.add_argument('--dry-run', action='store_true', help='只对比，不修改保存目录中的文件')
+    parser.add_argument('--synthetic', type=int, default=0, help='用给定条数的合成检测结果对比')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        folder = tempfile.mkdtemp()
+        segments = [synthetic_segment(folder, args.synthetic)]
+    elif os.path.isdir(args.root):
+        segments = list(find_segments(args.root))
+    else:
+        print(f"保存目录不存在: {args.root}")
+        return
+
+    print(f"\n{'片段':<32} | {'检测数':>8} | {'原始(KB)':>9} | {'npz(KB)':>8} | "
+          f"{'解析原始(ms)':>11} | {'加载npz(ms)':>11} | {'1秒窗口(ms)':>11}")
+    totals = [0, 0, 0]
+    for summary_path in segments:
+        try:
+            index_path, count = convert(summary_path, force=args.force, dry_run=args.dry_run or args.synthetic > 0)
+        except Exception as e:
+            print(f"{os.path.basename(summary_path):<32} | 转换失败: {str(e)}")
+            continue
+        if index_path is None:
+            continue
+        original, compact = raw_size(summary_path), os.path.getsize(index_path)
+        parse_seconds, load_seconds, window_seconds = measure(summary_path, index_path)
+        totals[0] += count
+        totals[1] += original
+        totals[2] += compact
+        print(f"{os.path.basename(summary_path):<32} | {count:>8} | {original / 1024:>9.1f} | {compact / 1024:>8.1f} | "
+              f"{parse_seconds * 1000:>11.1f} | {load_seconds * 1000:>11.1f} | {window_seconds * 1000:>11.2f}")
+
+    if totals[1]:
+        print(f"\n共 {totals[0]} 条检测，原始 {totals[1] / 1024:.1f}KB -> npz {totals[2] / 1024:.1f}KB "
+              f"（{totals[2] / float(totals[1]) * 100:.1f}%）")
+    else:
+        print('\n没有需要转换的片段')
+
+
+if __name__ == '__main__':
+    main()
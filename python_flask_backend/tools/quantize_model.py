@@ -0,0 +1,265 @@
+"""
+INT8 训练后量化：用皮带现场图片校准，生成 INT8 ONNX 模型，并输出与 FP32 模型的速度/精度对比报告
+
+用法（在 python_flask_backend 目录下运行）:
+    python -m tools.quantize_model --images data/belt_samples
+    python -m tools.quantize_model --images data/belt_samples --output best_int8.onnx --num-calib 200
+
+生成后在 config.py 中设置 MODEL_PATH = 'best_int8.onnx'（INFERENCE_BACKEND 为 'onnx' 或 'auto'）即可使用量化模型。
+校准输入与推理时相同：整帧填充为正方形；config.py 中配置了 CAMERA_ROIS/VIDEO_ROI 时，
+ROI裁剪区域按推理引擎的规则（动态输入尺寸的模型使用矩形输入）一并参与校准和对比评估（--no-roi 关闭）。
+需要安装 onnx 与 onnxruntime；FP32 ONNX 模型不存在时会先用 ultralytics 从 .pt 导出。
+"""
+import argparse
+import json
+import os
+import re
+import time
+
+import cv2
+import numpy as np
+
+from config import Config
+from utils.inference_engine import (OnnxRuntimeEngine, RegionOfInterest, detect_backend, export_model,
+                                    exported_model_path, input_stride, letterbox)
+from utils.sort_tracker import iou_batch
+
+IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def list_images(image_dir):
+    return sorted(os.path.join(image_dir, f) for f in os.listdir(image_dir) if f.lower().endswith(IMAGE_SUFFIXES))
+
+
+def load_images(paths):
+    frames = [cv2.imread(path) for path in paths]
+    return [frame for frame in frames if frame is not None]
+
+
+def configured_rois():
+    """config.py 中配置的全部ROI（摄像头与上传视频），去除重复"""
+    rois = {}
+    for config in list(Config.CAMERA_ROIS.values()) + [Config.VIDEO_ROI]:
+        roi = RegionOfInterest.from_config(config)
+        if roi is not None:
+            rois[(tuple(roi.rect), roi.scale)] = roi
+    return list(rois.values())
+
+
+def inference_inputs(frame, rois):
+    """一张图片在推理时实际送入模型的输入：整帧，以及每个ROI的裁剪区域，返回 [(图像, 是否为裁剪区域)]"""
+    return [(frame, False)] + [(roi.crop(frame), True) for roi in rois]
+
+
+def make_calibration_reader(input_name, paths, imgsz, rois=(), static_shape=False):
+    """
+    构造 ONNX Runtime 校准数据读取器，逐张提供预处理后的校准输入
+    预处理与推理引擎相同：整帧填充为正方形，ROI裁剪区域按 input_stride 的规则使用矩形输入
+    """
+    from onnxruntime.quantization import CalibrationDataReader
+
+    class BeltImageReader(CalibrationDataReader):
+        def __init__(self):
+            self.inputs = (item for path in paths for frame in [cv2.imread(path)] if frame is not None
+                           for item in inference_inputs(frame, rois))
+
+        def get_next(self):
+            item = next(self.inputs, None)
+            if item is None:
+                return None
+            image, crop = item
+            return {input_name: letterbox(image, imgsz, input_stride([image], crop, static_shape))[0][None]}
+
+    return BeltImageReader()
+
+
+def head_nodes(model):
+    """
+    找出检测头中负责框解码的非卷积节点（最后一个 /model.N/ 模块里的 Concat/Mul/Sigmoid/Softmax 等）
+    这些节点对量化误差敏感，保留为浮点运算可以明显减少框坐标的偏差
+    """
+    indices = [int(m.group(1)) for node in model.graph.node
+               for m in [re.search(r'/model\.(\d+)/', node.name)] if m]
+    if not indices:
+        return []
+    prefix = f'/model.{max(indices)}/'
+    return [node.name for node in model.graph.node if prefix in node.name and node.op_type != 'Conv']
+
+
+def quantize(fp32_path, output_path, calib_paths, imgsz, rois=(), per_channel=True, keep_head_fp32=True):
+    """
+    静态量化（QDQ格式，权重INT8/激活UINT8），并保留原模型的元数据（类别名称等）
+    rois - 推理时使用的ROI，其裁剪区域与整帧一起参与校准
+    """
+    import onnx
+    import onnxruntime as ort
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+
+    model_input = ort.InferenceSession(fp32_path, providers=['CPUExecutionProvider']).get_inputs()[0]
+    static_shape = isinstance(model_input.shape[2], int)
+    fp32_model = onnx.load(fp32_path)
+    nodes_to_exclude = head_nodes(fp32_model) if keep_head_fp32 else []
+
+    quantize_static(
+        fp32_path,
+        output_path,
+        make_calibration_reader(model_input.name, calib_paths, imgsz, rois, static_shape),
+        quant_format=QuantFormat.QDQ,
+        per_channel=per_channel,
+        weight_type=QuantType.QInt8,
+        activation_type=QuantType.QUInt8,
+        calibrate_method=CalibrationMethod.MinMax,
+        nodes_to_exclude=nodes_to_exclude
+    )
+
+    # 复制元数据，使量化模型与原模型一样能读取类别名称
+    int8_model = onnx.load(output_path)
+    existing = {prop.key for prop in int8_model.metadata_props}
+    for prop in fp32_model.metadata_props:
+        if prop.key not in existing:
+            int8_model.metadata_props.append(prop)
+    onnx.save(int8_model, output_path)
+    return len(nodes_to_exclude)
+
+
+def measure_speed(engine, frames, batch_size, repeat):
+    """返回 (单帧中位延迟ms, 批量吞吐 帧/秒)"""
+    engine.warmup()
+    latencies = []
+    for _ in range(repeat):
+        for frame in frames:
+            start = time.perf_counter()
+            engine.predict([frame])
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for i in range(0, len(frames), batch_size):
+            engine.predict(frames[i:i + batch_size])
+    throughput = repeat * len(frames) / (time.perf_counter() - start)
+    return float(np.median(latencies)) * 1000, throughput
+
+
+def compare_detections(reference, candidate, iou_threshold=0.5):
+    """
+    以FP32结果为参照，按同类且IOU>=门限贪心匹配，统计检测一致性
+    返回匹配数、两边的检测总数、匹配框的平均IOU和平均置信度差
+    """
+    matched = 0
+    ious = []
+    conf_diffs = []
+    total_ref = 0
+    total_cand = 0
+    for ref, cand in zip(reference, candidate):
+        total_ref += len(ref.boxes)
+        total_cand += len(cand.boxes)
+        if len(ref.boxes) == 0 or len(cand.boxes) == 0:
+            continue
+        iou = iou_batch(ref.boxes, cand.boxes)
+        iou[ref.class_ids[:, None] != cand.class_ids[None, :]] = 0
+        while True:
+            r, c = np.unravel_index(np.argmax(iou), iou.shape)
+            if iou[r, c] < iou_threshold:
+                break
+            matched += 1
+            ious.append(float(iou[r, c]))
+            conf_diffs.append(abs(float(ref.confidences[r]) - float(cand.confidences[c])))
+            iou[r, :] = 0
+            iou[:, c] = 0
+
+    recall = matched / total_ref if total_ref else 1.0
+    precision = matched / total_cand if total_cand else 1.0
+    return {
+        'fp32_detections': total_ref,
+        'int8_detections': total_cand,
+        'matched': matched,
+        'recall': recall,  # FP32检测中被INT8复现的比例
+        'precision': precision,  # INT8检测中与FP32一致的比例
+        'f1': 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        'mean_iou': float(np.mean(ious)) if ious else 0.0,
+        'mean_confidence_diff': float(np.mean(conf_diffs)) if conf_diffs else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='INT8训练后量化与对比报告')
+    parser.add_argument('--images', required=True, help='校准图片目录（皮带现场图片）')
+    parser.add_argument('--eval-images', help='对比评估图片目录，默认与校准图片相同')
+    parser.add_argument('--model', default=Config.MODEL_PATH, help='FP32模型（.pt 或 .onnx）')
+    parser.add_argument('--output', help='INT8模型输出路径，默认为 <模型名>_int8.onnx')
+    parser.add_argument('--report', help='对比报告输出路径，默认为 <输出模型名>_report.json')
+    parser.add_argument('--num-calib', type=int, default=100, help='最多使用的校准图片数')
+    parser.add_argument('--num-eval', type=int, default=100, help='最多使用的评估图片数')
+    parser.add_argument('--imgsz', type=int, default=Config.INFERENCE_IMGSZ)
+    parser.add_argument('--batch-size', type=int, default=8, help='吞吐测试的批大小')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--conf', type=float, default=0.25)
+    parser.add_argument('--per-tensor', action='store_true', help='按张量而非按通道量化权重')
+    parser.add_argument('--no-roi', action='store_true', help='不使用 config.py 中的ROI裁剪区域校准与评估，只用整帧')
+    parser.add_argument('--quantize-head', action='store_true', help='检测头的解码节点也量化（更快但框偏差更大）')
+    args = parser.parse_args()
+
+    # 准备FP32 ONNX模型
+    fp32_path = args.model
+    if detect_backend(fp32_path) == 'pytorch':
+        fp32_path = exported_model_path(args.model, 'onnx')
+        if not os.path.exists(fp32_path):
+            print(f"导出 {args.model} 为 ONNX...")
+            fp32_path = export_model(args.model, 'onnx', args.imgsz)
+    output_path = args.output or f"{os.path.splitext(fp32_path)[0]}_int8.onnx"
+    report_path = args.report or f"{os.path.splitext(output_path)[0]}_report.json"
+
+    calib_paths = list_images(args.images)[:args.num_calib]
+    if not calib_paths:
+        raise SystemExit(f"目录中没有校准图片: {args.images}")
+    rois = [] if args.no_roi else configured_rois()
+    roi_note = f"及 {len(rois)} 个ROI裁剪区域" if rois else ''
+    print(f"使用 {len(calib_paths)} 张图片校准（整帧{roi_note}）...")
+    start = time.perf_counter()
+    excluded = quantize(fp32_path, output_path, calib_paths, args.imgsz, rois,
+                        per_channel=not args.per_tensor, keep_head_fp32=not args.quantize_head)
+    quantize_time = time.perf_counter() - start
+    print(f"量化完成: {output_path}（{quantize_time:.1f}秒，检测头保留浮点节点 {excluded} 个）")
+
+    # 在相同图片上对比FP32与INT8
+    eval_frames = load_images(list_images(args.eval_images or args.images)[:args.num_eval])
+    fp32_engine = OnnxRuntimeEngine(fp32_path, args.imgsz)
+    int8_engine = OnnxRuntimeEngine(output_path, args.imgsz)
+
+    fp32_latency, fp32_fps = measure_speed(fp32_engine, eval_frames, args.batch_size, args.repeat)
+    int8_latency, int8_fps = measure_speed(int8_engine, eval_frames, args.batch_size, args.repeat)
+    # 检测一致性按推理时的实际输入评估（整帧与ROI裁剪区域）
+    eval_inputs = [item for frame in eval_frames for item in inference_inputs(frame, rois)]
+    fp32_results = [fp32_engine.predict([image], conf=args.conf, crop=crop)[0] for image, crop in eval_inputs]
+    int8_results = [int8_engine.predict([image], conf=args.conf, crop=crop)[0] for image, crop in eval_inputs]
+    agreement = compare_detections(fp32_results, int8_results)
+
+    report = {
+        'fp32_model': fp32_path,
+        'int8_model': output_path,
+        'calibration_images': len(calib_paths),
+        'rois': [{'rect': roi.rect, 'scale': roi.scale} for roi in rois],
+        'eval_images': len(eval_frames),
+        'model_size_mb': {
+            'fp32': os.path.getsize(fp32_path) / 1024 / 1024,
+            'int8': os.path.getsize(output_path) / 1024 / 1024
+        },
+        'latency_ms': {'fp32': fp32_latency, 'int8': int8_latency},
+        'throughput_fps': {'fp32': fp32_fps, 'int8': int8_fps, 'batch_size': args.batch_size},
+        'speedup': fp32_latency / int8_latency if int8_latency else 0,
+        'agreement': agreement
+    }
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print(f"\n{'':<10} | {'FP32':>10} | {'INT8':>10}")
+    print(f"{'大小(MB)':<10} | {report['model_size_mb']['fp32']:>10.1f} | {report['model_size_mb']['int8']:>10.1f}")
+    print(f"{'延迟(ms)':<10} | {fp32_latency:>10.1f} | {int8_latency:>10.1f}")
+    print(f"{'吞吐(帧/秒)':<10} | {fp32_fps:>10.1f} | {int8_fps:>10.1f}")
+    print(f"检测一致性: 召回 {agreement['recall']:.3f}, 精确 {agreement['precision']:.3f}, "
+          f"F1 {agreement['f1']:.3f}, 平均IOU {agreement['mean_iou']:.3f}")
+    print(f"报告已保存: {report_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+import json
+import os
+import time
+
+from utils.segment_store import SegmentColumns, SegmentColumnsBuilder, segment_index_path
+
+
+class SegmentDetectionLog(object):
+    """
+    视频片段的检测记录：每个检测结果追加写入 JSONL 日志（一行一个检测），
+    唯一煤块按 track_id 增量汇总，汇总文件（与视频同名的 .json）只定期和片段结束时重写
+
+    汇总文件保持原有格式（unique_detections / unique_count / video_metadata 等），
+    原始检测明细不再内嵌其中，而是记录在 detections_log 指向的 JSONL 文件里；
+    片段结束时另存一份带帧索引的列式文件（detections_index 指向的 .npz），供按时间窗口查询
+    """
+
+    def __init__(self, summary_path, camera_id, video_path, summary_interval=5.0):
+        """
+        参数:
+            summary_path - 汇总JSON文件路径，日志文件为同名的 .jsonl
+            summary_interval - 汇总文件的最短重写间隔（秒）
+        """
+        self.summary_path = summary_path
+        self.log_path = os.path.splitext(summary_path)[0] + '.jsonl'
+        self.camera_id = camera_id
+        self.video_path = video_path
+        self.summary_interval = summary_interval
+        self.log_file = open(self.log_path, 'a', encoding='utf-8')
+        self.columns = SegmentColumnsBuilder()
+        self.index_path = None  # 片段结束后写入的列式文件
+        self.unique = {}  # track_id -> 唯一煤块汇总
+        self.detection_count = 0
+        self.last_summary_time = None
+        self.dirty = False  # 上次写汇总后是否有新的检测
+
+    def add(self, detections):
+        """追加一帧的检测结果并更新唯一煤块汇总"""
+        for detection in detections:
+            self.log_file.write(json.dumps(detection, separators=(',', ':')))
+            self.log_file.write('\n')
+            self.columns.add(detection)
+            self.detection_count += 1
+
+            track_id = detection['track_id']
+            block = self.unique.get(track_id)
+            if block is None:
+                self.unique[track_id] = detection.copy()
+                continue
+            # 更新已存在煤块的最后出现信息，置信度更高时更新置信度和边界框
+            block['last_timestamp'] = detection['abs_timestamp']
+            block['last_rel_timestamp'] = detection['rel_timestamp']
+            block['last_frame'] = detection['frame_number']
+            if detection['confidence'] > block['confidence']:
+                block['confidence'] = detection['confidence']
+                block['bbox'] = detection['bbox']
+        if detections:
+            self.dirty = True
+
+    def summary_due(self):
+        """距上次写汇总已超过间隔且有新的检测"""
+        if not self.dirty:
+            return False
+        return self.last_summary_time is None or time.time() - self.last_summary_time >= self.summary_interval
+
+    def write_summary(self, video_metadata):
+        """刷新日志并重写汇总文件（先写临时文件再替换，读取方不会读到写了一半的文件）"""
+        self.log_file.flush()
+        unique_detections = list(self.unique.values())
+        summary = {
+            'camera_id': self.camera_id,
+            'video_path': self.video_path,
+            'video_metadata': video_metadata,
+            'detections_log': os.path.basename(self.log_path),  # 原始检测结果（JSONL）
+            'detection_count': self.detection_count,  # 原始检测结果条数
+            'unique_detections': unique_detections,  # 唯一煤块结果
+            'unique_count': len(unique_detections)  # 唯一煤块数量
+        }
+        if self.index_path is not None:
+            summary['detections_index'] = os.path.basename(self.index_path)  # 列式检测结果（带帧索引）
+        temp_path = self.summary_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f)
+        os.replace(temp_path, self.summary_path)
+        self.last_summary_time = time.time()
+        self.dirty = False
+
+    def close(self, video_metadata=None):
+        """片段结束：有检测结果时写列式文件和最终汇总，关闭日志"""
+        if self.detection_count:
+            try:
+                self.index_path = segment_index_path(self.summary_path)
+                self.columns.save(self.index_path)
+            except Exception as e:
+                self.index_path = None
+                print(f"写入列式检测文件失败 {self.summary_path}: {str(e)}")
+        if video_metadata is not None and (self.dirty or self.detection_count):
+            self.write_summary(video_metadata)
+        self.log_file.close()
+        if not self.detection_count and os.path.exists(self.log_path):
+            os.remove(self.log_path)
+
+
+def read_detection_log(summary_path, use_index=True):
+    """
+    读取片段的全部原始检测结果：优先读取 detections_index 指向的列式文件，
+    其次读取 detections_log 指向的 JSONL（片段尚未结束时），旧格式从汇总JSON的 detections 字段读取
+    use_index=False 时不读取列式文件（如重新生成列式文件时）
+    """
+    with open(summary_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    index_path = os.path.join(os.path.dirname(summary_path), data.get('detections_index', ''))
+    if use_index and data.get('detections_index') and os.path.exists(index_path):
+        with SegmentColumns(index_path) as columns:
+            return columns.to_dicts()
+    if 'detections_log' not in data:
+        return data.get('detections', [])
+    log_path = os.path.join(os.path.dirname(summary_path), data['detections_log'])
+    detections = []
+    if os.path.exists(log_path):
+        with open(log_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    detections.append(json.loads(line))
+                except ValueError:
+                    break  # 进程中断时最后一行可能只写了一半
+    return detections
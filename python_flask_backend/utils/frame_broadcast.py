@@ -0,0 +1,357 @@
+import struct
+import threading
+import time
+from collections import deque
+
+# 二进制预览帧的头部：版本(u8)、摄像头ID(u16)、帧号(u32)、采集时间戳(f64秒)，小端，其后紧跟JPEG字节
+FRAME_HEADER = struct.Struct('<BHId')
+FRAME_HEADER_VERSION = 1
+
+
+def pack_frame(camera_id, frame_number, timestamp, data):
+    """在JPEG字节前加上帧头，作为Socket.IO二进制附件发送"""
+    return FRAME_HEADER.pack(FRAME_HEADER_VERSION, camera_id, frame_number & 0xFFFFFFFF, timestamp) + data
+
+
+def unpack_frame(payload):
+    """解析 pack_frame 的结果，返回 (摄像头ID, 帧号, 时间戳, JPEG字节)"""
+    version, camera_id, frame_number, timestamp = FRAME_HEADER.unpack_from(payload)
+    if version != FRAME_HEADER_VERSION:
+        raise ValueError(f'不支持的帧头版本: {version}')
+    return camera_id, frame_number, timestamp, payload[FRAME_HEADER.size:]
+
+
+class FrameBroadcaster(object):
+    """
+    单路摄像头的帧广播：每帧每个预览档位最多编码一次，同一份字节分发给所有订阅者
+
+    - 按需编码：订阅者读取时才从帧源取新帧并编码所需档位，编码结果缓存到下一帧，
+      其他订阅者直接复用；没有订阅者或订阅者都读得慢时不会为用不到的帧编码
+    - 订阅者读取时总是拿到最新帧；慢的订阅者直接跳过中间的帧，不会阻塞其他订阅者
+    - 等待帧源和编码时都不持有全局锁：同一时刻只有一个订阅者从帧源取帧，其他需要新帧的订阅者
+      在条件变量上等待结果；编码按档位各自加锁，不同档位可以并行编码，同一档位只编码一次
+    """
+
+    def __init__(self, source, encoders):
+        """
+        参数:
+            source - 读取下一帧的函数 source(timeout)，返回 (采集时间, 帧)，无新帧时返回None
+            encoders - 档位名 -> 编码函数 encode(frame)，返回编码后的字节
+        """
+        self.source = source
+        self.encoders = dict(encoders)
+        self.lock = threading.Lock()  # 保护订阅者数和统计信息
+        self.condition = threading.Condition()  # 保护最新帧，取帧结束时通知等待的订阅者
+        self.tier_locks = {tier: threading.Lock() for tier in self.encoders}
+        self.fetching = False  # 是否有订阅者正在从帧源取帧
+        self.seq = 0
+        self.timestamp = None
+        self.frame = None  # 最新一帧的原始图像
+        self.encoded = {}  # 最新一帧已编码的档位 -> 字节（每帧一个新字典）
+        self.subscribers = 0
+        self.misses = 0
+        self.closed = False  # 帧源已结束（如摄像头断开）
+        # 统计信息：档位 -> [编码次数, 编码总耗时, 编码总字节数]
+        self.encode_stats = {tier: [0, 0.0, 0] for tier in self.encoders}
+
+    def subscribe(self, tiers):
+        """新增一个订阅者，订阅给定的档位（可迭代对象）"""
+        subscription = Subscription(self)
+        subscription.set_tiers(tiers)
+        with self.lock:
+            self.subscribers += 1
+        return subscription
+
+    def _unsubscribe(self):
+        with self.lock:
+            self.subscribers = max(0, self.subscribers - 1)
+
+    def _next_frame(self, after_seq, timeout):
+        """
+        返回序号大于 after_seq 的最新帧 (序号, 采集时间, 帧, 已编码字典)，超时或帧源无帧时返回None
+        已有更新的帧时不等待；需要新帧时只有一个订阅者调用帧源，其他订阅者等待它的结果
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while self.frame is None or self.seq <= after_seq:
+                if not self.fetching:
+                    self.fetching = True
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+            else:
+                return self.seq, self.timestamp, self.frame, self.encoded
+
+        # 本订阅者负责取帧，取帧期间不持有锁
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        item = None
+        try:
+            item = self.source(remaining)
+        finally:
+            with self.condition:
+                self.fetching = False
+                if item is None:
+                    # 连续多次拿不到帧视为帧源结束
+                    self.misses += 1
+                    self.closed = self.misses >= 3
+                else:
+                    self.misses = 0
+                    self.closed = False
+                    self.seq += 1
+                    self.timestamp, self.frame = item
+                    self.encoded = {}
+                self.condition.notify_all()
+        if item is None:
+            return None
+        with self.condition:
+            return self.seq, self.timestamp, self.frame, self.encoded
+
+    def _encode(self, tier, frame, encoded):
+        """编码一帧的一个档位，结果缓存在该帧的 encoded 字典中，同一档位同时只有一个订阅者编码"""
+        with self.tier_locks[tier]:
+            data = encoded.get(tier)
+            if data is None:
+                start = time.perf_counter()
+                data = encoded[tier] = self.encoders[tier](frame)
+                with self.lock:
+                    stats = self.encode_stats[tier]
+                    stats[0] += 1
+                    stats[1] += time.perf_counter() - start
+                    stats[2] += len(data)
+            return data
+
+    def _read(self, after_seq, tiers, timeout):
+        """返回序号大于 after_seq 的最新帧及其各档位编码；已有更新的帧时不等待"""
+        item = self._next_frame(after_seq, timeout)
+        if item is None:
+            return None
+        seq, timestamp, frame, encoded = item
+        return seq, timestamp, {tier: self._encode(tier, frame, encoded) for tier in tiers}
+
+    def stats(self):
+        with self.lock:
+            return {
+                'subscribers': self.subscribers,
+                'tiers': {
+                    tier: {
+                        'encoded': count,
+                        'avg_encode_ms': seconds * 1000 / count if count else 0.0,
+                        'avg_frame_bytes': size // count if count else 0
+                    } for tier, (count, seconds, size) in self.encode_stats.items()
+                }
+            }
+
+
+class Subscription(object):
+    """一个订阅者（一路MJPEG连接或一个WebSocket推送任务），记录收到和跳过的帧数"""
+
+    def __init__(self, broadcaster):
+        self.broadcaster = broadcaster
+        self.tiers = frozenset()
+        self.last_seq = 0
+        self.frames = 0
+        self.skipped = 0
+        self.active = True
+
+    def set_tiers(self, tiers):
+        """更换订阅的档位，下次读取时生效"""
+        tiers = frozenset(tiers)
+        unknown = tiers - set(self.broadcaster.encoders)
+        if unknown:
+            raise ValueError(f'未知的预览档位: {", ".join(sorted(unknown))}')
+        self.tiers = tiers
+
+    def next(self, timeout=None):
+        """
+        读取比上次更新的最新帧，超时或帧源结束时返回None
+        返回:
+            (帧号, 采集时间, {档位: 字节})
+        """
+        item = self.broadcaster._read(self.last_seq, self.tiers, timeout)
+        if item is None:
+            return None
+        seq = item[0]
+        if self.last_seq:
+            self.skipped += seq - self.last_seq - 1
+        self.last_seq = seq
+        self.frames += 1
+        return item
+
+    def close(self):
+        if self.active:
+            self.active = False
+            self.broadcaster._unsubscribe()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AdaptiveTier(object):
+    """
+    单个观看者的自适应预览档位：根据该观看者未确认（已发送但客户端尚未回执）的帧数调整档位
+
+    - 未确认帧数达到 max_pending 时跳过新帧，慢的观看者不会积压发送队列
+    - 连续 downgrade_after 帧发送队列处于满载时降低一档
+    - 连续 upgrade_after 帧发送队列为空时升高一档，但不超过客户端请求的档位
+    - 超过 ack_timeout 秒没有回执的帧视为已丢失，不再占用发送队列
+    """
+
+    def __init__(self, tiers, requested, max_pending=2, downgrade_after=5, upgrade_after=60, ack_timeout=2.0):
+        """
+        参数:
+            tiers - 档位名列表，按画质从低到高排列
+            requested - 客户端请求的（最高）档位
+        """
+        self.tiers = list(tiers)
+        self.max_pending = max_pending
+        self.downgrade_after = downgrade_after
+        self.upgrade_after = upgrade_after
+        self.ack_timeout = ack_timeout
+        self.lock = threading.Lock()
+        self.pending = deque()  # 未确认帧的发送时间
+        self.congested = 0  # 连续满载的帧数
+        self.idle = 0  # 连续空闲的帧数
+        self.requested_index = self.index = self._tier_index(requested)
+        # 统计信息
+        self.sent = 0
+        self.skipped = 0
+        self.lost = 0
+        self.switches = 0
+
+    def _tier_index(self, tier):
+        if tier not in self.tiers:
+            raise ValueError(f'未知的预览档位: {tier}')
+        return self.tiers.index(tier)
+
+    @property
+    def tier(self):
+        return self.tiers[self.index]
+
+    @property
+    def requested(self):
+        return self.tiers[self.requested_index]
+
+    def request(self, tier):
+        """客户端更换请求的档位（如切换到全屏），立即切换到该档位"""
+        with self.lock:
+            self.requested_index = self.index = self._tier_index(tier)
+            self.congested = self.idle = 0
+
+    def on_frame(self):
+        """
+        每帧调用一次：清除超时的回执，按发送队列长度调整档位
+        返回:
+            本帧是否发送给该观看者
+        """
+        now = time.monotonic()
+        with self.lock:
+            while self.pending and now - self.pending[0] > self.ack_timeout:
+                self.pending.popleft()
+                self.lost += 1
+
+            if len(self.pending) >= self.max_pending:
+                self.idle = 0
+                self.congested += 1
+                self.skipped += 1
+                if self.congested >= self.downgrade_after and self.index > 0:
+                    self.index -= 1
+                    self.congested = 0
+                    self.switches += 1
+                return False
+
+            self.congested = 0
+            if not self.pending:
+                self.idle += 1
+                if self.idle >= self.upgrade_after and self.index < self.requested_index:
+                    self.index += 1
+                    self.idle = 0
+                    self.switches += 1
+            else:
+                self.idle = 0
+            return True
+
+    def on_sent(self):
+        with self.lock:
+            self.pending.append(time.monotonic())
+            self.sent += 1
+
+    def on_ack(self, *args):
+        """客户端回执（作为Socket.IO emit的callback）"""
+        with self.lock:
+            if self.pending:
+                self.pending.popleft()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'tier': self.tier,
+                'requested_tier': self.requested,
+                'pending': len(self.pending),
+                'sent': self.sent,
+                'skipped': self.skipped,
+                'lost': self.lost,
+                'switches': self.switches
+            }
+
+
+class RateController(object):
+    """
+    按截止时间控制发送节奏：每次发送前等到本帧的截止时间，下一帧的截止时间顺延一个间隔
+    编码和发送本身的耗时计入间隔内，不会像固定sleep那样叠加；
+    落后超过一个间隔时从当前时间重新计时，不会为了追赶而连续突发发送
+    """
+
+    def __init__(self, fps, sleep=time.sleep, clock=time.monotonic):
+        self.interval = 1.0 / fps if fps and fps > 0 else 0.0
+        self.sleep = sleep
+        self.clock = clock
+        self.deadline = None
+        self.late = 0  # 错过截止时间而重新计时的次数
+
+    def wait(self):
+        """等到下一次允许发送的时间"""
+        now = self.clock()
+        if self.deadline is None:
+            self.deadline = now
+        elif now < self.deadline:
+            self.sleep(self.deadline - now)
+        elif now - self.deadline > self.interval:
+            self.late += 1
+            self.deadline = now
+        self.deadline += self.interval
+
+
+class TransferMeter(object):
+    """统计发送的帧数和字节数，速率按最近 window 秒计算"""
+
+    def __init__(self, window=5.0):
+        self.window = window
+        self.samples = deque()  # [(时间, 字节数)]
+        self.lock = threading.Lock()
+        self.frames = 0
+        self.bytes = 0
+
+    def add(self, nbytes):
+        now = time.monotonic()
+        with self.lock:
+            self.frames += 1
+            self.bytes += nbytes
+            self.samples.append((now, nbytes))
+            while self.samples and now - self.samples[0][0] > self.window:
+                self.samples.popleft()
+
+    def stats(self):
+        now = time.monotonic()
+        with self.lock:
+            recent = [(t, n) for t, n in self.samples if now - t <= self.window]
+            return {
+                'frames': self.frames,
+                'bytes': self.bytes,
+                'fps': len(recent) / self.window,
+                'bytes_per_second': sum(n for _, n in recent) / self.window
+            }
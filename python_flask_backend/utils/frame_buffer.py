@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import deque
+
+
+class FrameRingBuffer(object):
+    """
+    保存最新几帧的环形缓冲区：采集线程只管写入，预览和检测等消费者各按自己的速度读取最新帧
+
+    缓冲区满时丢弃最旧的帧，写入永不阻塞；消费者每次读取的都是最新帧，
+    两次读取之间错过的帧记在各自的跳帧计数中。
+    """
+
+    def __init__(self, capacity=2):
+        self.capacity = max(1, int(capacity))
+        self.frames = deque()  # [(序号, 采集时间, 帧, 是否被读取过)]
+        self.condition = threading.Condition()
+        self.seq = 0  # 最新一帧的序号，从1开始
+        self.closed = False
+        # 统计信息
+        self.written = 0
+        self.dropped = 0  # 被挤出缓冲区时还没有任何消费者读取过的帧数
+
+    def put(self, frame, timestamp=None):
+        """写入一帧，缓冲区满时丢弃最旧的帧"""
+        with self.condition:
+            if len(self.frames) >= self.capacity:
+                _, _, _, was_read = self.frames.popleft()
+                if not was_read:
+                    self.dropped += 1
+            self.seq += 1
+            self.written += 1
+            self.frames.append([self.seq, timestamp if timestamp is not None else time.time(), frame, False])
+            self.condition.notify_all()
+            return self.seq
+
+    def read(self, after_seq=0, timeout=None):
+        """
+        读取序号大于 after_seq 的最新一帧，没有新帧时最多等待 timeout 秒
+        返回:
+            (序号, 采集时间, 帧)；超时或缓冲区已关闭时返回 None
+        """
+        with self.condition:
+            has_new = lambda: bool(self.frames) and self.frames[-1][0] > after_seq
+            if not self.condition.wait_for(lambda: self.closed or has_new(), timeout) or not has_new():
+                return None
+            entry = self.frames[-1]
+            entry[3] = True
+            return entry[0], entry[1], entry[2]
+
+    def close(self):
+        """关闭缓冲区，唤醒所有等待的消费者"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def reopen(self):
+        with self.condition:
+            self.closed = False
+            self.frames.clear()
+
+    def stats(self):
+        with self.condition:
+            return {'written': self.written, 'dropped': self.dropped, 'latest_seq': self.seq}
+
+
+class FrameConsumer(object):
+    """缓冲区的一个消费者：记住上次读到的序号，统计读取的帧数和错过的帧数"""
+
+    def __init__(self, buffer, name=''):
+        self.buffer = buffer
+        self.name = name
+        self.last_seq = 0
+        self.frames = 0  # 读取的帧数
+        self.skipped = 0  # 两次读取之间错过的帧数
+
+    def read(self, timeout=None):
+        """读取下一帧（比上次读到的更新的最新帧），返回 (采集时间, 帧) 或 None"""
+        item = self.buffer.read(self.last_seq, timeout)
+        if item is None:
+            return None
+        seq, timestamp, frame = item
+        if self.last_seq:
+            self.skipped += seq - self.last_seq - 1
+        self.last_seq = seq
+        self.frames += 1
+        return timestamp, frame
+
+    def reset_counters(self):
+        self.frames = 0
+        self.skipped = 0
+
+    def stats(self):
+        return {'frames': self.frames, 'skipped': self.skipped}
@@ -0,0 +1,413 @@
+import ast
+import os
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+# 单帧检测结果：所有推理后端都返回相同格式的数组
+#   boxes - (N, 4) float32，原图坐标 [x1, y1, x2, y2]
+#   confidences - (N,) float32
+#   class_ids - (N,) int64
+Detections = namedtuple('Detections', ['boxes', 'confidences', 'class_ids'])
+
+BACKENDS = ('pytorch', 'onnx', 'openvino')
+
+
+def empty_detections():
+    return Detections(np.empty((0, 4), dtype=np.float32), np.empty(0, dtype=np.float32),
+                      np.empty(0, dtype=np.int64))
+
+
+def exported_model_path(model_path, backend):
+    """由PyTorch权重路径得到对应后端的导出文件路径（best.pt -> best.onnx / best_openvino_model）"""
+    stem = os.path.splitext(model_path)[0]
+    if backend == 'onnx':
+        return f'{stem}.onnx'
+    if backend == 'openvino':
+        return f'{stem}_openvino_model'
+    return model_path
+
+
+def detect_backend(model_path):
+    """根据模型文件类型判断推理后端"""
+    path = model_path.rstrip('/\\')
+    if path.endswith('.onnx'):
+        return 'onnx'
+    if path.endswith('_openvino_model') or path.endswith('.xml'):
+        return 'openvino'
+    return 'pytorch'
+
+
+def export_model(model_path, backend, imgsz=640):
+    """
+    一次性把 PyTorch 权重导出为 ONNX / OpenVINO 格式，返回导出文件路径
+    导出依赖 ultralytics，只在导出时需要；导出后的推理不再依赖 PyTorch
+    """
+    if backend not in ('onnx', 'openvino'):
+        raise ValueError(f'不支持导出的后端: {backend}')
+    from ultralytics import YOLO
+
+    # dynamic=True 导出动态批大小，便于批量推理
+    return YOLO(model_path).export(format=backend, imgsz=imgsz, dynamic=True)
+
+
+def model_version(model_path, backend, imgsz):
+    """
+    模型版本标识（后端、输入尺寸、模型文件名、大小和修改时间），不需要加载模型
+    模型文件更新后标识随之改变，基于它的结果缓存自动失效
+    """
+    path = model_path.rstrip('/\\')
+    size, mtime = 0, 0
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            stat = os.stat(os.path.join(path, name))
+            size += stat.st_size
+            mtime = max(mtime, int(stat.st_mtime))
+    elif os.path.exists(path):
+        stat = os.stat(path)
+        size, mtime = stat.st_size, int(stat.st_mtime)
+    return f'{backend}:{imgsz}:{os.path.basename(path)}:{size}:{mtime}'
+
+
+def input_stride(frames, crop, static_shape):
+    """
+    选择 letterbox 的填充步长（推理与量化校准共用，保证两者输入一致）
+    动态输入尺寸的模型推理整批尺寸相同的ROI裁剪区域时返回32（矩形输入，减少填充像素），
+    否则返回None（填充为 imgsz x imgsz 正方形）
+    """
+    if crop and not static_shape and len({frame.shape[:2] for frame in frames}) == 1:
+        return 32
+    return None
+
+
+def letterbox(frame, imgsz, stride=None):
+    """
+    等比缩放并填充到 imgsz x imgsz（与Ultralytics预处理一致）
+    stride 不为None时只填充到 stride 的整数倍（矩形输入），用于动态输入尺寸的模型推理ROI裁剪区域，
+    此时小于 imgsz 的区域保持原尺寸不再放大
+    返回:
+        tensor - (3, H, W) float32 RGB 输入张量，取值0~1
+        gain - 缩放比例
+        pad - (左, 上) 填充像素
+        size - 原图 (宽, 高)
+    """
+    height, width = frame.shape[:2]
+    gain = min(imgsz / height, imgsz / width)
+    if stride:
+        gain = min(gain, 1.0)
+    new_w, new_h = int(round(width * gain)), int(round(height * gain))
+    if stride:
+        pad_x, pad_y = (-new_w % stride) / 2, (-new_h % stride) / 2
+    else:
+        pad_x, pad_y = (imgsz - new_w) / 2, (imgsz - new_h) / 2
+
+    if (new_w, new_h) != (width, height):
+        frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(pad_y - 0.1)), int(round(pad_y + 0.1))
+    left, right = int(round(pad_x - 0.1)), int(round(pad_x + 0.1))
+    frame = cv2.copyMakeBorder(frame, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+
+    tensor = frame[:, :, ::-1].transpose(2, 0, 1)  # BGR -> RGB, HWC -> CHW
+    return np.ascontiguousarray(tensor, dtype=np.float32) / 255.0, gain, (left, top), (width, height)
+
+
+class RegionOfInterest(object):
+    """
+    感兴趣区域：推理前把帧裁剪到皮带所在区域（可再缩小），推理后把检测框映射回整帧坐标
+    """
+
+    def __init__(self, rect, scale=1.0):
+        """
+        参数:
+            rect - 整帧像素坐标 [x1, y1, x2, y2]，超出帧的部分会被截断
+            scale - 裁剪区域的缩放比例，小于1时进一步减少推理像素
+        """
+        self.rect = [int(v) for v in rect]
+        self.scale = float(scale)
+        if len(self.rect) != 4 or self.rect[2] <= self.rect[0] or self.rect[3] <= self.rect[1]:
+            raise ValueError(f'ROI区域无效: {rect}')
+        if not 0 < self.scale <= 1:
+            raise ValueError(f'ROI缩放比例应在(0, 1]之间: {scale}')
+
+    @classmethod
+    def from_config(cls, config):
+        """由配置构造ROI，支持 {'rect': [...], 'scale': 0.5} 或直接给出 [x1, y1, x2, y2]，未配置时返回None"""
+        if not config:
+            return None
+        if isinstance(config, RegionOfInterest):
+            return config
+        if isinstance(config, dict):
+            return cls(config['rect'], config.get('scale', 1.0))
+        return cls(config)
+
+    def bounds(self, frame_shape):
+        """ROI在指定尺寸帧中的实际像素范围 (x1, y1, x2, y2)"""
+        height, width = frame_shape[:2]
+        x1, y1, x2, y2 = self.rect
+        x1, x2 = min(max(x1, 0), width), min(max(x2, 0), width)
+        y1, y2 = min(max(y1, 0), height), min(max(y2, 0), height)
+        if x2 <= x1 or y2 <= y1:
+            return 0, 0, width, height  # ROI落在帧外时退回整帧
+        return x1, y1, x2, y2
+
+    def crop(self, frame):
+        """裁剪（并缩放）帧中的ROI区域，返回的图像直接送入推理引擎"""
+        x1, y1, x2, y2 = self.bounds(frame.shape)
+        region = frame[y1:y2, x1:x2]
+        if self.scale < 1:
+            size = (max(1, int(round((x2 - x1) * self.scale))), max(1, int(round((y2 - y1) * self.scale))))
+            region = cv2.resize(region, size, interpolation=cv2.INTER_AREA)
+        return region
+
+    def restore(self, detections, frame_shape):
+        """把ROI图像上的检测结果映射回整帧坐标"""
+        if len(detections.boxes) == 0:
+            return detections
+        x1, y1, x2, y2 = self.bounds(frame_shape)
+        boxes = detections.boxes.copy()
+        if self.scale < 1:
+            # 按实际缩放后的尺寸换算，避免取整带来的偏差
+            scale_x = (x2 - x1) / max(1, int(round((x2 - x1) * self.scale)))
+            scale_y = (y2 - y1) / max(1, int(round((y2 - y1) * self.scale)))
+            boxes[:, [0, 2]] *= scale_x
+            boxes[:, [1, 3]] *= scale_y
+        boxes[:, [0, 2]] += x1
+        boxes[:, [1, 3]] += y1
+        return detections._replace(boxes=boxes)
+
+    def pixel_ratio(self, frame_shape):
+        """送入推理的像素数占整帧的比例"""
+        x1, y1, x2, y2 = self.bounds(frame_shape)
+        return (x2 - x1) * (y2 - y1) * self.scale ** 2 / float(frame_shape[0] * frame_shape[1])
+
+    def draw(self, frame, color=(255, 255, 0)):
+        """在帧上画出ROI边框"""
+        x1, y1, x2, y2 = self.bounds(frame.shape)
+        cv2.rectangle(frame, (x1, y1), (x2 - 1, y2 - 1), color, 1)
+
+
+class InferenceEngine(object):
+    """
+    推理引擎接口：输入BGR帧列表，返回与输入一一对应的 Detections 列表
+    """
+    backend = None
+
+    def __init__(self, model_path, imgsz=640):
+        self.model_path = model_path
+        self.imgsz = imgsz
+        self.names = {}
+
+    def predict(self, frames, conf=0.25, iou=0.7, crop=False):
+        """
+        参数:
+            frames - BGR图像(numpy数组)列表
+            conf - 最低置信度
+            iou - NMS的IOU门限
+            crop - 输入是否为ROI裁剪区域：是时小于模型输入尺寸的区域按原尺寸推理、不再放大，
+                   整帧（图片、未配置ROI的视频和摄像头）保持原来的预处理
+        """
+        raise NotImplementedError
+
+    def __call__(self, frames, conf=0.25, iou=0.7, crop=False):
+        return self.predict(frames, conf=conf, iou=iou, crop=crop)
+
+    def warmup(self):
+        """用一帧空白图像预热，避免首帧推理耗时过长"""
+        self.predict([np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8)])
+
+
+class TorchEngine(InferenceEngine):
+    """基于 Ultralytics + PyTorch 的推理引擎"""
+    backend = 'pytorch'
+
+    def __init__(self, model_path, imgsz=640):
+        super().__init__(model_path, imgsz)
+        from ultralytics import YOLO  # 使用Ultralytics官方库
+
+        self.model = YOLO(model_path)
+        self.names = dict(self.model.names)
+
+    def predict(self, frames, conf=0.25, iou=0.7, crop=False):
+        if not frames:
+            return []
+        imgsz = self.imgsz
+        if crop:
+            # 小于模型输入尺寸的ROI裁剪区域按原尺寸推理，不再放大
+            longest = max(max(frame.shape[:2]) for frame in frames)
+            imgsz = min(self.imgsz, -(-longest // 32) * 32)
+        results = self.model(list(frames), verbose=False, conf=conf, iou=iou, imgsz=imgsz)
+        return [Detections(r.boxes.xyxy.cpu().numpy().astype(np.float32),
+                           r.boxes.conf.cpu().numpy().astype(np.float32),
+                           r.boxes.cls.cpu().numpy().astype(np.int64)) for r in results]
+
+
+class _ExportedYoloEngine(InferenceEngine):
+    """
+    导出模型（ONNX/OpenVINO）的公共部分：letterbox预处理、YOLO输出解码与NMS
+    导出的YOLOv8/11检测模型输出形状为 (B, 4 + 类别数, 锚点数)，前4行为输入图像坐标系下的 cx, cy, w, h
+    """
+    static_batch = True
+    static_shape = True  # 输入尺寸固定时只能填充为正方形
+
+    def _postprocess(self, output, gain, pad, size, conf, iou):
+        """解码单帧输出：置信度过滤 -> 按类别NMS -> 映射回原图坐标"""
+        predictions = output.T  # (锚点数, 4 + 类别数)
+        scores = predictions[:, 4:]
+        class_ids = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), class_ids]
+        keep = confidences > conf
+        if not keep.any():
+            return empty_detections()
+
+        boxes = predictions[keep, :4]
+        confidences = confidences[keep]
+        class_ids = class_ids[keep]
+        xyxy = np.empty_like(boxes)
+        xyxy[:, :2] = boxes[:, :2] - boxes[:, 2:] / 2
+        xyxy[:, 2:] = boxes[:, :2] + boxes[:, 2:] / 2
+
+        # 按类别偏移框坐标，使一次NMS只在同类之间抑制
+        offsets = class_ids[:, None] * float(self.imgsz * 2)
+        nms_boxes = np.concatenate((xyxy[:, :2] + offsets, xyxy[:, 2:] - xyxy[:, :2]), axis=1)
+        indices = cv2.dnn.NMSBoxes(nms_boxes.tolist(), confidences.tolist(), conf, iou)
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+
+        xyxy = xyxy[indices]
+        xyxy[:, [0, 2]] = (xyxy[:, [0, 2]] - pad[0]) / gain
+        xyxy[:, [1, 3]] = (xyxy[:, [1, 3]] - pad[1]) / gain
+        xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, size[0])
+        xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, size[1])
+        return Detections(xyxy.astype(np.float32), confidences[indices].astype(np.float32),
+                          class_ids[indices].astype(np.int64))
+
+    def _run(self, batch):
+        """执行模型，输入 (B, 3, imgsz, imgsz)，返回 (B, 4 + 类别数, 锚点数)"""
+        raise NotImplementedError
+
+    def predict(self, frames, conf=0.25, iou=0.7, crop=False):
+        if not frames:
+            return []
+        stride = input_stride(frames, crop, self.static_shape)
+        prepared = [letterbox(frame, self.imgsz, stride) for frame in frames]
+        tensors = np.stack([p[0] for p in prepared])
+        if self.static_batch:
+            outputs = np.concatenate([self._run(tensors[i:i + 1]) for i in range(len(tensors))])
+        else:
+            outputs = self._run(tensors)
+        return [self._postprocess(output, gain, pad, size, conf, iou)
+                for output, (_, gain, pad, size) in zip(outputs, prepared)]
+
+
+def _parse_names(names):
+    """解析导出模型元数据中的类别名称，如 "{0: 'coal'}" """
+    if isinstance(names, dict):
+        return {int(k): v for k, v in names.items()}
+    try:
+        return {int(k): v for k, v in ast.literal_eval(names).items()}
+    except (ValueError, SyntaxError, AttributeError):
+        return {}
+
+
+class OnnxRuntimeEngine(_ExportedYoloEngine):
+    """基于 ONNX Runtime (CPU) 的推理引擎"""
+    backend = 'onnx'
+
+    def __init__(self, model_path, imgsz=640, threads=0):
+        super().__init__(model_path, imgsz)
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.static_batch = isinstance(model_input.shape[0], int)
+        self.static_shape = isinstance(model_input.shape[2], int)
+        if self.static_shape:
+            self.imgsz = model_input.shape[2]
+        self.names = _parse_names(self.session.get_modelmeta().custom_metadata_map.get('names', '{}'))
+
+    def _run(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class OpenVinoEngine(_ExportedYoloEngine):
+    """基于 OpenVINO (CPU) 的推理引擎"""
+    backend = 'openvino'
+
+    def __init__(self, model_path, imgsz=640, threads=0):
+        super().__init__(model_path, imgsz)
+        import openvino as ov
+
+        xml_path = model_path
+        if os.path.isdir(model_path):
+            xml_path = next(os.path.join(model_path, f) for f in os.listdir(model_path) if f.endswith('.xml'))
+        core = ov.Core()
+        model = core.read_model(xml_path)
+        input_shape = model.input(0).get_partial_shape()
+        self.static_batch = input_shape[0].is_static
+        self.static_shape = input_shape[2].is_static
+        if self.static_shape:
+            self.imgsz = input_shape[2].get_length()
+
+        config = {'PERFORMANCE_HINT': 'LATENCY'}
+        if threads:
+            config['INFERENCE_NUM_THREADS'] = threads
+        self.compiled = core.compile_model(model, 'CPU', config)
+        self.output = self.compiled.output(0)
+        self.names = self._load_names(os.path.dirname(xml_path))
+
+    @staticmethod
+    def _load_names(model_dir):
+        """从Ultralytics导出目录中的 metadata.yaml 读取类别名称"""
+        metadata_path = os.path.join(model_dir, 'metadata.yaml')
+        if not os.path.exists(metadata_path):
+            return {}
+        import yaml
+
+        with open(metadata_path, 'r', encoding='utf-8') as f:
+            return _parse_names(yaml.safe_load(f).get('names', {}))
+
+    def _run(self, batch):
+        return self.compiled(batch)[self.output]
+
+
+ENGINE_CLASSES = {
+    'pytorch': TorchEngine,
+    'onnx': OnnxRuntimeEngine,
+    'openvino': OpenVinoEngine
+}
+
+
+def create_engine(backend=None, model_path=None, imgsz=None):
+    """
+    根据配置创建推理引擎
+    参数:
+        backend - 'pytorch' / 'onnx' / 'openvino' / 'auto'，默认使用 Config.INFERENCE_BACKEND
+        model_path - 模型路径，默认使用 Config.MODEL_PATH
+    当后端为 onnx/openvino 而模型路径是 .pt 权重时，首次使用会自动导出并复用导出结果
+    """
+    from config import Config
+
+    backend = backend or Config.INFERENCE_BACKEND
+    model_path = model_path or Config.MODEL_PATH
+    imgsz = imgsz or Config.INFERENCE_IMGSZ
+
+    if backend == 'auto':
+        backend = detect_backend(model_path)
+    if backend not in ENGINE_CLASSES:
+        raise ValueError(f'未知的推理后端: {backend}，可选: {", ".join(BACKENDS)}')
+
+    if backend != 'pytorch' and detect_backend(model_path) == 'pytorch':
+        exported_path = exported_model_path(model_path, backend)
+        if not os.path.exists(exported_path):
+            print(f"导出 {model_path} 为 {backend} 格式...")
+            exported_path = export_model(model_path, backend, imgsz)
+        model_path = exported_path
+
+    engine = ENGINE_CLASSES[backend](model_path, imgsz)
+    print(f"推理引擎: {backend}, 模型: {model_path}")
+    return engine
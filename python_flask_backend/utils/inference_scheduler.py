@@ -0,0 +1,127 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class InferenceScheduler(object):
+    """
+    多路摄像头共享的推理调度器
+
+    各摄像头提交的帧先进入同一个队列，调度线程把它们攒成小批次（达到最大批大小或
+    最早一帧等待超过截止时间即发车）一次性送入引擎，再通过Future把结果交还给对应的摄像头。
+    引擎只在调度线程中调用，各摄像头之间不再争抢模型，也不会修改模型的共享参数。
+    """
+
+    def __init__(self, engine, max_batch_size=8, max_wait=0.02, predict_kwargs=None):
+        """
+        参数:
+            engine - 推理引擎（utils.inference_engine.InferenceEngine），接受帧列表、返回结果列表
+            max_batch_size - 每批最多合并的帧数
+            max_wait - 批次中第一帧的最长等待时间（秒），超过后不再等待凑满
+            predict_kwargs - 每次推理透传给引擎的参数，如 {'conf': 0.25}
+        """
+        self.engine = engine
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max_wait
+        self.predict_kwargs = dict(predict_kwargs or {})
+        self.requests = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.running = False
+        # 统计信息
+        self.batches = 0
+        self.frames = 0
+
+    def start(self):
+        """启动调度线程（重复调用无副作用）"""
+        with self.lock:
+            if self.running:
+                return
+            self.running = True
+            self.thread = threading.Thread(target=self._worker, name='inference-scheduler', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """停止调度线程，未处理的请求以异常结束"""
+        with self.lock:
+            if not self.running:
+                return
+            self.running = False
+        self.requests.put(None)
+        self.thread.join()
+
+    def submit(self, frame, crop=False):
+        """提交一帧（crop表示是否为ROI裁剪区域，见引擎的predict），返回Future，其结果为该帧的检测结果"""
+        if not self.running:
+            self.start()
+        future = Future()
+        self.requests.put((frame, crop, future))
+        return future
+
+    def infer(self, frame, timeout=None, crop=False):
+        """提交一帧并等待其检测结果"""
+        return self.submit(frame, crop).result(timeout)
+
+    def _collect_batch(self):
+        """阻塞等待第一帧，然后在截止时间内尽量凑满一批"""
+        first = self.requests.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # 收到停止信号，处理完当前批次后退出
+                self.requests.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _worker(self):
+        while self.running:
+            batch = self._collect_batch()
+            if batch is None:
+                break
+
+            # 整帧和ROI裁剪区域的预处理不同，分开推理
+            for crop in (False, True):
+                group = [item for item in batch if item[1] is crop]
+                if not group:
+                    continue
+                frames = [frame for frame, _, _ in group]
+                try:
+                    results = self.engine.predict(frames, crop=crop, **self.predict_kwargs)
+                except Exception as e:
+                    for _, _, future in group:
+                        future.set_exception(e)
+                    continue
+
+                self.batches += 1
+                self.frames += len(frames)
+                for (_, _, future), result in zip(group, results):
+                    future.set_result(result)
+
+        # 通知仍在等待的调用者
+        while True:
+            try:
+                item = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                item[2].set_exception(RuntimeError('推理调度器已停止'))
+
+    def stats(self):
+        """返回调度统计：批次数、帧数和平均批大小"""
+        return {
+            'batches': self.batches,
+            'frames': self.frames,
+            'average_batch_size': self.frames / self.batches if self.batches else 0
+        }
@@ -0,0 +1,220 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+
+class QueueFullError(Exception):
+    """等待中的任务数已达上限"""
+    pass
+
+
+def _worker_main(handler, initializer, jobs, events):
+    """工作进程主循环：逐个取任务执行，通过事件队列向主进程报告开始/进度/结果"""
+    if initializer is not None:
+        initializer()
+    while True:
+        item = jobs.get()
+        if item is None:
+            break
+        job_id, payload = item
+        events.put((job_id, 'started', os.getpid()))
+
+        def report(event, data=None, job_id=job_id):
+            events.put((job_id, event, data))
+
+        try:
+            result = handler(job_id, payload, report)
+        except Exception as e:
+            events.put((job_id, 'failed', str(e)))
+        else:
+            events.put((job_id, 'completed', result))
+
+
+class JobQueue(object):
+    """
+    有界的多进程任务队列
+
+    - 固定数量的工作进程，每个进程各自加载模型，互不争抢GIL
+    - 等待中的任务按用户轮转调度：同一用户的任务先进先出，不同用户之间轮流执行，
+      一个用户一次上传多个视频不会让其他用户一直等待
+    - 只有空闲进程时才派发任务，超出处理能力的任务在主进程中排队，不会占满CPU影响实时摄像头
+    - 等待数达到上限时 submit 抛出 QueueFullError
+    """
+
+    def __init__(self, handler, num_workers=1, max_pending=20, on_event=None, initializer=None):
+        """
+        参数:
+            handler - 在工作进程中执行的函数 handler(job_id, payload, report)，返回值作为任务结果；
+                      必须是模块级函数（工作进程以spawn方式启动，需要能被pickle）
+            num_workers - 工作进程数
+            max_pending - 最多等待的任务数
+            on_event - 主进程中的事件回调 on_event(job_id, event, data)，
+                       event 为 'started' / 'completed' / 'failed' 或 handler 通过 report 发出的自定义事件
+            initializer - 工作进程启动时执行的函数（如设置优先级、预加载模型）
+        """
+        self.handler = handler
+        self.num_workers = max(1, int(num_workers))
+        self.max_pending = max_pending
+        self.on_event = on_event
+        self.initializer = initializer
+        # 队列实例ID：记录在任务上，多进程部署时其他进程据此（及心跳）判断任务所在的队列是否仍在运行
+        self.instance_id = uuid.uuid4().hex
+
+        self.context = multiprocessing.get_context('spawn')
+        self.events = self.context.Queue()
+        self.lock = threading.Lock()
+        self.pending = OrderedDict()  # 用户ID -> 等待中的任务deque，按轮转顺序排列
+        self.payloads = {}  # 等待中的任务ID -> (用户ID, 参数)
+        # 每个工作进程有自己的任务队列，派发时即可知道任务由哪个进程执行，进程崩溃时能找回其任务
+        self.workers = []  # [(进程, 任务队列)]
+        self.assigned = []  # 各工作进程正在执行的任务ID，空闲时为None
+        self.collector = None
+        self.started = False
+        # 统计信息
+        self.completed = 0
+        self.failed = 0
+
+    def start(self):
+        """启动工作进程和事件收集线程（重复调用无副作用）"""
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+            self.workers = [self._spawn_worker() for _ in range(self.num_workers)]
+            self.assigned = [None] * self.num_workers
+        self.collector = threading.Thread(target=self._collect_events, name='job-queue-events', daemon=True)
+        self.collector.start()
+
+    def _spawn_worker(self):
+        jobs = self.context.Queue()
+        worker = self.context.Process(target=_worker_main, args=(self.handler, self.initializer, jobs, self.events),
+                                      name='video-worker', daemon=True)
+        worker.start()
+        return worker, jobs
+
+    def submit(self, job_id, user_id, payload):
+        """加入任务，返回当前排队位置（1表示下一个执行）"""
+        if not self.started:
+            self.start()
+        with self.lock:
+            if len(self.payloads) >= self.max_pending:
+                raise QueueFullError(f'等待中的任务已达上限 ({self.max_pending})')
+            self.payloads[job_id] = (user_id, payload)
+            self.pending.setdefault(user_id, deque()).append(job_id)
+            self._dispatch()
+            return self._position(job_id)
+
+    def _dispatch(self):
+        """有空闲工作进程时按用户轮转取出任务派发（需持有锁）"""
+        while self.pending and None in self.assigned:
+            slot = self.assigned.index(None)
+            user_id, user_jobs = next(iter(self.pending.items()))
+            job_id = user_jobs.popleft()
+            # 该用户还有任务时移到队尾，等其他用户轮过一遍再执行
+            del self.pending[user_id]
+            if user_jobs:
+                self.pending[user_id] = user_jobs
+            _, payload = self.payloads.pop(job_id)
+            self.assigned[slot] = job_id
+            self.workers[slot][1].put((job_id, payload))
+
+    def _position(self, job_id):
+        """按轮转规则计算任务的排队位置（需持有锁），已派发或不存在时返回0"""
+        if job_id not in self.payloads:
+            return 0
+        user_id = self.payloads[job_id][0]
+        users = list(self.pending.items())
+        user_index = next(i for i, (u, _) in enumerate(users) if u == user_id)
+        rank = users[user_index][1].index(job_id)
+        # 第rank轮中排在前面的用户各执行rank+1个任务，排在后面的用户各执行rank个任务
+        ahead = sum(min(len(jobs), rank + 1 if i < user_index else rank)
+                    for i, (_, jobs) in enumerate(users) if i != user_index)
+        return ahead + rank + 1
+
+    def position(self, job_id):
+        """任务的排队位置，已开始执行或不存在时返回0"""
+        with self.lock:
+            return self._position(job_id)
+
+    def _finish(self, job_id):
+        with self.lock:
+            if job_id in self.assigned:
+                self.assigned[self.assigned.index(job_id)] = None
+            self._dispatch()
+
+    def _emit(self, job_id, event, data):
+        if self.on_event is None:
+            return
+        try:
+            self.on_event(job_id, event, data)
+        except Exception as e:
+            print(f"任务事件处理失败 {job_id} {event}: {str(e)}")
+
+    def _collect_events(self):
+        """主进程中的事件收集线程：转发事件，任务结束后派发下一个，并替换意外退出的工作进程"""
+        while self.started:
+            try:
+                job_id, event, data = self.events.get(timeout=1.0)
+            except queue.Empty:
+                self._check_workers()
+                continue
+
+            if event in ('completed', 'failed'):
+                if event == 'completed':
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                self._finish(job_id)
+            self._emit(job_id, event, data)
+
+    def _check_workers(self):
+        """工作进程崩溃（如内存不足被杀）时使其任务失败并重启进程"""
+        for i, (worker, _) in enumerate(self.workers):
+            if worker.is_alive() or not self.started:
+                continue
+            print(f"视频处理进程 {worker.pid} 意外退出，退出码 {worker.exitcode}")
+            with self.lock:
+                job_id = self.assigned[i]
+                self.workers[i] = self._spawn_worker()
+            if job_id is not None:
+                self.failed += 1
+                self._finish(job_id)
+                self._emit(job_id, 'failed', f'处理进程意外退出 (exitcode={worker.exitcode})')
+
+    def stop(self, timeout=5.0):
+        """停止工作进程，等待中的任务被丢弃"""
+        with self.lock:
+            if not self.started:
+                return
+            self.started = False
+            self.pending.clear()
+            self.payloads.clear()
+        for _, jobs in self.workers:
+            jobs.put(None)
+        deadline = time.monotonic() + timeout
+        for worker, _ in self.workers:
+            worker.join(max(0.0, deadline - time.monotonic()))
+            if worker.is_alive():
+                worker.terminate()
+
+    def active_jobs(self):
+        """等待中和执行中的任务ID"""
+        with self.lock:
+            return set(self.payloads) | {job_id for job_id in self.assigned if job_id is not None}
+
+    def stats(self):
+        """队列统计：等待数、执行中任务数、各用户等待数等"""
+        with self.lock:
+            return {
+                'workers': self.num_workers,
+                'alive_workers': sum(1 for worker, _ in self.workers if worker.is_alive()),
+                'pending': len(self.payloads),
+                'running': sum(1 for job_id in self.assigned if job_id is not None),
+                'pending_by_user': {user_id: len(jobs) for user_id, jobs in self.pending.items()},
+                'completed': self.completed,
+                'failed': self.failed
+            }
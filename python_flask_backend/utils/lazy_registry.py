@@ -0,0 +1,126 @@
+import threading
+import time
+
+
+class LazyResource(object):
+    """
+    延迟初始化的资源（如推理引擎）：第一次调用 get() 时才创建，之后返回同一实例
+    多线程同时首次访问时只会创建一次，并记录创建耗时
+    """
+
+    def __init__(self, name, factory):
+        """
+        参数:
+            name - 资源名称（用于日志和状态输出）
+            factory - 无参工厂函数，返回资源实例
+        """
+        self.name = name
+        self.factory = factory
+        self.lock = threading.Lock()
+        self.instance = None
+        self.load_time = None  # 创建耗时（秒），未创建时为None
+
+    @property
+    def loaded(self):
+        return self.instance is not None
+
+    def get(self):
+        """返回资源实例，首次调用时创建"""
+        instance = self.instance
+        if instance is not None:
+            return instance
+        with self.lock:
+            if self.instance is None:
+                start = time.perf_counter()
+                self.instance = self.factory()
+                self.load_time = time.perf_counter() - start
+                print(f"{self.name} 加载完成，耗时 {self.load_time:.2f}秒")
+            return self.instance
+
+    def status(self):
+        return {'loaded': self.loaded, 'load_time': self.load_time}
+
+
+class LazyRegistry(object):
+    """
+    按序号延迟创建的一组资源（如摄像头）：registry[i] 首次访问时才创建第i个实例
+    支持 len(registry)，序号越界时抛出 IndexError，与列表行为一致
+    """
+
+    def __init__(self, name, factory, size):
+        """
+        参数:
+            name - 资源名称（用于日志和状态输出）
+            factory - 工厂函数 factory(i)，返回第i个实例
+            size - 资源个数
+        """
+        self.name = name
+        self.factory = factory
+        self.size = size
+        self.lock = threading.Lock()
+        self.instances = {}
+        self.load_times = {}
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.size:
+            raise IndexError(f'{self.name} 序号越界: {i}')
+        instance = self.instances.get(i)
+        if instance is not None:
+            return instance
+        with self.lock:
+            if i not in self.instances:
+                start = time.perf_counter()
+                self.instances[i] = self.factory(i)
+                self.load_times[i] = time.perf_counter() - start
+            return self.instances[i]
+
+    def loaded(self):
+        """已创建的实例 {序号: 实例}"""
+        return dict(self.instances)
+
+    def load_all(self):
+        """创建全部实例，返回总耗时（秒）"""
+        start = time.perf_counter()
+        for i in range(self.size):
+            self[i]
+        return time.perf_counter() - start
+
+    def status(self):
+        return {'loaded': sorted(self.instances), 'size': self.size, 'load_times': dict(self.load_times)}
+
+
+class BackgroundWorkers(object):
+    """
+    后台线程注册表：先登记线程函数，真正需要时（启动钩子或首次使用）才启动
+    同名线程只会启动一次，重复调用 ensure 无副作用
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.targets = {}
+        self.threads = {}
+
+    def register(self, name, target):
+        """登记后台线程函数（不启动）"""
+        self.targets[name] = target
+
+    def ensure(self, name):
+        """确保指定的后台线程已启动"""
+        with self.lock:
+            thread = self.threads.get(name)
+            if thread is not None and thread.is_alive():
+                return thread
+            thread = threading.Thread(target=self.targets[name], name=name, daemon=True)
+            thread.start()
+            self.threads[name] = thread
+            return thread
+
+    def start_all(self):
+        for name in list(self.targets):
+            self.ensure(name)
+
+    def status(self):
+        return {name: name in self.threads and self.threads[name].is_alive() for name in self.targets}
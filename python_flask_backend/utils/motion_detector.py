@@ -0,0 +1,60 @@
+import cv2
+import numpy as np
+
+
+class MotionDetector(object):
+    """
+    低成本的画面变化检测：在缩小的灰度图上与上一次推理时的参考帧做差分
+
+    皮带停止或空载时画面几乎不变，可以跳过模型推理。参考帧只在真正推理时更新，
+    因此缓慢的累积变化也会被发现；连续跳过的帧数达到上限时强制推理一次。
+    """
+
+    def __init__(self, width=160, diff_threshold=25, min_changed_ratio=0.002, max_skip_frames=50):
+        """
+        参数:
+            width - 差分前把帧缩小到的宽度（像素）
+            diff_threshold - 灰度差超过该值的像素视为变化
+            min_changed_ratio - 变化像素占比达到该值时认为画面有运动
+            max_skip_frames - 最多连续跳过的帧数，0表示不限制
+        """
+        self.width = width
+        self.diff_threshold = diff_threshold
+        self.min_changed_ratio = min_changed_ratio
+        self.max_skip_frames = max_skip_frames
+        self.reference = None
+        self.skipped_in_row = 0
+        self.last_changed_ratio = 0.0
+
+    def _prepare(self, frame):
+        height, width = frame.shape[:2]
+        size = (self.width, max(1, int(round(height * self.width / float(width)))))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        # 轻微模糊，抑制传感器噪声和压缩噪点
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def should_infer(self, frame):
+        """判断该帧是否需要推理；返回True时以该帧作为新的参考帧"""
+        current = self._prepare(frame)
+        if self.reference is None or self.reference.shape != current.shape:
+            changed = True
+            self.last_changed_ratio = 1.0
+        else:
+            diff = cv2.absdiff(current, self.reference)
+            self.last_changed_ratio = np.count_nonzero(diff > self.diff_threshold) / float(diff.size)
+            changed = self.last_changed_ratio >= self.min_changed_ratio
+
+        if not changed and (not self.max_skip_frames or self.skipped_in_row < self.max_skip_frames):
+            self.skipped_in_row += 1
+            return False
+
+        self.reference = current
+        self.skipped_in_row = 0
+        return True
+
+    def reset(self):
+        """丢弃参考帧，下一帧必定推理"""
+        self.reference = None
+        self.skipped_in_row = 0
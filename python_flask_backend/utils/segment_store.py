@@ -0,0 +1,182 @@
+import os
+import struct
+import zipfile
+
+import numpy as np
+
+# 列式存储的字段，均为定长类型数组，行按帧号排序
+COLUMNS = {
+    'frame_number': np.int32,
+    'track_id': np.int32,
+    'class_id': np.int16,
+    'confidence': np.float32,
+    'bbox': np.float32,  # (N, 4): x1, y1, x2, y2
+    'rel_timestamp': np.float32,  # 相对片段开始的秒数
+    'abs_timestamp': np.float64
+}
+
+
+def segment_index_path(summary_path):
+    """汇总JSON对应的列式检测文件路径"""
+    return os.path.splitext(summary_path)[0] + '.npz'
+
+
+class SegmentColumnsBuilder(object):
+    """逐条追加检测结果，片段结束时写成列式 .npz 文件"""
+
+    def __init__(self):
+        self.class_names = []
+        self.class_ids = {}
+        self.columns = {name: [] for name in COLUMNS}
+
+    def __len__(self):
+        return len(self.columns['frame_number'])
+
+    def add(self, detection):
+        """追加一条检测结果（与JSON中的检测字典格式相同，缺少的字段取默认值）"""
+        class_name = detection.get('class', '')
+        class_id = self.class_ids.get(class_name)
+        if class_id is None:
+            class_id = self.class_ids[class_name] = len(self.class_names)
+            self.class_names.append(class_name)
+        abs_timestamp = detection.get('abs_timestamp', detection.get('timestamp', 0.0))
+        columns = self.columns
+        columns['frame_number'].append(detection.get('frame_number', -1))
+        columns['track_id'].append(detection.get('track_id', -1))
+        columns['class_id'].append(class_id)
+        columns['confidence'].append(detection.get('confidence', 0.0))
+        columns['bbox'].append(detection.get('bbox', (0, 0, 0, 0)))
+        columns['rel_timestamp'].append(detection.get('rel_timestamp', 0.0))
+        columns['abs_timestamp'].append(abs_timestamp)
+
+    def save(self, path):
+        """写入 .npz（不压缩，读取时不需要解压），返回文件大小"""
+        arrays = {name: np.asarray(values, dtype=COLUMNS[name]) for name, values in self.columns.items()}
+        arrays['bbox'] = arrays['bbox'].reshape(-1, 4)
+        # 按帧号排序（稳定排序，保持同一帧内的顺序）
+        order = np.argsort(arrays['frame_number'], kind='stable')
+        arrays = {name: values[order] for name, values in arrays.items()}
+
+        # 帧索引：第i个有检测的帧为 frame_index[i]，其检测位于 [frame_offsets[i], frame_offsets[i+1]) 行
+        frame_index, starts = np.unique(arrays['frame_number'], return_index=True)
+        frame_offsets = np.append(starts, len(order)).astype(np.int64)
+        frame_times = arrays['rel_timestamp'][starts]
+
+        temp_path = path + '.tmp.npz'
+        np.savez(temp_path, class_names=np.asarray(self.class_names, dtype=str),
+                 frame_index=frame_index.astype(np.int32), frame_offsets=frame_offsets,
+                 frame_times=frame_times.astype(np.float32), **arrays)
+        os.replace(temp_path, path)
+        return os.path.getsize(path)
+
+
+def save_segment_columns(path, detections):
+    """把检测字典列表写成列式 .npz 文件，返回文件大小"""
+    builder = SegmentColumnsBuilder()
+    for detection in detections:
+        builder.add(detection)
+    return builder.save(path)
+
+
+def _memmap_member(path, archive, name):
+    """
+    把 .npz 中未压缩的数组直接映射到内存（np.load 读取 .npz 时会把整个数组读入内存），
+    只有实际访问到的行才会从磁盘读取；压缩的成员返回None
+    """
+    info = archive.getinfo(name + '.npy')
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+    with open(path, 'rb') as f:
+        # 本地文件头固定30字节，其后是文件名和扩展字段，再之后才是 .npy 数据
+        f.seek(info.header_offset)
+        local_header = f.read(30)
+        name_length, extra_length = struct.unpack('<HH', local_header[26:30])
+        f.seek(info.header_offset + 30 + name_length + extra_length)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    if dtype.hasobject or 0 in shape:
+        return None
+    return np.memmap(path, dtype=dtype, mode='r', shape=shape, offset=offset, order='F' if fortran_order else 'C')
+
+
+class SegmentColumns(object):
+    """
+    读取列式检测文件：先只读取帧索引，按帧号或时间窗口定位行范围，
+    各列以内存映射方式访问，只读取该范围内的行，不需要解析整个片段
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.data = np.load(path, allow_pickle=False)
+        self.archive = zipfile.ZipFile(path)
+        self.class_names = [str(name) for name in self.data['class_names']]
+        self.frame_index = self.data['frame_index']
+        self.frame_offsets = self.data['frame_offsets']
+        self.frame_times = self.data['frame_times']
+        self._columns = {}
+
+    def close(self):
+        self._columns.clear()
+        self.archive.close()
+        self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return int(self.frame_offsets[-1]) if len(self.frame_offsets) else 0
+
+    def column(self, name):
+        if name not in self._columns:
+            values = _memmap_member(self.path, self.archive, name)
+            self._columns[name] = values if values is not None else self.data[name]
+        return self._columns[name]
+
+    def _rows(self, start, end):
+        """第 start 到 end-1 个索引帧对应的行范围"""
+        return int(self.frame_offsets[start]), int(self.frame_offsets[end])
+
+    def rows_for_frames(self, first_frame, last_frame):
+        """帧号在 [first_frame, last_frame] 内的行范围"""
+        start = np.searchsorted(self.frame_index, first_frame, side='left')
+        end = np.searchsorted(self.frame_index, last_frame, side='right')
+        return self._rows(start, end)
+
+    def rows_for_window(self, start_time, end_time):
+        """相对时间在 [start_time, end_time] 内的行范围"""
+        start = np.searchsorted(self.frame_times, start_time, side='left')
+        end = np.searchsorted(self.frame_times, end_time, side='right')
+        return self._rows(start, end)
+
+    def to_dicts(self, row_start=0, row_end=None):
+        """把行范围转换为与JSON格式相同的检测字典列表"""
+        row_end = len(self) if row_end is None else row_end
+        if row_end <= row_start:
+            return []
+        frame_number = self.column('frame_number')[row_start:row_end].tolist()
+        track_id = self.column('track_id')[row_start:row_end].tolist()
+        class_id = self.column('class_id')[row_start:row_end].tolist()
+        confidence = self.column('confidence')[row_start:row_end].tolist()
+        bbox = self.column('bbox')[row_start:row_end].tolist()
+        rel_timestamp = self.column('rel_timestamp')[row_start:row_end].tolist()
+        abs_timestamp = self.column('abs_timestamp')[row_start:row_end].tolist()
+        return [{
+            'class': self.class_names[class_id[i]],
+            'confidence': confidence[i],
+            'bbox': bbox[i],
+            'track_id': track_id[i],
+            'abs_timestamp': abs_timestamp[i],
+            'rel_timestamp': rel_timestamp[i],
+            'frame_number': frame_number[i]
+        } for i in range(row_end - row_start)]
+
+    def window(self, start_time, end_time):
+        """相对时间窗口内的检测结果"""
+        return self.to_dicts(*self.rows_for_window(start_time, end_time))
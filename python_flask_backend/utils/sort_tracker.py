@@ -0,0 +1,588 @@
+import numpy as np
+
+# scipy 在第一次关联时才导入，避免导入本模块（以及 newApp）时就付出 scipy 的加载开销
+
+
+# ===================== 实现SORT追踪算法 ====================
+def convert_bboxes_to_z(bboxes):
+    """
+    将(N,4)的[x1,y1,x2,y2]边界框批量转换为[x,y,s,r]格式
+    x,y是中心点，s是面积，r是宽高比
+    """
+    bboxes = np.asarray(bboxes, dtype=np.float64)
+    w = bboxes[:, 2] - bboxes[:, 0]
+    h = bboxes[:, 3] - bboxes[:, 1]
+    x = bboxes[:, 0] + w / 2.
+    y = bboxes[:, 1] + h / 2.
+    s = w * h
+    r = np.divide(w, h, out=np.ones_like(w), where=h > 0)
+    return np.stack((x, y, s, r), axis=1)
+
+
+def convert_x_to_bboxes(x):
+    """
+    将(N,>=4)的[x,y,s,r,...]状态批量转换回[x1,y1,x2,y2]格式
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        w = np.sqrt(x[:, 2] * x[:, 3])
+        h = x[:, 2] / w
+    return np.stack((x[:, 0] - w / 2., x[:, 1] - h / 2., x[:, 0] + w / 2., x[:, 1] + h / 2.), axis=1)
+
+
+def _broadcast_iou(bb_a, bb_b):
+    """按NumPy广播规则计算框之间的交并比，最后一维为[x1,y1,x2,y2,...]"""
+    xx1 = np.maximum(bb_a[..., 0], bb_b[..., 0])
+    yy1 = np.maximum(bb_a[..., 1], bb_b[..., 1])
+    xx2 = np.minimum(bb_a[..., 2], bb_b[..., 2])
+    yy2 = np.minimum(bb_a[..., 3], bb_b[..., 3])
+    intersection = np.maximum(0., xx2 - xx1) * np.maximum(0., yy2 - yy1)
+
+    area_a = (bb_a[..., 2] - bb_a[..., 0]) * (bb_a[..., 3] - bb_a[..., 1])
+    area_b = (bb_b[..., 2] - bb_b[..., 0]) * (bb_b[..., 3] - bb_b[..., 1])
+    union = area_a + area_b - intersection
+
+    # 并集为0时IOU记为0，避免除以0
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union != 0)
+
+
+def iou_batch(bb_det, bb_trk):
+    """
+    向量化计算两组框之间的交并比(IOU)矩阵
+    参数:
+        bb_det - (N, >=4) 检测框 [x1,y1,x2,y2,...]
+        bb_trk - (M, >=4) 追踪框 [x1,y1,x2,y2,...]
+    返回:
+        (N, M) 的IOU矩阵
+    """
+    bb_det = np.asarray(bb_det, dtype=np.float64)[:, None, :4]
+    bb_trk = np.asarray(bb_trk, dtype=np.float64)[None, :, :4]
+    return _broadcast_iou(bb_det, bb_trk)
+
+
+def iou_pairwise(bb_a, bb_b):
+    """逐行计算两组等长框的交并比，返回(N,)"""
+    return _broadcast_iou(np.asarray(bb_a, dtype=np.float64), np.asarray(bb_b, dtype=np.float64))
+
+
+def associate_detections_to_trackers(detections, trackers, iou_threshold=0.3):
+    """
+    使用匈牙利算法将检测结果与现有追踪器关联
+    返回:
+        matches - (K, 2) 的[检测索引, 追踪器索引]
+        unmatched_detections - 未匹配的检测索引
+        unmatched_trackers - 未匹配的追踪器索引
+    """
+    num_dets = len(detections)
+    num_trks = len(trackers)
+    if num_trks == 0 or num_dets == 0:
+        return np.empty((0, 2), dtype=int), np.arange(num_dets), np.arange(num_trks)
+
+    from scipy.optimize import linear_sum_assignment
+
+    # 与原实现一样用float32的IOU矩阵，IOU相近时匈牙利算法的选择与原来一致
+    iou_matrix = iou_batch(detections, trackers).astype(np.float32)
+
+    # 使用匈牙利算法进行关联
+    row_ind, col_ind = linear_sum_assignment(-iou_matrix)
+
+    # 过滤掉低IOU的匹配
+    keep = iou_matrix[row_ind, col_ind] >= iou_threshold
+    matches = np.stack((row_ind[keep], col_ind[keep]), axis=1).astype(int)
+
+    # 未匹配的检测与追踪器保持原实现的顺序：先是未被分配的，再是分配了但IOU过低的
+    # （新追踪器按未匹配检测的顺序分配ID）
+    det_assigned = np.zeros(num_dets, dtype=bool)
+    det_assigned[row_ind] = True
+    trk_assigned = np.zeros(num_trks, dtype=bool)
+    trk_assigned[col_ind] = True
+    unmatched_detections = np.concatenate((np.flatnonzero(~det_assigned), row_ind[~keep]))
+    unmatched_trackers = np.concatenate((np.flatnonzero(~trk_assigned), col_ind[~keep]))
+
+    return matches, unmatched_detections, unmatched_trackers
+
+
+# 检测数×追踪器数低于该值时，门控关联退化为全量关联
+GATING_MIN_PAIRS = 128 * 128
+
+
+def _expand_grid_cells(boxes, cell_size):
+    """
+    将每个框展开为它覆盖的网格单元
+    返回:
+        box_index - 每个(框, 单元)对应的框索引
+        cell_key - 单元编号
+    """
+    cells = np.floor(boxes[:, :4] / cell_size).astype(np.int64)
+    cells = np.maximum(cells, 0)
+    col1, row1, col2, row2 = cells[:, 0], cells[:, 1], np.maximum(cells[:, 2], cells[:, 0]), \
+        np.maximum(cells[:, 3], cells[:, 1])
+    num_cols = col2 - col1 + 1
+    counts = num_cols * (row2 - row1 + 1)
+
+    box_index = np.repeat(np.arange(len(boxes)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    cell_col = col1[box_index] + offsets % num_cols[box_index]
+    cell_row = row1[box_index] + offsets // num_cols[box_index]
+    return box_index, (cell_row << 32) | cell_col
+
+
+def candidate_pairs_grid(detections, trackers, cell_size=None):
+    """
+    用均匀网格索引预测框，只返回空间上有重叠可能的[检测索引, 追踪器索引]候选对
+    参数:
+        cell_size - 网格边长（像素），默认取追踪框宽高的中位数
+    """
+    detections = np.asarray(detections, dtype=np.float64)
+    trackers = np.asarray(trackers, dtype=np.float64)
+    if cell_size is None:
+        sizes = np.concatenate((trackers[:, 2] - trackers[:, 0], trackers[:, 3] - trackers[:, 1]))
+        cell_size = max(float(np.median(sizes)), 1.0)
+
+    trk_index, trk_keys = _expand_grid_cells(trackers, cell_size)
+    det_index, det_keys = _expand_grid_cells(detections, cell_size)
+
+    # 按单元编号排序追踪器，检测框通过二分查找定位同一单元内的追踪器
+    order = np.argsort(trk_keys, kind='stable')
+    trk_index, trk_keys = trk_index[order], trk_keys[order]
+    lo = np.searchsorted(trk_keys, det_keys, side='left')
+    hi = np.searchsorted(trk_keys, det_keys, side='right')
+    counts = hi - lo
+
+    pair_det = np.repeat(det_index, counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    pair_trk = trk_index[np.repeat(lo, counts) + offsets]
+
+    # 同一对框可能共享多个单元，去重
+    pair_keys = np.unique(pair_det * len(trackers) + pair_trk)
+    return np.stack((pair_keys // len(trackers), pair_keys % len(trackers)), axis=1)
+
+
+def associate_detections_to_trackers_gated(detections, trackers, iou_threshold=0.3, cell_size=None):
+    """
+    带空间门控的关联：先用网格剪除不可能的框对，再在稀疏代价图的每个连通分量上分别运行匈牙利算法
+    IOU为0的框对不可能成为有效匹配，因此结果与全量关联一致，但代价随目标数近似线性增长
+    """
+    num_dets = len(detections)
+    num_trks = len(trackers)
+    if num_trks == 0 or num_dets == 0:
+        return np.empty((0, 2), dtype=int), np.arange(num_dets), np.arange(num_trks)
+
+    # 目标较少时构建网格与稀疏图的开销高于全量计算，直接走全量关联
+    if num_dets * num_trks < GATING_MIN_PAIRS:
+        return associate_detections_to_trackers(detections, trackers, iou_threshold)
+
+    from scipy.optimize import linear_sum_assignment
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    pairs = candidate_pairs_grid(detections, trackers, cell_size)
+    detections = np.asarray(detections, dtype=np.float64)
+    trackers = np.asarray(trackers, dtype=np.float64)
+    ious = iou_pairwise(detections[pairs[:, 0]], trackers[pairs[:, 1]])
+    positive = ious > 0
+    pairs, ious = pairs[positive], ious[positive]
+
+    matches = []
+    if len(pairs):
+        # 检测节点编号为 [0, num_dets)，追踪器节点编号为 [num_dets, num_dets + num_trks)
+        graph = coo_matrix((np.ones(len(pairs)), (pairs[:, 0], pairs[:, 1] + num_dets)),
+                           shape=(num_dets + num_trks, num_dets + num_trks))
+        _, labels = connected_components(graph, directed=False)
+        edge_labels = labels[pairs[:, 0]]
+        order = np.argsort(edge_labels, kind='stable')
+        pairs, ious, edge_labels = pairs[order], ious[order], edge_labels[order]
+        boundaries = np.flatnonzero(np.diff(edge_labels)) + 1
+        starts = np.concatenate(([0], boundaries))
+        ends = np.concatenate((boundaries, [len(pairs)]))
+
+        # 只有一条边的分量直接匹配，其余分量各自构造小代价矩阵
+        single = (ends - starts) == 1
+        matches.append(pairs[starts[single]])
+        for start, end in zip(starts[~single], ends[~single]):
+            comp_pairs = pairs[start:end]
+            comp_dets, det_pos = np.unique(comp_pairs[:, 0], return_inverse=True)
+            comp_trks, trk_pos = np.unique(comp_pairs[:, 1], return_inverse=True)
+            cost = np.zeros((len(comp_dets), len(comp_trks)))
+            cost[det_pos, trk_pos] = ious[start:end]
+            row_ind, col_ind = linear_sum_assignment(-cost)
+            matches.append(np.stack((comp_dets[row_ind], comp_trks[col_ind]), axis=1))
+        matches = np.concatenate(matches, axis=0)
+
+        # 过滤掉低IOU的匹配
+        matched_ious = iou_pairwise(detections[matches[:, 0]], trackers[matches[:, 1]])
+        matches = matches[matched_ious >= iou_threshold].astype(int)
+    else:
+        matches = np.empty((0, 2), dtype=int)
+
+    det_matched = np.zeros(num_dets, dtype=bool)
+    det_matched[matches[:, 0]] = True
+    trk_matched = np.zeros(num_trks, dtype=bool)
+    trk_matched[matches[:, 1]] = True
+
+    return matches, np.flatnonzero(~det_matched), np.flatnonzero(~trk_matched)
+
+
+class CountingZone(object):
+    """
+    计数区域：煤块的追踪中心越过计数线（或进入计数多边形）时计数一次
+
+    只依赖存活追踪器的状态，计数结果以累计值保存，内存占用不随运行时间增长
+    """
+
+    def __init__(self, line=None, polygon=None):
+        """
+        参数:
+            line - 计数线 [[x1, y1], [x2, y2]]，中心点从线的一侧移动到另一侧时计数
+            polygon - 计数多边形 [[x, y], ...]（至少3个点），确认的追踪中心进入多边形时计数
+        """
+        if (line is None) == (polygon is None):
+            raise ValueError('计数区域必须且只能指定 line 或 polygon 之一')
+        self.line = np.asarray(line, dtype=np.float64) if line is not None else None
+        self.polygon = np.asarray(polygon, dtype=np.float64) if polygon is not None else None
+        if self.line is not None and self.line.shape != (2, 2):
+            raise ValueError('计数线必须由两个点 [[x1, y1], [x2, y2]] 组成')
+        if self.polygon is not None and (self.polygon.ndim != 2 or len(self.polygon) < 3):
+            raise ValueError('计数多边形至少需要3个点')
+
+    @classmethod
+    def from_config(cls, zone_config):
+        """从配置字典（如 Config.COUNTING_ZONES 中的一项）创建计数区域，None表示不启用"""
+        if not zone_config:
+            return None
+        if isinstance(zone_config, CountingZone):
+            return zone_config
+        return cls(line=zone_config.get('line'), polygon=zone_config.get('polygon'))
+
+    def side(self, points):
+        """
+        计算(N,2)中心点相对计数区域的位置
+        计数线: 1/-1 表示线的两侧，0 表示恰好在线上
+        计数多边形: 1 表示在区域内，-1 表示在区域外
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if self.line is not None:
+            (x1, y1), (x2, y2) = self.line
+            cross = (x2 - x1) * (points[:, 1] - y1) - (y2 - y1) * (points[:, 0] - x1)
+            return np.sign(cross).astype(np.int8)
+
+        # 射线法判断点是否在多边形内
+        vx, vy = self.polygon[:, 0], self.polygon[:, 1]
+        nx, ny = np.roll(vx, -1), np.roll(vy, -1)
+        px, py = points[:, 0:1], points[:, 1:2]
+        straddle = (vy > py) != (ny > py)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_cross = (nx - vx) * (py - vy) / (ny - vy) + vx
+        inside = (np.count_nonzero(straddle & (px < x_cross), axis=1) % 2) == 1
+        return np.where(inside, 1, -1).astype(np.int8)
+
+    def passed(self, origin, current):
+        """根据首次出现时的位置和当前位置判断是否应当计数"""
+        if self.line is not None:
+            return (origin != 0) & (current == -origin)
+        return current == 1
+
+
+# Sort.update 返回的追踪结果记录格式
+TRACK_DTYPE = np.dtype([
+    ('bbox', np.float64, (4,)),  # [x1, y1, x2, y2]
+    ('track_id', np.int64),  # 追踪ID（从1开始）
+    ('class_name', object),  # 类别名称
+    ('confidence', np.float64),  # 最近一次匹配的置信度
+    ('hit_streak', np.int64),  # 连续匹配帧数
+    ('age', np.int64),  # 追踪器存活帧数
+])
+
+
+class Sort(object):
+    """
+    SORT多目标追踪算法
+
+    所有追踪器的状态以结构化数组(struct-of-arrays)的形式保存在同一组NumPy数组中，
+    每帧的预测与更新都是一次批量矩阵运算。删除的追踪器只回收槽位，不会重新分配整个存储。
+
+    煤块计数只保存在存活追踪器的 counted 标记和累计值 total_count 中：
+    未设置计数区域时，追踪器首次被确认即计数；设置计数区域后，追踪中心越过计数线（或进入多边形）时计数。
+    """
+
+    # 匀速模型: 状态为 [x, y, s, r, vx, vy, vs]，观测为 [x, y, s, r]
+    F = np.array(
+        [[1, 0, 0, 0, 1, 0, 0], [0, 1, 0, 0, 0, 1, 0], [0, 0, 1, 0, 0, 0, 1], [0, 0, 0, 1, 0, 0, 0],
+         [0, 0, 0, 0, 1, 0, 0], [0, 0, 0, 0, 0, 1, 0], [0, 0, 0, 0, 0, 0, 1]], dtype=np.float64)
+    H = np.array(
+        [[1, 0, 0, 0, 0, 0, 0], [0, 1, 0, 0, 0, 0, 0], [0, 0, 1, 0, 0, 0, 0], [0, 0, 0, 1, 0, 0, 0]],
+        dtype=np.float64)
+    R = np.diag([1., 1., 10., 10.])  # 观测噪声
+    Q = np.diag([1., 1., 1., 1., 0.01, 0.01, 0.01])  # 过程噪声
+    P0 = np.diag([10., 10., 10., 10., 10000., 10000., 10000.])  # 初始协方差，速度不确定性较大
+
+    def __init__(self, max_age=10, min_hits=3, iou_threshold=0.3, capacity=64, gating=False, gating_cell_size=None,
+                 counting_zone=None):
+        """
+        参数:
+            max_age - 连续帧未关联时删除追踪器的最大帧数
+            min_hits - 确认目标存在的最小帧数
+            iou_threshold - IOU匹配门限
+            capacity - 追踪器存储的初始容量，不足时按倍数扩容
+            gating - 是否启用网格门控关联（适合每帧上百个煤块的密集场景）
+            gating_cell_size - 门控网格边长（像素），None表示按预测框尺寸自动选择
+            counting_zone - 计数区域（CountingZone或配置字典），None表示按确认的追踪器计数
+        """
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.iou_threshold = iou_threshold
+        self.gating = gating
+        self.gating_cell_size = gating_cell_size
+        self.frame_count = 0
+        self.counting_zone = CountingZone.from_config(counting_zone)
+        self.total_count = 0  # 累计唯一煤块数量
+        self.class_counts = {}  # 按类别累计的煤块数量
+        self._next_id = 0
+        self._capacity = 0
+        self._free_slots = []
+        self._grow(capacity)
+
+    # ---------- 追踪器存储管理 ----------
+    def _grow(self, min_capacity):
+        """扩容存储（容量翻倍），已有追踪器的状态原样保留"""
+        old_capacity = self._capacity
+        new_capacity = max(min_capacity, old_capacity * 2, 1)
+
+        def extend(old, shape, dtype, fill=0):
+            arr = np.full((new_capacity,) + shape, fill, dtype=dtype)
+            if old_capacity:
+                arr[:old_capacity] = old
+            return arr
+
+        self.x = extend(getattr(self, 'x', None), (7,), np.float64)
+        self.P = extend(getattr(self, 'P', None), (7, 7), np.float64)
+        self.active = extend(getattr(self, 'active', None), (), bool, False)
+        self.ids = extend(getattr(self, 'ids', None), (), np.int64, -1)
+        self.time_since_update = extend(getattr(self, 'time_since_update', None), (), np.int64)
+        self.hits = extend(getattr(self, 'hits', None), (), np.int64)
+        self.hit_streak = extend(getattr(self, 'hit_streak', None), (), np.int64)
+        self.age = extend(getattr(self, 'age', None), (), np.int64)
+        self.confidences = extend(getattr(self, 'confidences', None), (), np.float64)
+        self.class_names = extend(getattr(self, 'class_names', None), (), object, None)
+        self.counted = extend(getattr(self, 'counted', None), (), bool, False)
+        self.zone_origin = extend(getattr(self, 'zone_origin', None), (), np.int8)
+
+        # 新槽位倒序入栈，保证优先复用编号小的槽位
+        self._free_slots.extend(range(new_capacity - 1, old_capacity - 1, -1))
+        self._capacity = new_capacity
+
+    def _create_tracks(self, bboxes, class_names=None, confidences=None):
+        """为一组检测框创建新的追踪器，返回分配到的槽位"""
+        count = len(bboxes)
+        if count == 0:
+            return np.empty(0, dtype=np.int64)
+        if count > len(self._free_slots):
+            self._grow(self._capacity + count - len(self._free_slots))
+
+        slots = np.array([self._free_slots.pop() for _ in range(count)], dtype=np.int64)
+        self.x[slots] = 0.
+        self.x[slots, :4] = convert_bboxes_to_z(bboxes)
+        self.P[slots] = self.P0
+        self.active[slots] = True
+        self.ids[slots] = np.arange(self._next_id, self._next_id + count)
+        self._next_id += count
+        self.time_since_update[slots] = 0
+        self.hits[slots] = 0
+        self.hit_streak[slots] = 0
+        self.age[slots] = 0
+        self.confidences[slots] = 0
+        self.class_names[slots] = None
+        self.counted[slots] = False
+        self.zone_origin[slots] = 0
+        if self.counting_zone is not None:
+            self.zone_origin[slots] = self.counting_zone.side(self._centers(slots))
+        if class_names is not None and confidences is not None:
+            self.class_names[slots] = class_names
+            self.confidences[slots] = confidences
+        return slots
+
+    def _delete_tracks(self, slots):
+        """删除追踪器，仅回收槽位"""
+        self.active[slots] = False
+        self.class_names[slots] = None
+        self._free_slots.extend(int(s) for s in slots)
+
+    def _centers(self, slots):
+        """追踪器当前估计的中心点(N,2)"""
+        return self.x[slots, :2]
+
+    def _count_tracks(self, slots):
+        """对本帧确认的追踪器计数，每个追踪器最多计数一次"""
+        slots = slots[~self.counted[slots]]
+        if len(slots) == 0:
+            return
+        if self.counting_zone is not None:
+            current = self.counting_zone.side(self._centers(slots))
+            # 首次出现时恰好在线上的追踪器，以第一次离开线时的位置作为起始侧
+            unknown = self.zone_origin[slots] == 0
+            self.zone_origin[slots[unknown]] = current[unknown]
+            slots = slots[self.counting_zone.passed(self.zone_origin[slots], current)]
+
+        self.counted[slots] = True
+        self.total_count += len(slots)
+        for class_name in self.class_names[slots]:
+            self.class_counts[class_name] = self.class_counts.get(class_name, 0) + 1
+
+    def active_slots(self):
+        """当前存活追踪器的槽位，按创建先后(ID)排序"""
+        slots = np.flatnonzero(self.active)
+        return slots[np.argsort(self.ids[slots], kind='stable')]
+
+    # ---------- 批量Kalman滤波 ----------
+    def _predict(self, slots):
+        """批量预测下一帧位置，返回(N,4)的预测框"""
+        x = self.x[slots]
+        # 面积即将变为非正数时，清零面积变化速度
+        x[(x[:, 6] + x[:, 2]) <= 0, 6] = 0.
+        self.x[slots] = x @ self.F.T
+        self.P[slots] = self.F @ self.P[slots] @ self.F.T + self.Q
+
+        self.age[slots] += 1
+        self.hit_streak[slots[self.time_since_update[slots] > 0]] = 0
+        self.time_since_update[slots] += 1
+        return convert_x_to_bboxes(self.x[slots])
+
+    def _update(self, slots, bboxes):
+        """使用检测框批量更新位置，重置计数器"""
+        self.time_since_update[slots] = 0
+        self.hits[slots] += 1
+        self.hit_streak[slots] += 1
+
+        x = self.x[slots]
+        P = self.P[slots]
+        z = convert_bboxes_to_z(bboxes)
+
+        # S = HPH' + R, K = PH'S^-1（H只选取前4维，直接切片代替矩阵乘法）
+        S = P[:, :4, :4] + self.R
+        PHt = P[:, :, :4]
+        K = np.linalg.solve(S, PHt.transpose(0, 2, 1)).transpose(0, 2, 1)
+
+        y = z - x[:, :4]
+        self.x[slots] = x + (K @ y[:, :, None])[:, :, 0]
+
+        # Joseph形式更新协方差，保持数值稳定与对称
+        I_KH = np.eye(7) - K @ self.H
+        self.P[slots] = I_KH @ P @ I_KH.transpose(0, 2, 1) + K @ self.R @ K.transpose(0, 2, 1)
+
+    def _confirmed(self, slots):
+        """本次更新中被匹配、且已连续追踪至少min_hits帧的追踪器"""
+        return (self.time_since_update[slots] < 1) & (
+                (self.hit_streak[slots] >= self.min_hits) | (self.frame_count <= self.min_hits))
+
+    def _records(self, slots):
+        """把追踪器状态整理为TRACK_DTYPE结构化数组"""
+        tracks = np.empty(len(slots), dtype=TRACK_DTYPE)
+        if len(slots):
+            tracks['bbox'] = convert_x_to_bboxes(self.x[slots])
+            tracks['track_id'] = self.ids[slots] + 1  # +1 因为0是保留ID
+            tracks['class_name'] = self.class_names[slots]
+            tracks['confidence'] = self.confidences[slots]
+            tracks['hit_streak'] = self.hit_streak[slots]
+            tracks['age'] = self.age[slots]
+        return tracks
+
+    def active_count(self):
+        """当前存活的追踪器数量"""
+        return int(np.count_nonzero(self.active))
+
+    def coast(self):
+        """
+        跳过检测的中间帧：只用Kalman匀速模型把所有追踪器外推一帧，不计为未匹配
+        上一次 update 输出的确认目标会以外推位置返回，用于抽帧检测时补全中间帧的轨迹
+        返回:
+            (tracks, unique_count)，格式与 update 相同
+        """
+        slots = self.active_slots()
+        if len(slots):
+            x = self.x[slots]
+            x[(x[:, 6] + x[:, 2]) <= 0, 6] = 0.
+            self.x[slots] = x @ self.F.T
+            self.P[slots] = self.F @ self.P[slots] @ self.F.T + self.Q
+
+        slots = slots[::-1]
+        tracks = self._records(slots[self._confirmed(slots)])
+        # 外推结果无效（如面积变为负数）的目标不输出
+        tracks = tracks[~np.isnan(tracks['bbox']).any(axis=1)]
+        return tracks, self.total_count
+
+    def hold(self):
+        """
+        画面无变化、跳过检测的帧：追踪器状态保持不变，只增加各目标的存活帧数(age)
+        与 coast 不同，这里不做外推——皮带停止时目标确实没有移动；也不计为未匹配，
+        避免皮带停止较久后目标被删除、重新启动时同一煤块被重复计数
+        返回:
+            (tracks, unique_count)，上一次输出的确认目标，格式与 update 相同
+        """
+        slots = self.active_slots()
+        self.age[slots] += 1
+        slots = slots[::-1]
+        return self._records(slots[self._confirmed(slots)]), self.total_count
+
+    def update(self, dets, class_names=None, confidences=None):
+        """
+        更新追踪器状态
+        参数:
+            dets - numpy数组格式 [[x1,y1,x2,y2,score], ...]
+        返回:
+            (tracks, unique_count)
+            tracks - TRACK_DTYPE结构化数组，可直接读取 bbox/track_id/class_name/confidence 等字段
+            unique_count - 累计唯一煤块数量
+        """
+        self.frame_count += 1
+        dets = np.asarray(dets, dtype=np.float64)
+        if dets.ndim != 2:
+            dets = dets.reshape(-1, 4)
+
+        # 获取当前追踪器预测的位置
+        slots = self.active_slots()
+        trks = self._predict(slots)
+
+        # 删除失效的追踪器
+        invalid = np.isnan(trks).any(axis=1)
+        if invalid.any():
+            self._delete_tracks(slots[invalid])
+            slots = slots[~invalid]
+            trks = trks[~invalid]
+
+        # 将当前帧检测关联到已有追踪
+        if self.gating:
+            matched, unmatched_dets, unmatched_trks = associate_detections_to_trackers_gated(
+                dets, trks, self.iou_threshold, self.gating_cell_size)
+        else:
+            matched, unmatched_dets, unmatched_trks = associate_detections_to_trackers(dets, trks, self.iou_threshold)
+
+        # 更新已匹配的追踪器
+        if len(matched):
+            matched_slots = slots[matched[:, 1]]
+            self._update(matched_slots, dets[matched[:, 0], :4])
+            if class_names is not None and confidences is not None:
+                self.class_names[matched_slots] = [class_names[d] for d in matched[:, 0]]
+                self.confidences[matched_slots] = [confidences[d] for d in matched[:, 0]]
+
+        # 为未匹配的检测创建新的追踪器
+        if len(unmatched_dets):
+            new_class_names = None
+            new_confidences = None
+            if class_names is not None and confidences is not None:
+                new_class_names = [class_names[d] for d in unmatched_dets]
+                new_confidences = [confidences[d] for d in unmatched_dets]
+            self._create_tracks(dets[unmatched_dets, :4], new_class_names, new_confidences)
+
+        # 返回确认的追踪结果 (至少连续min_hits帧被追踪)，最新创建的在前
+        slots = self.active_slots()[::-1]
+        confirmed_slots = slots[self._confirmed(slots)]
+        tracks = self._records(confirmed_slots)
+
+        # 累计唯一煤块数量
+        self._count_tracks(confirmed_slots)
+
+        # 移除已经很久未更新的追踪器
+        expired = slots[self.time_since_update[slots] > self.max_age]
+        if len(expired):
+            self._delete_tracks(expired)
+
+        return tracks, self.total_count
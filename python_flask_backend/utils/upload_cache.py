@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+from werkzeug.utils import secure_filename
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+
+def upload_extension(filename):
+    """安全的小写扩展名"""
+    return os.path.splitext(secure_filename(filename or ''))[1].lower()
+
+
+def save_upload_hashed(file, upload_folder, chunk_size=UPLOAD_CHUNK_SIZE):
+    """
+    边写入磁盘边计算SHA-256，避免保存后再完整读一遍文件
+    文件按内容哈希命名（upload_<哈希前16位><扩展名>），同名不同内容的上传不会互相覆盖，
+    相同内容的重复上传只保留一份
+    参数:
+        file - werkzeug FileStorage
+    返回:
+        (文件路径, 内容哈希)
+    """
+    os.makedirs(upload_folder, exist_ok=True)
+    extension = upload_extension(file.filename)
+    temp_path = os.path.join(upload_folder, f'.upload_{uuid.uuid4().hex}.part')
+    digest = hashlib.sha256()
+    try:
+        with open(temp_path, 'wb') as f:
+            while True:
+                chunk = file.stream.read(chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                f.write(chunk)
+    except Exception:
+        os.remove(temp_path)
+        raise
+
+    content_hash = digest.hexdigest()
+    return adopt_upload(temp_path, content_hash, extension), content_hash
+
+
+def write_chunk(path, offset, stream, length, chunk_size=UPLOAD_CHUNK_SIZE):
+    """
+    把请求体中的一个分片直接写入文件的指定偏移位置，同时计算SHA-256
+    返回:
+        (实际写入的字节数, SHA-256)
+    """
+    digest = hashlib.sha256()
+    written = 0
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        while written < length:
+            data = stream.read(min(chunk_size, length - written))
+            if not data:
+                break
+            digest.update(data)
+            f.write(data)
+            written += len(data)
+    return written, digest.hexdigest()
+
+
+def hash_file(path, chunk_size=UPLOAD_CHUNK_SIZE):
+    """计算已有文件的SHA-256（分片上传完成后计算整个文件的内容哈希）"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def adopt_upload(path, content_hash, extension, keep_source=False):
+    """
+    把已写完的上传文件按内容哈希重命名（同一目录内重命名，不复制数据），
+    已有相同内容的上传时删除本文件并复用已有文件，返回最终路径
+    keep_source=True 时保留本文件：以硬链接（不支持时复制）代替重命名，已有相同内容时也不删除
+    """
+    final_path = os.path.join(os.path.dirname(path), f'upload_{content_hash[:16]}{extension}')
+    if os.path.abspath(final_path) == os.path.abspath(path):
+        return path
+    if os.path.exists(final_path):
+        if not keep_source:
+            os.remove(path)
+    elif keep_source:
+        try:
+            os.link(path, final_path)
+        except FileExistsError:
+            pass  # 相同内容的另一个上传刚刚完成
+        except OSError:
+            temp_path = f'{final_path}.{os.getpid()}.tmp'
+            shutil.copyfile(path, temp_path)
+            os.replace(temp_path, final_path)
+    else:
+        os.replace(path, final_path)
+    return final_path
+
+
+def cache_key(kind, content_hash, model_version, params=None):
+    """由检测类型、内容哈希、模型版本和检测参数（阈值、抽帧间隔、ROI等）生成缓存键"""
+    key_data = json.dumps({
+        'kind': kind,
+        'content': content_hash,
+        'model': model_version,
+        'params': params or {}
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(key_data.encode('utf-8')).hexdigest()
@@ -0,0 +1,149 @@
+import queue
+import threading
+import time
+
+# 队列结束标记
+_END = object()
+
+
+class PipelineStage(object):
+    """
+    流水线中的一个处理阶段，运行在独立线程中，并统计忙碌/等待时间
+    """
+
+    def __init__(self, name, func=None):
+        """
+        参数:
+            name - 阶段名称（用于统计输出）
+            func - 处理函数 func(item) -> item，为None时表示数据源阶段
+        """
+        self.name = name
+        self.func = func
+        self.items = 0
+        self.busy_time = 0.0  # 执行处理函数的时间
+        self.wait_time = 0.0  # 等待上游数据的时间
+        self.blocked_time = 0.0  # 下游队列已满、被反压阻塞的时间
+
+    def stats(self, wall_time):
+        """返回本阶段的统计信息，utilization 表示忙碌时间占总耗时的比例"""
+        return {
+            'items': self.items,
+            'busy_time': self.busy_time,
+            'wait_time': self.wait_time,
+            'blocked_time': self.blocked_time,
+            'utilization': self.busy_time / wall_time if wall_time > 0 else 0
+        }
+
+
+class Pipeline(object):
+    """
+    多阶段线程流水线：各阶段之间通过有界队列连接
+
+    - 每个阶段只有一个线程、队列先进先出，因此输出顺序与输入顺序一致
+    - 队列有界，下游处理不过来时上游会被阻塞（反压），内存占用可控
+    - OpenCV的解码/绘制/编码和PyTorch推理在执行时会释放GIL，各阶段可以真正并行
+    """
+
+    def __init__(self, source, stages, queue_size=4):
+        """
+        参数:
+            source - 可迭代对象，在数据源线程中逐项读取（如逐批解码视频帧）
+            stages - [(名称, 处理函数), ...]，最后一个阶段的返回值被丢弃
+            queue_size - 阶段之间队列的最大长度
+        """
+        self.source = source
+        self.stages = [PipelineStage('decode')] + [PipelineStage(name, func) for name, func in stages]
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in range(len(self.stages) - 1)]
+        self.stop_event = threading.Event()
+        self.error = None
+        self.wall_time = 0.0
+
+    def _put(self, stage, q, item):
+        """向下游队列放入数据，出错停止时放弃"""
+        start = time.perf_counter()
+        while not self.stop_event.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        stage.blocked_time += time.perf_counter() - start
+
+    def _get(self, stage, q):
+        """从上游队列取数据，出错停止时返回结束标记"""
+        start = time.perf_counter()
+        item = _END
+        while not self.stop_event.is_set():
+            try:
+                item = q.get(timeout=0.1)
+                break
+            except queue.Empty:
+                continue
+        stage.wait_time += time.perf_counter() - start
+        return item
+
+    def _fail(self, error):
+        if self.error is None:
+            self.error = error
+        self.stop_event.set()
+
+    def _run_source(self, stage, out_queue):
+        try:
+            iterator = iter(self.source)
+            while not self.stop_event.is_set():
+                start = time.perf_counter()
+                item = next(iterator, _END)
+                stage.busy_time += time.perf_counter() - start
+                if item is _END:
+                    break
+                stage.items += 1
+                self._put(stage, out_queue, item)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(stage, out_queue, _END)
+
+    def _run_stage(self, stage, in_queue, out_queue):
+        try:
+            while True:
+                item = self._get(stage, in_queue)
+                if item is _END:
+                    break
+                start = time.perf_counter()
+                result = stage.func(item)
+                stage.busy_time += time.perf_counter() - start
+                stage.items += 1
+                if out_queue is not None:
+                    self._put(stage, out_queue, result)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            if out_queue is not None:
+                self._put(stage, out_queue, _END)
+
+    def run(self):
+        """运行流水线直到数据源耗尽，任一阶段出错时停止所有阶段并重新抛出异常"""
+        start = time.perf_counter()
+        threads = [threading.Thread(target=self._run_source, args=(self.stages[0], self.queues[0]),
+                                    name='pipeline-decode', daemon=True)]
+        for i, stage in enumerate(self.stages[1:], start=1):
+            out_queue = self.queues[i] if i < len(self.queues) else None
+            threads.append(threading.Thread(target=self._run_stage, args=(stage, self.queues[i - 1], out_queue),
+                                            name=f'pipeline-{stage.name}', daemon=True))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.wall_time = time.perf_counter() - start
+
+        if self.error is not None:
+            raise self.error
+        return self.stats()
+
+    def stats(self):
+        """各阶段的统计信息，utilization 最高的阶段即为瓶颈"""
+        return {stage.name: stage.stats(self.wall_time) for stage in self.stages}
+
+    def bottleneck(self):
+        """返回忙碌比例最高的阶段名称"""
+        return max(self.stages, key=lambda stage: stage.busy_time).name
@@ -0,0 +1,257 @@
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+import cv2
+
+# 队列结束标记
+_END = object()
+
+# OpenCV 回退时依次尝试的编码器
+OPENCV_FOURCCS = ('avc1', 'H264', 'mp4v')
+
+
+def find_ffmpeg(path='ffmpeg'):
+    """返回可执行的 ffmpeg 路径，找不到时返回None"""
+    return shutil.which(path) if path else None
+
+
+class FFmpegEncoder(object):
+    """
+    通过管道把原始BGR帧送给本地 ffmpeg 编码为 H.264（libx264）MP4，
+    输出带 faststart（moov放在文件头），浏览器不需要下载完整文件即可开始播放
+    """
+
+    backend = 'ffmpeg'
+
+    def __init__(self, path, fps, size, ffmpeg='ffmpeg', preset='veryfast', crf=23):
+        width, height = size
+        command = [
+            ffmpeg, '-hide_banner', '-loglevel', 'error', '-y',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-r', f'{fps:g}', '-i', '-',
+            '-an', '-c:v', 'libx264', '-preset', preset, '-crf', str(crf),
+            # yuv420p 要求宽高为偶数，奇数尺寸裁掉最后一行/列
+            '-vf', 'crop=trunc(iw/2)*2:trunc(ih/2)*2', '-pix_fmt', 'yuv420p',
+            '-movflags', '+faststart', path
+        ]
+        self.size = (width, height)
+        self.stderr = tempfile.TemporaryFile()  # 不用管道，避免 ffmpeg 输出过多时阻塞
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                        stderr=self.stderr)
+
+    def write(self, frame):
+        if (frame.shape[1], frame.shape[0]) != self.size:
+            frame = cv2.resize(frame, self.size)
+        self.process.stdin.write(frame.tobytes())
+
+    def _error_output(self):
+        self.stderr.seek(0)
+        return self.stderr.read().decode('utf-8', 'replace').strip()
+
+    def release(self):
+        """关闭输入并等待 ffmpeg 写完文件（faststart 需要在结束时重写文件头）"""
+        try:
+            self.process.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+        returncode = self.process.wait()
+        message = self._error_output()
+        self.stderr.close()
+        if returncode != 0:
+            raise RuntimeError(f'ffmpeg 退出码 {returncode}: {message}')
+
+
+class OpenCVEncoder(object):
+    """OpenCV VideoWriter，依次尝试 OPENCV_FOURCCS 中的编码器"""
+
+    backend = 'opencv'
+
+    def __init__(self, path, fps, size):
+        self.writer = None
+        for code in OPENCV_FOURCCS:
+            try:
+                writer = cv2.VideoWriter(path, cv2.VideoWriter.fourcc(*code), fps, size)
+            except Exception as e:
+                print(f"尝试 {code} 编码器失败: {str(e)}")
+                continue
+            if writer.isOpened():
+                self.writer = writer
+                self.fourcc = code
+                break
+            writer.release()
+        if self.writer is None:
+            raise RuntimeError('无法创建输出视频，所有编码器都失败')
+
+    def write(self, frame):
+        self.writer.write(frame)
+
+    def release(self):
+        self.writer.release()
+
+
+class SegmentVideoWriter(object):
+    """
+    在独立线程中编码视频：write() 只把帧放入有界队列，编码（ffmpeg管道或OpenCV）在写入线程中进行
+
+    - 实时录制（block=False）：队列满时丢弃新帧并计入 dropped，检测线程不会被编码拖慢
+    - 离线处理（block=True）：队列满时等待，不丢帧
+    - ffmpeg 不可用、启动失败或第一帧就写入失败时回退到 OpenCV
+    - stats() 返回队列长度、丢帧数和编码延迟（帧从入队到编码完成的时间）
+    """
+
+    def __init__(self, path, fps, size, backend='auto', queue_size=60, block=False,
+                 ffmpeg='ffmpeg', preset='veryfast', crf=23, on_closed=None):
+        """
+        参数:
+            size - (宽, 高)，尺寸不同的帧在 ffmpeg 编码前缩放到该尺寸
+            backend - 'auto'（有 ffmpeg 时使用 ffmpeg）/ 'ffmpeg' / 'opencv'
+            on_closed - 文件写完后在写入线程中调用 on_closed(writer)
+        """
+        self.path = path
+        self.fps = fps if fps and fps > 0 else 20.0
+        self.size = (int(size[0]), int(size[1]))
+        self.block = block
+        self.on_closed = on_closed
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.lock = threading.Lock()
+        self.error = None
+        self.closed = False
+        self.close_event = threading.Event()  # 已请求关闭：队列满放不下结束标记时，写入线程据此在队列清空后退出
+        self.finished = False  # 文件已写完
+        # 统计信息
+        self.queued = 0
+        self.written = 0
+        self.dropped = 0
+        self.encode_time = 0.0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+        self.encoder = None
+        ffmpeg_path = find_ffmpeg(ffmpeg) if backend in ('auto', 'ffmpeg') else None
+        if backend == 'ffmpeg' and ffmpeg_path is None:
+            print(f"找不到 ffmpeg（{ffmpeg}），使用 OpenCV 编码")
+        if ffmpeg_path is not None:
+            try:
+                self.encoder = FFmpegEncoder(path, self.fps, self.size, ffmpeg_path, preset, crf)
+            except OSError as e:
+                print(f"启动 ffmpeg 失败，使用 OpenCV 编码: {str(e)}")
+        if self.encoder is None:
+            self.encoder = OpenCVEncoder(path, self.fps, self.size)
+
+        self.thread = threading.Thread(target=self._run, name='video-writer', daemon=True)
+        self.thread.start()
+
+    @property
+    def backend(self):
+        return self.encoder.backend
+
+    def write(self, frame):
+        """
+        放入一帧（调用后不要再修改该帧），返回是否已入队
+        非阻塞模式下队列已满或写入线程出错时丢弃该帧
+        """
+        if self.closed:
+            raise RuntimeError('视频写入器已关闭')
+        item = (time.monotonic(), frame)
+        if self.error is None:
+            try:
+                self.queue.put(item, block=self.block)
+                with self.lock:
+                    self.queued += 1
+                return True
+            except queue.Full:
+                pass
+        with self.lock:
+            self.dropped += 1
+        return False
+
+    def _encode(self, frame):
+        try:
+            self.encoder.write(frame)
+        except (BrokenPipeError, OSError) as e:
+            if self.encoder.backend != 'ffmpeg' or self.written:
+                raise
+            # ffmpeg 启动后立即退出（如缺少 libx264），改用 OpenCV 重新开始
+            try:
+                self.encoder.release()
+            except RuntimeError as release_error:
+                e = release_error
+            print(f"ffmpeg 编码失败，使用 OpenCV 编码: {str(e)}")
+            self.encoder = OpenCVEncoder(self.path, self.fps, self.size)
+            self.encoder.write(frame)
+
+    def _run(self):
+        """写入线程：逐帧编码直到收到结束标记（或已请求关闭且队列已清空），然后关闭编码器"""
+        while True:
+            try:
+                item = self.queue.get(timeout=0.2)
+            except queue.Empty:
+                if self.close_event.is_set():
+                    break
+                continue
+            if item is _END:
+                break
+            if self.error is not None:
+                continue  # 出错后只清空队列，让阻塞的 write() 不会卡住
+            enqueued, frame = item
+            start = time.monotonic()
+            try:
+                self._encode(frame)
+            except Exception as e:
+                self.error = e
+                print(f"视频编码失败 {self.path}: {str(e)}")
+                continue
+            now = time.monotonic()
+            with self.lock:
+                self.written += 1
+                self.encode_time += now - start
+                self.last_lag = now - enqueued
+                self.max_lag = max(self.max_lag, self.last_lag)
+
+        try:
+            self.encoder.release()
+        except Exception as e:
+            if self.error is None:
+                self.error = e
+            print(f"关闭视频文件失败 {self.path}: {str(e)}")
+        self.finished = True
+        if self.on_closed is not None:
+            try:
+                self.on_closed(self)
+            except Exception as e:
+                print(f"视频写入完成回调失败: {str(e)}")
+
+    def close(self, wait=True):
+        """
+        结束写入：已入队的帧全部编码后关闭文件
+        参数:
+            wait - 是否等待文件写完；为False时立即返回，写完后调用 on_closed
+        """
+        if not self.closed:
+            self.closed = True
+            self.close_event.set()
+            try:
+                self.queue.put_nowait(_END)  # 队列满时不等待，写入线程编码完剩余帧后按 close_event 退出
+            except queue.Full:
+                pass
+        if wait:
+            self.thread.join()
+        return self.stats()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'backend': self.encoder.backend,
+                'queue_size': self.queue.qsize(),
+                'queued': self.queued,
+                'written': self.written,
+                'dropped': self.dropped,
+                'avg_encode_ms': self.encode_time * 1000 / self.written if self.written else 0.0,
+                'lag_ms': self.last_lag * 1000,  # 最近一帧从入队到编码完成的时间
+                'max_lag_ms': self.max_lag * 1000,
+                'finished': self.finished,
+                'error': str(self.error) if self.error is not None else None
+            }